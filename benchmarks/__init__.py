@@ -0,0 +1 @@
+"""End-to-end benchmarks of nameko-rediskn, run with `python -m benchmarks`."""
@@ -0,0 +1,239 @@
+import argparse
+import ast
+import json
+import sys
+
+from redis import StrictRedis
+
+from .load import run_load
+from .results import DEFAULT_TOLERANCE, compare, document
+
+DEFAULT_URI = 'redis://localhost:6379/15'
+"""Default Redis URI, keys matching `bench:*` are written to its db."""
+
+
+def main(argv=None):
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    return args.handler(args)
+
+
+def run(args):
+    import eventlet
+
+    eventlet.monkey_patch()  # noqa (code before imports)
+
+    from .runner import RedisServer, run_benchmark
+
+    options = dict(_option(option) for option in args.option)
+    config = {
+        'rate': args.rate,
+        'duration': args.duration,
+        'keys': args.keys,
+        'patterns': args.patterns,
+        'options': options,
+        'max_workers': args.max_workers,
+        'backoff_factor': args.backoff_factor,
+        'kill': args.kill,
+        'drain': args.drain,
+        'recovery_window': args.recovery_window,
+    }
+
+    if args.spawn_server:
+        with RedisServer(args.redis_server) as server:
+            results = run_benchmark(server.uri, **config)
+    else:
+        results = run_benchmark(args.uri, **config)
+
+    _write(document(config, results, label=args.label), args.output)
+    return 0
+
+
+def replay(args):
+    import eventlet
+
+    eventlet.monkey_patch()  # noqa (code before imports)
+
+    from nameko_rediskn.recording import MAX_SPEED
+
+    from .runner import run_replay
+
+    options = dict(_option(option) for option in args.option)
+    config = {
+        'speed': MAX_SPEED if args.max_speed else args.speed,
+        'options': options,
+        'max_workers': args.max_workers,
+        'drain': args.drain,
+    }
+    results = run_replay(args.log, **config)
+    _write(document(dict(config, log=args.log), results, label=args.label), args.output)
+    return 0
+
+
+def load(args):
+    client = StrictRedis.from_url(args.uri)
+    writes = run_load(
+        client,
+        args.rate,
+        args.duration,
+        args.keys,
+        args.patterns,
+        kill=args.kill,
+        drain=args.drain,
+        recovery_window=args.recovery_window,
+    )
+    _write(writes, args.output)
+    return 0
+
+
+def compare_results(args):
+    with open(args.baseline) as baseline, open(args.current) as current:
+        rows = compare(json.load(baseline), json.load(current), args.tolerance)
+
+    regressions = 0
+    for metric, before, after, change, regressed in rows:
+        regressions += regressed
+        print(
+            '{:<28} {:>14.6g} {:>14.6g} {:>9} {}'.format(
+                metric,
+                before,
+                after,
+                'n/a' if change is None else '{:+.1%}'.format(change),
+                'REGRESSION' if regressed else 'ok',
+            )
+        )
+    return 1 if regressions else 0
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='End-to-end benchmarks of nameko-rediskn.',
+    )
+    commands = parser.add_subparsers(dest='command')
+
+    run_parser = commands.add_parser(
+        'run', help='benchmark an entrypoint under a generated load'
+    )
+    _add_load_arguments(run_parser)
+    run_parser.add_argument(
+        '--spawn-server',
+        action='store_true',
+        help='start a local redis-server on a free port instead of using --uri',
+    )
+    run_parser.add_argument(
+        '--redis-server',
+        default='redis-server',
+        help='redis-server executable used with --spawn-server',
+    )
+    _add_service_arguments(run_parser)
+    run_parser.add_argument('--backoff-factor', type=float, default=0.1)
+    run_parser.set_defaults(handler=run)
+
+    replay_parser = commands.add_parser(
+        'replay', help='benchmark an entrypoint replaying a notification log'
+    )
+    replay_parser.add_argument('log', help='log recorded with `record`')
+    replay_parser.add_argument(
+        '--speed',
+        type=float,
+        default=1,
+        help='replay speed relative to the recording (default: %(default)s)',
+    )
+    replay_parser.add_argument(
+        '--max-speed', action='store_true', help='replay without any waits'
+    )
+    _add_service_arguments(replay_parser)
+    replay_parser.add_argument(
+        '--drain',
+        type=float,
+        default=1,
+        help='seconds given to the notifications to be handled',
+    )
+    replay_parser.add_argument(
+        '--output', default='-', help='file to write the JSON results to'
+    )
+    replay_parser.set_defaults(handler=replay)
+
+    load_parser = commands.add_parser(
+        'load', help='only generate the load, printing the writes'
+    )
+    _add_load_arguments(load_parser)
+    load_parser.set_defaults(handler=load)
+
+    compare_parser = commands.add_parser(
+        'compare', help='compare two results, failing on regressions'
+    )
+    compare_parser.add_argument('baseline', help='results of the reference run')
+    compare_parser.add_argument('current', help='results of the run to check')
+    compare_parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help='relative change tolerated (default: %(default)s)',
+    )
+    compare_parser.set_defaults(handler=compare_results)
+    return parser
+
+
+def _add_service_arguments(parser):
+    parser.add_argument(
+        '--option',
+        action='append',
+        default=[],
+        metavar='NAME=VALUE',
+        help='subscribe argument of the entrypoint, e.g. parse_messages=True',
+    )
+    parser.add_argument('--max-workers', type=int, default=10)
+    parser.add_argument('--label', help='label of the run, e.g. a version')
+
+
+def _add_load_arguments(parser):
+    parser.add_argument('--uri', default=DEFAULT_URI, help='Redis URI')
+    parser.add_argument('--rate', type=float, default=1000, help='writes per second')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of writes')
+    parser.add_argument('--keys', type=int, default=1000, help='distinct keys')
+    parser.add_argument(
+        '--patterns', type=int, default=10, help='subscribed key patterns'
+    )
+    parser.add_argument(
+        '--kill',
+        action='store_true',
+        help='kill the pub/sub connections afterwards to measure the recovery',
+    )
+    parser.add_argument(
+        '--drain',
+        type=float,
+        default=1,
+        help='seconds given to the notifications to be handled',
+    )
+    parser.add_argument(
+        '--recovery-window',
+        type=float,
+        default=5,
+        help='seconds of writes after killing the connections',
+    )
+    parser.add_argument(
+        '--output', default='-', help='file to write the JSON results to'
+    )
+
+
+def _option(option):
+    name, _, value = option.partition('=')
+    try:
+        return name, ast.literal_eval(value)
+    except (SyntaxError, ValueError):
+        return name, value
+
+
+def _write(data, output):
+    if output == '-':
+        json.dump(data, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(output, 'w') as handle:
+            json.dump(data, handle, indent=2, sort_keys=True)
+            handle.write('\n')
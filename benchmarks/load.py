@@ -0,0 +1,125 @@
+import time
+
+KEY_TEMPLATE = 'bench:{pattern}:{key}'
+"""Template of the keys written by the load generator."""
+
+PATTERN_TEMPLATE = 'bench:{pattern}:*'
+"""Template of the key patterns the benchmark entrypoint subscribes to."""
+
+TICK = 0.01
+"""Time, in seconds, between the pipelines of writes."""
+
+
+def key_name(index, keys, patterns):
+    """Return the key of the `index`-th write.
+
+    Writes go round-robin through `keys` keys, which are spread across
+    `patterns` key patterns.
+    """
+    key = index % keys
+    return KEY_TEMPLATE.format(pattern=key % patterns, key=key)
+
+
+def key_patterns(patterns):
+    """Return the key patterns matching all the written keys."""
+    return [PATTERN_TEMPLATE.format(pattern=pattern) for pattern in range(patterns)]
+
+
+def generate(
+    client,
+    rate,
+    duration,
+    keys,
+    patterns,
+    start=0,
+    clock=time.time,
+    sleep=time.sleep,
+):
+    """SET keys at a steady rate.
+
+    The writes due every `TICK` are sent in a single pipeline, so the rate
+    holds as long as Redis keeps up.
+
+    Args:
+        client (StrictRedis): Redis client.
+        rate (float): writes per second.
+        duration (float): time, in seconds, to write for.
+        keys (int): number of distinct keys.
+        patterns (int): number of key patterns the keys are spread across.
+        start (int): index of the first write.
+        clock (callable): wall clock, in seconds, shared with the process
+            recording the notifications.
+        sleep (callable): sleeps for a number of seconds.
+
+    Returns:
+        list: `[sent_at, first_index, count]` of every pipeline.
+    """
+    batches = []
+    total = int(rate * duration)
+    written = 0
+    started = clock()
+    while written < total:
+        due = min(int((clock() - started) * rate), total) - written
+        if due > 0:
+            pipeline = client.pipeline(transaction=False)
+            for index in range(start + written, start + written + due):
+                pipeline.set(key_name(index, keys, patterns), index)
+            sent_at = clock()
+            pipeline.execute()
+            batches.append([sent_at, start + written, due])
+            written += due
+        sleep(TICK)
+    return batches
+
+
+def kill_pubsub_connections(client):
+    """Disconnect every pub/sub connection of the server.
+
+    Returns:
+        int: number of connections killed.
+    """
+    return client.execute_command('CLIENT', 'KILL', 'TYPE', 'pubsub')
+
+
+def run_load(
+    client,
+    rate,
+    duration,
+    keys,
+    patterns,
+    kill=False,
+    drain=1,
+    recovery_window=5,
+    clock=time.time,
+    sleep=time.sleep,
+):
+    """Run the load of a benchmark.
+
+    Keys are written for `duration` seconds. With `kill`, once the
+    notifications have had `drain` seconds to be handled, the pub/sub
+    connections are killed and keys keep being written for
+    `recovery_window` seconds, so the subscribers have something to recover.
+
+    Returns:
+        dict: `throughput` and `recovery` writes (see `generate`), and when
+        the connections were killed (`killed_at`).
+    """
+    load = {'throughput': [], 'recovery': [], 'killed_at': None}
+    load['throughput'] = generate(
+        client, rate, duration, keys, patterns, clock=clock, sleep=sleep
+    )
+    if kill:
+        sleep(drain)
+        load['killed_at'] = clock()
+        kill_pubsub_connections(client)
+        load['recovery'] = generate(
+            client,
+            rate,
+            recovery_window,
+            keys,
+            patterns,
+            start=int(rate * duration),
+            clock=clock,
+            sleep=sleep,
+        )
+    return load
@@ -0,0 +1,227 @@
+import math
+import sys
+import time
+from collections import defaultdict, deque
+
+from .load import key_name
+
+HIGHER = 'higher'
+"""Metrics that regress when they go down."""
+
+LOWER = 'lower'
+"""Metrics that regress when they go up."""
+
+COMPARED_METRICS = (
+    ('notifications_per_second', HIGHER),
+    ('latency.p50', LOWER),
+    ('latency.p99', LOWER),
+    ('memory_growth_bytes', LOWER),
+    ('recovery_seconds', LOWER),
+)
+"""Metrics compared between results, with the direction that is better."""
+
+DEFAULT_TOLERANCE = 0.1
+"""Default relative change of a metric tolerated before it is a regression."""
+
+
+def percentile(values, percent):
+    """Return a percentile of sorted values (nearest rank), or `None`."""
+    if not values:
+        return None
+    return values[max(math.ceil(percent / 100 * len(values)), 1) - 1]
+
+
+def notification_key(channel):
+    """Return the key of a key-space notification channel."""
+    if isinstance(channel, bytes):
+        channel = channel.decode('utf-8', 'surrogateescape')
+    return channel.split(':', 1)[1]
+
+
+def match_latencies(batches, notifications, keys, patterns):
+    """Measure the latency of every notification.
+
+    Notifications about a key are handled in the order its writes were sent,
+    so every notification is matched to the oldest unmatched write of its key.
+
+    Args:
+        batches (list): writes, as returned by `load.generate`.
+        notifications (list): `(handled_at, channel)` of every notification.
+        keys (int): number of distinct keys written.
+        patterns (int): number of key patterns.
+
+    Returns:
+        list(float): sorted latencies, in seconds.
+    """
+    writes = defaultdict(deque)
+    for sent_at, first, count in batches:
+        for index in range(first, first + count):
+            writes[key_name(index, keys, patterns)].append(sent_at)
+
+    latencies = []
+    for handled_at, channel in notifications:
+        pending = writes.get(notification_key(channel))
+        if pending:
+            latencies.append(handled_at - pending.popleft())
+    return sorted(latencies)
+
+
+def analyse(load, recorder, keys, patterns, memory_growth):
+    """Compute the results of a benchmark.
+
+    Args:
+        load (dict): writes of the load generator (see `load.run_load`).
+        recorder (Recorder): notifications handled by the entrypoint.
+        keys (int): number of distinct keys written.
+        patterns (int): number of key patterns.
+        memory_growth (int): growth of the resident memory, in bytes.
+
+    Returns:
+        dict: benchmark results.
+    """
+    killed_at = load['killed_at']
+    notifications = [
+        (handled_at, channel)
+        for handled_at, channel in recorder.notifications
+        if killed_at is None or handled_at < killed_at
+    ]
+    batches = load['throughput']
+    writes = sum(count for _, _, count in batches)
+    latencies = match_latencies(batches, notifications, keys, patterns)
+
+    throughput = None
+    if batches and notifications:
+        elapsed = notifications[-1][0] - batches[0][0]
+        throughput = len(notifications) / elapsed if elapsed > 0 else None
+
+    recovery = None
+    if killed_at is not None:
+        recovered = [
+            handled_at
+            for handled_at, _ in recorder.notifications
+            if handled_at >= killed_at
+        ]
+        recovery = recovered[0] - killed_at if recovered else None
+
+    return {
+        'writes': writes,
+        'notifications': len(notifications),
+        'lost': writes - len(latencies),
+        'notifications_per_second': throughput,
+        'latency': _latency(latencies),
+        'memory_growth_bytes': memory_growth,
+        'recovery_seconds': recovery,
+    }
+
+
+def analyse_replay(fed, recorder):
+    """Compute the results of a replay benchmark.
+
+    Every notification handled is matched to the oldest unmatched one fed to
+    the entrypoint on its channel.
+
+    Args:
+        fed (list): `(fed_at, channel)` of every notification replayed.
+        recorder (Recorder): notifications handled by the entrypoint.
+
+    Returns:
+        dict: benchmark results.
+    """
+    pending = defaultdict(deque)
+    for fed_at, channel in fed:
+        pending[channel].append(fed_at)
+
+    latencies = []
+    for handled_at, channel in recorder.notifications:
+        if pending[channel]:
+            latencies.append(handled_at - pending[channel].popleft())
+    latencies.sort()
+
+    throughput = None
+    if fed and recorder.notifications:
+        elapsed = recorder.notifications[-1][0] - fed[0][0]
+        throughput = len(recorder.notifications) / elapsed if elapsed > 0 else None
+
+    return {
+        'replayed': len(fed),
+        'notifications': len(recorder.notifications),
+        'lost': len(fed) - len(latencies),
+        'notifications_per_second': throughput,
+        'latency': _latency(latencies),
+    }
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Compare the results of two benchmarks.
+
+    Args:
+        baseline (dict): results document of the reference run.
+        current (dict): results document of the run being checked.
+        tolerance (float): relative change tolerated before a metric that
+            got worse is a regression.
+
+    Returns:
+        list(tuple): `(metric, baseline, current, change, regressed)` for
+        every metric measured in both runs. `change` is relative to the
+        baseline (`None` when the baseline is zero).
+    """
+    rows = []
+    for metric, better in COMPARED_METRICS:
+        before = _lookup(baseline['results'], metric)
+        after = _lookup(current['results'], metric)
+        if before is None or after is None:
+            continue
+
+        change = (after - before) / before if before else None
+        worse = after < before if better == HIGHER else after > before
+        regressed = worse and (change is None or abs(change) > tolerance)
+        rows.append((metric, before, after, change, regressed))
+    return rows
+
+
+def document(config, results, label=None):
+    """Build the machine-readable document of a benchmark run."""
+    return {
+        'benchmark': 'nameko-rediskn',
+        'label': label,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': '{}.{}.{}'.format(*sys.version_info[:3]),
+        'versions': {
+            name: _version(name) for name in ('nameko-rediskn', 'nameko', 'redis')
+        },
+        'config': config,
+        'results': results,
+    }
+
+
+def _latency(latencies):
+    return {
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'max': latencies[-1] if latencies else None,
+    }
+
+
+def _lookup(results, metric):
+    value = results
+    for name in metric.split('.'):
+        value = value.get(name)
+        if value is None:
+            return None
+    return value
+
+
+def _version(distribution):
+    try:
+        from importlib.metadata import version
+    except ImportError:  # Python < 3.8
+        from pkg_resources import get_distribution
+
+        def version(name):
+            return get_distribution(name).version
+
+    try:
+        return version(distribution)
+    except Exception:
+        return None
@@ -0,0 +1,270 @@
+import json
+import os
+import resource
+import socket
+import sys
+import time
+
+import eventlet
+from eventlet.green import subprocess
+from nameko.containers import ServiceContainer
+from redis import StrictRedis
+
+from nameko_rediskn import rediskn
+from nameko_rediskn.recording import replay
+from nameko_rediskn.testing import FakeRedisServer
+
+from .load import key_patterns
+from .results import analyse, analyse_replay
+
+URI_CONFIG_KEY = 'BENCHMARK'
+"""Redis URI config key of the benchmark service."""
+
+NOTIFICATION_EVENTS = 'K$'
+"""Keyspace notifications needed by the benchmark (key-space, strings)."""
+
+SERVER_START_TIMEOUT = 5
+"""Maximum time, in seconds, to wait for a spawned `redis-server`."""
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Recorder:
+
+    """Record the time every message is handled at."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.notifications = []
+        self.subscriptions = []
+
+    def record(self, payload):
+        """Record a message, or a batch of them."""
+        handled_at = self.clock()
+        for message in payload if isinstance(payload, list) else (payload,):
+            if message['type'] == rediskn.REDIS_PMESSAGE_TYPE:
+                self.notifications.append((handled_at, message['channel']))
+            else:
+                self.subscriptions.append(handled_at)
+
+
+def create_service(recorder, patterns, db, options):
+    """Create the benchmark service class, subscribed to `patterns` patterns."""
+
+    class BenchmarkService:
+
+        name = 'rediskn_benchmark'
+
+        @rediskn.subscribe(
+            uri_config_key=URI_CONFIG_KEY,
+            keys=key_patterns(patterns),
+            dbs=[db],
+            **options,
+        )
+        def handle(self, message):
+            recorder.record(message)
+
+    return BenchmarkService
+
+
+class RedisServer:
+
+    """Local `redis-server` started for a benchmark, on a free port."""
+
+    def __init__(self, executable='redis-server'):
+        self.executable = executable
+        self.port = _free_port()
+        self.uri = 'redis://localhost:{}/0'.format(self.port)
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [
+                self.executable,
+                '--port',
+                str(self.port),
+                '--save',
+                '',
+                '--appendonly',
+                'no',
+                '--notify-keyspace-events',
+                NOTIFICATION_EVENTS,
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+        client = StrictRedis.from_url(self.uri)
+        deadline = time.time() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                client.ping()
+                break
+            except Exception:
+                if time.time() > deadline:
+                    self.__exit__(None, None, None)
+                    raise
+                eventlet.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
+
+
+def rss_bytes():
+    """Return the resident memory of the process, in bytes."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Peak instead of current, in kilobytes on Linux and bytes on macOS
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def run_benchmark(
+    uri,
+    rate,
+    duration,
+    keys,
+    patterns,
+    options=None,
+    max_workers=10,
+    backoff_factor=0.1,
+    kill=False,
+    drain=1,
+    recovery_window=5,
+    warmup=0.5,
+):
+    """Run a benchmark of `RedisKNEntrypoint` against a Redis server.
+
+    A service subscribed to `patterns` key patterns runs in this process,
+    while a load generator process writes `keys` keys at `rate` writes per
+    second (see `benchmarks.load.run_load`).
+
+    Args:
+        uri (str): Redis URI, whose db is the one written to.
+        options (dict): extra `subscribe` arguments (e.g. `parse_messages`).
+        max_workers (int): maximum number of workers of the service.
+        backoff_factor (float): reconnection backoff factor.
+        warmup (float): time, in seconds, given to the service to subscribe.
+
+    Returns:
+        dict: benchmark results (see `benchmarks.results.analyse`).
+    """
+    client = StrictRedis.from_url(uri)
+    db = client.connection_pool.connection_kwargs['db']
+    recorder = Recorder()
+    config = {
+        'REDIS': {
+            'notification_events': NOTIFICATION_EVENTS,
+            'pubsub_backoff_factor': backoff_factor,
+        },
+        'REDIS_URIS': {URI_CONFIG_KEY: uri},
+        'max_workers': max_workers,
+    }
+    container = ServiceContainer(
+        create_service(recorder, patterns, db, options or {}), config
+    )
+    container.start()
+    try:
+        eventlet.sleep(warmup)
+        memory_before = rss_bytes()
+        load = _run_load_process(
+            uri, rate, duration, keys, patterns, kill, drain, recovery_window
+        )
+        # Let the last notifications be handled
+        eventlet.sleep(drain)
+        memory_growth = rss_bytes() - memory_before
+    finally:
+        container.stop()
+        _delete_keys(client)
+
+    return analyse(load, recorder, keys, patterns, memory_growth)
+
+
+def run_replay(path, speed=1, options=None, max_workers=10, drain=1):
+    """Replay a notification log into a `RedisKNEntrypoint`.
+
+    The service runs in this process, connected to a `FakeRedisServer`, and
+    the notifications recorded in the log (see `nameko_rediskn.recording`)
+    are fed straight into its entrypoint, so no Redis server is needed.
+
+    Args:
+        path (str): path of the log.
+        speed (float): replay speed relative to the recording, or
+            `MAX_SPEED`.
+        options (dict): extra `subscribe` arguments (e.g. `parse_messages`).
+        max_workers (int): maximum number of workers of the service.
+        drain (float): time, in seconds, given to the notifications to be
+            handled after the replay.
+
+    Returns:
+        dict: benchmark results (see `benchmarks.results.analyse_replay`).
+    """
+    recorder = Recorder()
+    fed = []
+    with FakeRedisServer() as server:
+        config = {
+            'REDIS_URIS': {URI_CONFIG_KEY: server.uri()},
+            'max_workers': max_workers,
+        }
+        container = ServiceContainer(
+            create_service(recorder, 1, 0, options or {}), config
+        )
+        container.start()
+        try:
+            (entrypoint,) = container.entrypoints
+
+            def feed(message):
+                fed.append((time.time(), message['channel']))
+                entrypoint.handle_message(message)
+
+            replay(
+                path, feed, speed=speed, decode_responses=entrypoint.decode_responses
+            )
+            eventlet.sleep(drain)
+        finally:
+            container.stop()
+
+    return analyse_replay(fed, recorder)
+
+
+def _run_load_process(uri, rate, duration, keys, patterns, kill, drain, window):
+    # A process of its own, so writing does not compete with the service
+    command = [
+        sys.executable,
+        '-m',
+        'benchmarks',
+        'load',
+        '--uri',
+        uri,
+        '--rate',
+        str(rate),
+        '--duration',
+        str(duration),
+        '--keys',
+        str(keys),
+        '--patterns',
+        str(patterns),
+        '--drain',
+        str(drain),
+        '--recovery-window',
+        str(window),
+    ]
+    if kill:
+        command.append('--kill')
+    output = subprocess.check_output(command, cwd=_ROOT)
+    return json.loads(output.decode('utf-8'))
+
+
+def _delete_keys(client):
+    keys = list(client.scan_iter(match='bench:*', count=1000))
+    for start in range(0, len(keys), 1000):
+        end = start + 1000
+        client.delete(*keys[start:end])
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
@@ -32,7 +32,8 @@ setup(
             'check-manifest',
             'restructuredtext-lint',
             'Pygments',
-        ]
+        ],
+        'hiredis': ['hiredis'],
     },
     zip_safe=True,
     license='MIT License',
@@ -0,0 +1,126 @@
+import eventlet
+
+from .events import KEYSPACE, parse_channel
+
+
+def group_by_db(message):
+    """Batch key function grouping messages by their Redis database.
+
+    Args:
+        message (dict): notification message.
+
+    Returns:
+        str: the database the notification comes from, as found in the
+        originating channel (e.g. `'0'` for `__keyspace@0__:foo`).
+    """
+    _, db, _ = parse_channel(message['channel'])
+    return db
+
+
+def group_by_key_prefix(separator=':'):
+    """Build a batch key function grouping messages by key prefix.
+
+    The key is taken from the channel for key-space notifications and from
+    the payload for key-event notifications.
+
+    Args:
+        separator (str): the prefix is the part of the key before the first
+            occurrence of `separator`.
+
+    Returns:
+        callable: a function that takes a message and returns its key prefix.
+    """
+
+    def key_prefix(message):
+        kind, _, suffix = parse_channel(message['channel'])
+        key = suffix if kind == KEYSPACE else message['data']
+        if isinstance(key, bytes):
+            return key.split(separator.encode(), 1)[0]
+        if not isinstance(key, str):
+            # Subscription confirmations carry an integer payload
+            return None
+        return key.split(separator, 1)[0]
+
+    return key_prefix
+
+
+class Batcher:
+
+    """Accumulate messages into batches and hand them over in one go.
+
+    Messages are grouped using the `key` function (all in the same group by
+    default). A group is flushed when it reaches the current batch size or
+    when its oldest message has waited `max_latency` seconds, whichever comes
+    first.
+
+    With `adaptive` sizing the batch size starts at 1 (no added latency) and
+    doubles every time a batch fills up, up to `batch_size`. It halves again
+    every time a batch has to be flushed by the latency timer, so batches only
+    grow while messages are arriving faster than they can be batched.
+    """
+
+    def __init__(self, flush, batch_size, max_latency, adaptive=False, key=None):
+        """Initialize the batcher.
+
+        Args:
+            flush (callable): called with every completed batch (a list of
+                messages).
+            batch_size (int): maximum number of messages per batch.
+            max_latency (float): maximum time, in seconds, a message waits in
+                a partial batch before it is flushed.
+            adaptive (bool): adapt the batch size to the message rate.
+            key (callable): function returning the group of a message.
+        """
+        self._flush = flush
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.adaptive = adaptive
+        self._key = key
+        self.current_size = 1 if adaptive else batch_size
+        self._batches = {}
+        self._timers = {}
+
+    def add(self, message):
+        """Add a message, flushing its group if the batch is complete."""
+        key = None if self._key is None else self._key(message)
+        batch = self._batches.setdefault(key, [])
+        batch.append(message)
+
+        if len(batch) >= self.current_size:
+            self._flush_group(key)
+            if self.adaptive:
+                self.current_size = min(self.current_size * 2, self.batch_size)
+        elif key not in self._timers:
+            self._timers[key] = eventlet.spawn_after(
+                self.max_latency, self._expire_group, key
+            )
+
+    def flush(self):
+        """Flush all the pending batches."""
+        for key in list(self._batches):
+            self._flush_group(key)
+
+    def cancel(self):
+        """Discard all the pending batches."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._batches.clear()
+
+    def __len__(self):
+        return sum(len(batch) for batch in self._batches.values())
+
+    def _expire_group(self, key):
+        self._timers.pop(key, None)
+        if self.adaptive:
+            self.current_size = max(self.current_size // 2, 1)
+        self._flush_group(key)
+
+    def _flush_group(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._batches.pop(key, None)
+        if batch:
+            self._flush(batch)
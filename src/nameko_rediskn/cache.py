@@ -0,0 +1,314 @@
+import logging
+import time
+from collections import OrderedDict
+
+from nameko.extensions import DependencyProvider
+from redis import StrictRedis
+
+from .events import parse_channel
+from .rediskn import REDIS_PMESSAGE_TYPE, RedisKNEntrypoint, redis_options, to_list
+from .routing import compile_glob
+from .tracking import ALL_KEYS, INVALIDATE_EVENT
+
+DEFAULT_MAX_SIZE = 10000
+"""Default maximum number of values held by a near cache."""
+
+CACHED_COMMANDS = ('GET', 'HGETALL')
+"""Commands whose replies are cached."""
+
+MISSING = object()
+"""Returned by `NearCache.get` when the value is not cached."""
+
+log = logging.getLogger(__name__)
+
+
+class NearCache:
+
+    """In-process LRU cache of Redis replies, with an optional time to live.
+
+    Values are only cached while the cache is enabled, i.e. while it is being
+    kept coherent by the notifications. Reading a key reserves it first, so a
+    value read while the key was being invalidated is not cached.
+
+    Keys can be given as `str` or `bytes` (e.g. when responses are not
+    decoded), both refer to the same cached replies.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=None, clock=time.monotonic):
+        """Initialize the cache.
+
+        Args:
+            max_size (int): maximum number of values, the least recently used
+                one being evicted when it is reached.
+            ttl (float): time, in seconds, values are cached for. Forever by
+                default.
+            clock (callable): monotonic clock, in seconds.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._entries = OrderedDict()
+        self._reservations = {}
+
+    def get(self, command, key):
+        """Return the cached reply of a command, or `MISSING`."""
+        key = _encode(key)
+        entry = self._entries.get((command, key))
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or expires_at > self.clock():
+                self._entries.move_to_end((command, key))
+                self.hits += 1
+                return value
+            del self._entries[(command, key)]
+        self.misses += 1
+        return MISSING
+
+    def reserve(self, command, key):
+        """Reserve a key about to be read, returning the reservation token."""
+        token = object()
+        if self.enabled:
+            self._reservations[(command, _encode(key))] = token
+        return token
+
+    def put(self, command, key, value, token):
+        """Cache the reply of a command, unless invalidated since reserved.
+
+        Returns:
+            bool: whether the reply was cached.
+        """
+        key = _encode(key)
+        if self._reservations.get((command, key)) is not token:
+            return False
+        del self._reservations[(command, key)]
+
+        expires_at = None if self.ttl is None else self.clock() + self.ttl
+        self._entries[(command, key)] = (value, expires_at)
+        self._entries.move_to_end((command, key))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        return True
+
+    def release(self, command, key, token):
+        """Drop a reservation, e.g. when reading the key failed."""
+        key = _encode(key)
+        if self._reservations.get((command, key)) is token:
+            del self._reservations[(command, key)]
+
+    def invalidate(self, key):
+        """Forget the cached replies about `key`."""
+        key = _encode(key)
+        for command in CACHED_COMMANDS:
+            self._entries.pop((command, key), None)
+            self._reservations.pop((command, key), None)
+
+    def clear(self):
+        """Forget every cached reply."""
+        self._entries.clear()
+        self._reservations.clear()
+
+    def enable(self):
+        """Start caching, from scratch."""
+        self.clear()
+        self.enabled = True
+
+    def disable(self):
+        """Stop caching, forgetting every cached reply."""
+        self.enabled = False
+        self.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CachedRedis:
+
+    """Redis client reading through a `NearCache`.
+
+    Only the keys for which `cacheable` returns `True` are cached. Cached
+    replies are shared between workers and must not be modified.
+    """
+
+    def __init__(self, client, cache, cacheable):
+        self.client = client
+        self.cache = cache
+        self.cacheable = cacheable
+
+    def get(self, key):
+        """GET a key, from the cache if possible."""
+        return self._read('GET', key, self.client.get)
+
+    def hgetall(self, key):
+        """HGETALL a key, from the cache if possible."""
+        return self._read('HGETALL', key, self.client.hgetall)
+
+    def invalidate(self, key):
+        """Forget the cached replies about `key` (e.g. after writing it)."""
+        self.cache.invalidate(key)
+
+    def _read(self, command, key, read):
+        if not self.cacheable(key):
+            return read(key)
+
+        value = self.cache.get(command, key)
+        if value is not MISSING:
+            return value
+
+        token = self.cache.reserve(command, key)
+        try:
+            value = read(key)
+        except Exception:
+            self.cache.release(command, key, token)
+            raise
+        self.cache.put(command, key, value, token)
+        return value
+
+
+class InvalidationListener(RedisKNEntrypoint):
+
+    """Entrypoint invalidating a `NearCache` instead of spawning workers.
+
+    The cache is enabled (from scratch) every time the subscriptions are
+    confirmed (or, with `shared_pubsub`, covered by confirmed subscriptions)
+    and disabled when the connection fails, so nothing is served
+    from it while notifications may be missed.
+    """
+
+    def __init__(self, cache, uri_config_key, **kwargs):
+        self.cache = cache
+        super().__init__(uri_config_key, **kwargs)
+
+    def handle_message(self, message):
+        if message['type'] == REDIS_PMESSAGE_TYPE:
+            _, _, key = parse_channel(message['channel'])
+            if self.tracking and _is_flush(key, message['data']):
+                self.cache.clear()
+            else:
+                self.cache.invalidate(key)
+
+    def stop(self):
+        super().stop()
+        self.cache.disable()
+
+    def kill(self):
+        super().kill()
+        self.cache.disable()
+
+    def _on_subscribed(self, count, duration, **kwargs):
+        super()._on_subscribed(count, duration, **kwargs)
+        log.debug('%s enabled the near cache', self)
+        self.cache.enable()
+
+    def _on_disconnected(self):
+        super()._on_disconnected()
+        log.debug('%s disabled the near cache', self)
+        self.cache.disable()
+
+
+class RedisKNCache(DependencyProvider):
+
+    """Dependency reading hot keys through an in-process near cache.
+
+    GET and HGETALL replies are cached, up to `max_size` of them (least
+    recently used first out) and optionally for up to `ttl` seconds. The keys
+    matching `keys` (in the db of the Redis URI) are invalidated by their
+    keyspace notifications, or by client-side caching invalidations with
+    `tracking`, through an `InvalidationListener` (so `shared_pubsub` and the
+    rest of the `REDIS` config apply). The whole cache is flushed when the
+    connection fails, and nothing is cached until it is subscribed again.
+
+    Example:
+
+        class Service:
+
+            name = 'service'
+
+            redis = RedisKNCache('redis', keys='user:*')
+
+            @rpc
+            def get_user(self, user_id):
+                return self.redis.hgetall('user:{}'.format(user_id))
+    """
+
+    def __init__(
+        self,
+        uri_config_key,
+        keys,
+        max_size=DEFAULT_MAX_SIZE,
+        ttl=None,
+        tracking=False,
+        decode_responses=True,
+        **kwargs
+    ):
+        """Initialize the dependency.
+
+        Args:
+            uri_config_key (str): Redis URI config key.
+            keys (str or list(str)): patterns of the keys to cache, only keys
+                matching them are kept coherent.
+            max_size (int): maximum number of cached replies.
+            ttl (float): time, in seconds, replies are cached for. Forever by
+                default.
+            tracking (bool): invalidate with client-side caching invalidations
+                instead of keyspace notifications.
+            decode_responses (bool): when `False`, keys and values are `bytes`.
+        """
+        self.uri_config_key = uri_config_key
+        self.keys = to_list(keys)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.tracking = tracking
+        self.decode_responses = decode_responses
+        self.cache = None
+        self.listener = None
+        self.client = None
+        self._regexes = [compile_glob(key) for key in self.keys]
+        super().__init__(**kwargs)
+
+    def bind(self, container, attr_name):
+        instance = super().bind(container, attr_name)
+        # Bound here so that the container manages the listener
+        instance.cache = NearCache(max_size=self.max_size, ttl=self.ttl)
+        instance.listener = InvalidationListener(
+            instance.cache,
+            self.uri_config_key,
+            keys=self.keys,
+            tracking=self.tracking,
+            decode_responses=self.decode_responses,
+        ).bind(container, attr_name)
+        return instance
+
+    def setup(self):
+        redis_uri = self.container.config['REDIS_URIS'][self.uri_config_key]
+        self.client = StrictRedis.from_url(
+            redis_uri, **redis_options(self.decode_responses)
+        )
+
+    def get_dependency(self, worker_ctx):
+        return CachedRedis(self.client, self.cache, self.cacheable)
+
+    def cacheable(self, key):
+        """Whether `key` matches `keys`, so that it is kept coherent."""
+        if isinstance(key, bytes):
+            key = key.decode('utf-8', 'surrogateescape')
+        return any(regex.fullmatch(key) is not None for regex in self._regexes)
+
+
+def _encode(key):
+    # Keys are encoded as redis-py does, decoded ones the way `cacheable` does
+    if isinstance(key, str):
+        return key.encode('utf-8', 'surrogateescape')
+    return key
+
+
+def _is_flush(key, event):
+    if isinstance(key, bytes):
+        key = key.decode('utf-8', 'surrogateescape')
+    if isinstance(event, bytes):
+        event = event.decode('ascii')
+    return key == ALL_KEYS and event == INVALIDATE_EVENT
@@ -0,0 +1,162 @@
+import logging
+
+import eventlet
+from eventlet import sleep
+from redis import StrictRedis
+
+DEFAULT_REFRESH_INTERVAL = 5
+"""
+Default time, in seconds, between checks of the Redis Cluster topology (to
+follow slot migrations and failovers).
+"""
+
+log = logging.getLogger(__name__)
+
+
+def cluster_masters(slots, default_host):
+    """Find the master nodes in a `CLUSTER SLOTS` reply.
+
+    Args:
+        slots (list): `CLUSTER SLOTS` reply, where every item holds the start
+            and end of a slot range, followed by its master and its replicas
+            as `[host, port, ...]` lists.
+        default_host (str): host of the node that replied, used for the nodes
+            whose host is unknown (an empty string).
+
+    Returns:
+        set(tuple(str, int)): `(host, port)` of the master nodes.
+    """
+    masters = set()
+    for slot_range in slots:
+        host, port = slot_range[2][:2]
+        if isinstance(host, bytes):
+            host = host.decode('utf-8')
+        masters.add((host or default_host, int(port)))
+    return masters
+
+
+def derived_client(client, **connection_kwargs):
+    """Create a client with the settings of `client` but a few overrides.
+
+    Args:
+        client (StrictRedis): client to take the settings from.
+        **connection_kwargs: connection settings to override (e.g. `host` and
+            `port`, or `db`).
+
+    Returns:
+        StrictRedis: client with its own connection pool.
+    """
+    pool = client.connection_pool
+    pool_kwargs = dict(pool.connection_kwargs, **connection_kwargs)
+    derived_pool = type(pool)(
+        connection_class=pool.connection_class,
+        max_connections=pool.max_connections,
+        **pool_kwargs,
+    )
+    return StrictRedis(connection_pool=derived_pool)
+
+
+class DbClients:
+
+    """Clients of every db, derived from a template client when first used."""
+
+    def __init__(self, client):
+        self.client = client
+        self._clients = {}
+
+    def get(self, db):
+        """Return the client of a db."""
+        db = int(db)
+        if db not in self._clients:
+            connected_db = self.client.connection_pool.connection_kwargs.get('db', 0)
+            if db == connected_db:
+                self._clients[db] = self.client
+            else:
+                self._clients[db] = derived_client(self.client, db=db)
+        return self._clients[db]
+
+    def close(self):
+        """Disconnect the derived clients."""
+        for client in self._clients.values():
+            if client is not self.client:
+                client.connection_pool.disconnect()
+        self._clients.clear()
+
+
+class ClusterReaders:
+
+    """Read keyspace notifications from every master node of a Redis Cluster.
+
+    Keyspace notifications are only published by the node owning the key, so
+    every master node is listened to by its own greenthread. The topology is
+    checked every `refresh_interval` seconds, starting readers for new master
+    nodes and stopping the readers of the nodes that are no longer masters.
+    """
+
+    def __init__(self, client, listen, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        """Initialize the readers.
+
+        Args:
+            client (StrictRedis): client connected to one of the nodes, used
+                as a template for the clients of the rest of the nodes.
+            listen (callable): called with the client of a node to listen to
+                it, until the greenthread is killed.
+            refresh_interval (float): time, in seconds, between checks of the
+                cluster topology.
+        """
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.readers = {}
+        self._listen = listen
+        self._clients = {}
+
+    def run(self):
+        """Follow the cluster topology forever."""
+        try:
+            while True:
+                try:
+                    self.refresh()
+                except Exception:
+                    log.exception('Error refreshing the Redis Cluster topology')
+                sleep(self.refresh_interval)
+        finally:
+            self.close()
+
+    def refresh(self):
+        """Start and stop readers to match the current master nodes."""
+        masters = self._masters()
+
+        for node in set(self.readers) - masters:
+            log.info('Stopped listening to Redis Cluster node %s:%d', *node)
+            self.readers.pop(node).kill()
+            self._clients.pop(node).connection_pool.disconnect()
+
+        for node in masters - set(self.readers):
+            log.info('Started listening to Redis Cluster node %s:%d', *node)
+            host, port = node
+            client = derived_client(self.client, host=host, port=port)
+            self._clients[node] = client
+            self.readers[node] = eventlet.spawn(self._listen, client)
+
+    def close(self):
+        """Stop all the readers and disconnect their clients."""
+        for reader in self.readers.values():
+            reader.kill()
+        for client in self._clients.values():
+            client.connection_pool.disconnect()
+        self.readers.clear()
+        self._clients.clear()
+
+    def _masters(self):
+        # Any known node can describe the topology, in case the first one is
+        # gone
+        clients = [self.client] + list(self._clients.values())
+        for index, client in enumerate(clients, 1):
+            try:
+                slots = client.execute_command('CLUSTER SLOTS')
+            except Exception:
+                if index == len(clients):
+                    raise
+                continue
+            host = client.connection_pool.connection_kwargs.get('host')
+            return cluster_masters(slots, host)
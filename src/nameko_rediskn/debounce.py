@@ -0,0 +1,144 @@
+import time
+from collections import OrderedDict
+
+import eventlet
+
+from .events import KEYEVENT, parse_channel
+
+DEFAULT_MAX_PENDING_KEYS = 10000
+"""
+Default maximum number of keys with a pending (debounced) notification. When
+it is reached, the notification of the key that has been pending for longest
+is dispatched early to make room.
+"""
+
+
+def debounce_key(message):
+    """Debounce key function identifying the db, key and event of a message.
+
+    Args:
+        message (dict): notification message.
+
+    Returns:
+        tuple: the database, key and event of the notification.
+    """
+    kind, db, suffix = parse_channel(message['channel'])
+    if kind == KEYEVENT:
+        return db, message['data'], suffix
+    return db, suffix, message['data']
+
+
+class _Pending:
+
+    __slots__ = ('message', 'merged', 'first_at', 'last_at', 'timer')
+
+    def __init__(self, message, now):
+        self.message = message
+        self.merged = 1
+        self.first_at = now
+        self.last_at = now
+        self.timer = None
+
+
+class Debouncer:
+
+    """Collapse bursts of notifications about the same key into one.
+
+    A notification is held back until no other notification with the same
+    `key` has been received for `window` seconds, and is then handed over
+    (the latest one, along with the number of notifications it replaced).
+    With `max_wait`, a notification is never held back for longer than
+    `max_wait` seconds since the first notification of the burst, even if
+    notifications keep coming.
+
+    Memory is bounded by `max_pending`: when that many keys are pending, the
+    oldest pending notification is handed over early to make room.
+    """
+
+    def __init__(
+        self,
+        flush,
+        window,
+        max_wait=None,
+        max_pending=DEFAULT_MAX_PENDING_KEYS,
+        key=None,
+    ):
+        """Initialize the debouncer.
+
+        Args:
+            flush (callable): called with every debounced message and the
+                number of notifications merged into it.
+            window (float): time, in seconds, without notifications about a
+                key before its latest notification is handed over.
+            max_wait (float): maximum time, in seconds, a burst is held back.
+            max_pending (int): maximum number of pending keys.
+            key (callable): function returning the debounce key of a message.
+                Defaults to `debounce_key`.
+        """
+        self._flush = flush
+        self.window = window
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self._key = debounce_key if key is None else key
+        self.evicted = 0
+        self._pending = OrderedDict()
+
+    def add(self, message):
+        """Add a message, holding it back until its burst is over."""
+        key = self._key(message)
+        now = time.monotonic()
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            pending.message = message
+            pending.merged += 1
+            pending.last_at = now
+            return
+
+        if len(self._pending) >= self.max_pending:
+            oldest = next(iter(self._pending))
+            self.evicted += 1
+            self._flush_key(oldest)
+
+        pending = _Pending(message, now)
+        delay = self.window
+        if self.max_wait is not None:
+            delay = min(delay, self.max_wait)
+        pending.timer = eventlet.spawn_after(delay, self._expire_key, key)
+        self._pending[key] = pending
+
+    def flush(self):
+        """Hand all the pending messages over."""
+        for key in list(self._pending):
+            self._flush_key(key)
+
+    def cancel(self):
+        """Discard all the pending messages."""
+        for pending in self._pending.values():
+            pending.timer.cancel()
+        self._pending.clear()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _expire_key(self, key):
+        pending = self._pending.get(key)
+        if pending is None:
+            return
+
+        # Timers are not rescheduled on every notification, they are checked
+        # when they fire instead
+        deadline = pending.last_at + self.window
+        if self.max_wait is not None:
+            deadline = min(deadline, pending.first_at + self.max_wait)
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            pending.timer = eventlet.spawn_after(remaining, self._expire_key, key)
+            return
+
+        self._flush_key(key)
+
+    def _flush_key(self, key):
+        pending = self._pending.pop(key)
+        pending.timer.cancel()
+        self._flush(pending.message, pending.merged)
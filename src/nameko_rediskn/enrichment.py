@@ -0,0 +1,148 @@
+import logging
+
+from .batching import Batcher
+from .cluster import DbClients
+from .debounce import debounce_key
+from .events import KeyspaceEvent
+
+FETCH_VALUE = 'value'
+"""Fetch the value of the keys (MGET, `None` if they are not strings)."""
+
+FETCH_TTL = 'ttl'
+"""Fetch the remaining time to live of the keys, in milliseconds (PTTL)."""
+
+FETCH_TYPE = 'type'
+"""Fetch the type of the keys (TYPE)."""
+
+FETCHES = frozenset((FETCH_VALUE, FETCH_TTL, FETCH_TYPE))
+
+DEFAULT_FETCH_WINDOW = 0.005
+"""Default maximum time, in seconds, a message waits for its key to be fetched."""
+
+DEFAULT_FETCH_SIZE = 100
+"""Default maximum number of keys fetched at once."""
+
+_FIELDS = {FETCH_VALUE: 'value', FETCH_TTL: 'pttl', FETCH_TYPE: 'key_type'}
+
+log = logging.getLogger(__name__)
+
+
+class Enricher:
+
+    """Attach data about their keys to notification messages.
+
+    Messages are collected for up to `window` seconds (or until `size` of
+    them are pending) per db, and the data about all their keys is fetched
+    with a single MGET or pipeline:
+
+        `value`: value of the key, in the `value` field.
+        `ttl`: remaining time to live of the key, in milliseconds, in the
+        `pttl` field.
+        `type`: type of the key, in the `key_type` field.
+        a callable: called with a (non-transactional) pipeline and the key,
+        it must queue one command, whose reply goes in the `value` field.
+
+    If fetching fails, the messages are forwarded with `None` in the field.
+    """
+
+    def __init__(
+        self,
+        client,
+        fetch,
+        forward,
+        window=DEFAULT_FETCH_WINDOW,
+        size=DEFAULT_FETCH_SIZE,
+    ):
+        """Initialize the enricher.
+
+        Args:
+            client (StrictRedis): Redis client, used as a template for the
+                clients of every db.
+            fetch (str or callable): what to fetch, `value`, `ttl`, `type`
+                or a callable queuing a command on a pipeline.
+            forward (callable): called with every enriched message.
+            window (float): maximum time, in seconds, a message waits for
+                its key to be fetched.
+            size (int): maximum number of keys fetched at once.
+        """
+        self.clients = DbClients(client)
+        self.fetch = fetch
+        self.field = _FIELDS.get(fetch, 'value')
+        self._forward = forward
+        self._batcher = Batcher(self._resolve, size, window, key=_db)
+
+    def add(self, message):
+        """Enrich a message and forward it, once fetched."""
+        if message['type'] != 'pmessage':
+            self._forward(message)
+        else:
+            self._batcher.add(message)
+
+    def flush(self):
+        """Fetch and forward the pending messages now."""
+        self._batcher.flush()
+
+    def cancel(self):
+        """Discard the pending messages."""
+        self._batcher.cancel()
+
+    def close(self):
+        """Disconnect."""
+        self.clients.close()
+
+    def __len__(self):
+        return len(self._batcher)
+
+    def _resolve(self, messages):
+        client = self.clients.get(_db(messages[0]))
+        keys = [_key(message) for message in messages]
+        try:
+            replies = self._fetch(client, keys)
+        except Exception:
+            log.exception('Error fetching %d keys', len(keys))
+            replies = [None] * len(keys)
+
+        for index, message in enumerate(messages):
+            self._forward(_attach(message, self.field, replies[index]))
+
+    def _fetch(self, client, keys):
+        if self.fetch == FETCH_VALUE:
+            return client.mget(keys)
+
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            if self.fetch == FETCH_TTL:
+                pipeline.pttl(key)
+            elif self.fetch == FETCH_TYPE:
+                pipeline.type(key)
+            else:
+                self.fetch(pipeline, key)
+        replies = pipeline.execute()
+
+        if self.fetch == FETCH_TYPE:
+            replies = [
+                reply.decode('ascii') if isinstance(reply, bytes) else reply
+                for reply in replies
+            ]
+        return replies
+
+
+def _db(message):
+    if isinstance(message, KeyspaceEvent):
+        return message.db
+    db, _, _ = debounce_key(message)
+    return int(db)
+
+
+def _key(message):
+    if isinstance(message, KeyspaceEvent):
+        return message.key
+    _, key, _ = debounce_key(message)
+    return key
+
+
+def _attach(message, field, reply):
+    if isinstance(message, KeyspaceEvent):
+        setattr(message, field, reply)
+        return message
+    return dict(message, **{field: reply})
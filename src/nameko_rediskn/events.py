@@ -0,0 +1,215 @@
+import sys
+import time
+
+KEYSPACE = 'keyspace'
+"""Kind of the notifications published to key-space channels."""
+
+KEYEVENT = 'keyevent'
+"""Kind of the notifications published to key-event channels."""
+
+_CHANNEL_PREFIX = '__key'
+_CHANNEL_SEPARATOR = '__:'
+_CHANNEL_KINDS = {
+    'keyspace': KEYSPACE,
+    'keyevent': KEYEVENT,
+    b'keyspace': KEYSPACE,
+    b'keyevent': KEYEVENT,
+}
+
+
+def parse_channel(channel):
+    """Split a notification channel into its parts.
+
+    Only the first `__:` separates the channel header from its suffix, so keys
+    containing `:` (or even `__:`) are preserved.
+
+    Args:
+        channel (str or bytes): channel, e.g. `__keyspace@0__:foo:bar`.
+
+    Returns:
+        tuple(str, str, str): kind (`keyspace` or `keyevent`), db and suffix
+        (the key for key-space channels and the event for key-event ones).
+        The db and suffix are `bytes` if the channel is.
+
+    Raises:
+        ValueError: if the channel is not a keyspace notification channel.
+    """
+    if isinstance(channel, bytes):
+        prefix, at_sign, separator = (
+            _CHANNEL_PREFIX.encode(),
+            b'@',
+            _CHANNEL_SEPARATOR.encode(),
+        )
+    else:
+        prefix, at_sign, separator = _CHANNEL_PREFIX, '@', _CHANNEL_SEPARATOR
+
+    at = channel.find(at_sign)
+    end = channel.find(separator, at)
+    kind = _CHANNEL_KINDS.get(channel[2:at])
+    if not channel.startswith(prefix) or at < 0 or end < 0 or kind is None:
+        raise ValueError('Not a keyspace notification channel: {!r}'.format(channel))
+
+    db_start = at + 1
+    suffix_start = end + len(separator)
+    return kind, channel[db_start:end], channel[suffix_start:]
+
+
+class KeyspaceEvent:
+
+    """Keyspace notification.
+
+    Built from the `pmessage` messages received from Redis, parsing their
+    channel lazily (only when one of `kind`, `db`, `key` or `event` is first
+    read) and only once.
+
+    It also supports item access to the fields of the original message
+    (`type`, `pattern`, `channel` and `data`), so handlers written for
+    dictionaries keep working.
+
+    If the message has not been decoded, its fields are kept as `bytes`: the
+    `key` is delivered intact (even if it is not valid UTF-8) and only the
+    `event` name is decoded, when first read.
+
+    Attributes:
+        type (str): message type (always `pmessage`).
+        pattern (str): pattern that matched.
+        channel (str): originating channel.
+        data (str): message payload.
+        received_at (float): time the message was received, as seconds since
+            the epoch.
+        sequence (int): sequence number of the message, increasing
+            monotonically for every message received by the entrypoint.
+        merged (int): number of notifications this event stands for, when
+            bursts are debounced (1 otherwise).
+        synthetic (bool): whether the event was emitted by the entrypoint
+            (a `snapshot` event, or a tracked `expired` one) rather than
+            received from Redis.
+        key_type (str): type of the key, for `snapshot` events (or when
+            fetched).
+        pttl (int): remaining time to live of the key, in milliseconds, for
+            `snapshot` events (or when fetched).
+        value: value of the key, when fetched.
+    """
+
+    __slots__ = (
+        'type',
+        'pattern',
+        'channel',
+        'data',
+        'received_at',
+        'sequence',
+        'merged',
+        'synthetic',
+        'key_type',
+        'pttl',
+        'value',
+        '_kind',
+        '_db',
+        '_key',
+        '_event',
+    )
+
+    _FIELDS = frozenset(('type', 'pattern', 'channel', 'data'))
+
+    def __init__(self, type, pattern, channel, data, received_at=None, sequence=None):
+        self.type = type
+        self.pattern = pattern
+        self.channel = channel
+        self.data = data
+        self.received_at = time.time() if received_at is None else received_at
+        self.sequence = sequence
+        self.merged = 1
+        self.synthetic = False
+        self.key_type = None
+        self.pttl = None
+        self.value = None
+        self._kind = None
+
+    @classmethod
+    def from_message(cls, message, sequence=None):
+        """Build an event from a message received from Redis."""
+        event = cls(
+            message['type'],
+            message['pattern'],
+            message['channel'],
+            message['data'],
+            sequence=sequence,
+        )
+        if message.get('synthetic'):
+            event.synthetic = True
+            event.key_type = message.get('key_type')
+            event.pttl = message.get('pttl')
+        return event
+
+    @property
+    def kind(self):
+        """str: `keyspace` or `keyevent`."""
+        if self._kind is None:
+            self._parse()
+        return self._kind
+
+    @property
+    def db(self):
+        """int: the Redis database the notification comes from (or `*`)."""
+        if self._kind is None:
+            self._parse()
+        return self._db
+
+    @property
+    def key(self):
+        """str or bytes: the key the notification is about."""
+        if self._kind is None:
+            self._parse()
+        return self._key
+
+    @property
+    def event(self):
+        """str: the (interned) event name, e.g. `set` or `expired`."""
+        if self._kind is None:
+            self._parse()
+        return self._event
+
+    def _parse(self):
+        kind, db, suffix = parse_channel(self.channel)
+        # Client-side caching invalidations are not about a single db
+        self._db = int(db) if db.isdigit() else _intern(db)
+        if kind == KEYSPACE:
+            self._key = suffix
+            self._event = _intern(self.data)
+        else:
+            self._key = self.data
+            self._event = _intern(suffix)
+        self._kind = kind
+
+    def __getitem__(self, name):
+        if name not in self._FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __eq__(self, other):
+        if not isinstance(other, KeyspaceEvent):
+            return NotImplemented
+        return (self.type, self.pattern, self.channel, self.data) == (
+            other.type,
+            other.pattern,
+            other.channel,
+            other.data,
+        )
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<{} {} {!r} {!r}>'.format(
+            type(self).__name__, self.channel, self.data, self.sequence
+        )
+
+
+def _intern(event):
+    if isinstance(event, bytes):
+        # Event names are plain ASCII
+        event = event.decode('ascii')
+    return sys.intern(event)
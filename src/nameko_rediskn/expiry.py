@@ -0,0 +1,344 @@
+import logging
+import time
+from collections import OrderedDict
+
+import eventlet
+
+from .batching import Batcher
+from .cluster import DbClients
+from .debounce import debounce_key
+from .snapshot import SNAPSHOT_EVENT
+
+TOUCH = 'touch'
+"""
+Expiry action reading the key at its deadline, which makes Redis expire it
+(and publish its `expired` notification) right away.
+"""
+
+DISPATCH = 'dispatch'
+"""
+Expiry action dispatching a synthetic `expired` notification at the deadline
+of the key, dropping the one published by Redis later on.
+"""
+
+EXPIRY_ACTIONS = frozenset((TOUCH, DISPATCH))
+
+DEFAULT_RESOLUTION = 0.001
+"""Default duration, in seconds, of the ticks of the timing wheel."""
+
+CANCELLING_EVENTS = frozenset(('set', 'persist', 'del', 'expired', 'rename_from'))
+"""Events removing the time to live of a key (or the key itself)."""
+
+MAX_FIRED_KEYS = 10000
+"""
+Maximum number of keys remembered after dispatching their synthetic `expired`
+notification, to drop the notification published by Redis.
+"""
+
+log = logging.getLogger(__name__)
+
+
+class TimingWheel:
+
+    """Hierarchical timing wheel of deadlines.
+
+    Level `n` has `slots` slots spanning `slots ** n` ticks each, so
+    scheduling and cancelling are O(1) and every tick only looks at one slot
+    (plus, once per rotation of a level, the slot of the level above, whose
+    deadlines are moved down).
+    """
+
+    def __init__(
+        self, resolution=DEFAULT_RESOLUTION, slots=64, levels=6, clock=time.monotonic
+    ):
+        """Initialize the wheel.
+
+        Args:
+            resolution (float): duration, in seconds, of a tick.
+            slots (int): number of slots per level.
+            levels (int): number of levels. Deadlines further away than
+                `slots ** levels` ticks are kept in the last level until they
+                get closer.
+            clock (callable): monotonic clock, in seconds.
+        """
+        self.resolution = resolution
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._entries = {}
+        self._tick = self._now_tick()
+        self._wakeup = None
+
+    def schedule(self, key, deadline):
+        """Schedule (or reschedule) `key` for `deadline` (a `clock` time)."""
+        self.cancel(key)
+        tick = max(int(deadline / self.resolution + 0.5), self._tick + 1)
+        self._place(key, tick)
+        if self._wakeup is not None:
+            self._wakeup.send()
+            self._wakeup = None
+
+    def cancel(self, key):
+        """Forget `key`, if scheduled."""
+        position = self._entries.pop(key, None)
+        if position is not None:
+            level, index = position
+            del self._wheels[level][index][key]
+
+    def advance(self):
+        """Move the wheel to the current time.
+
+        Returns:
+            list: keys whose deadline has passed.
+        """
+        target = self._now_tick()
+        due = []
+        while self._tick < target:
+            if not self._entries:
+                self._tick = target
+                break
+
+            self._tick += 1
+            for level in range(1, self.levels):
+                span = self.slots ** level
+                if self._tick % span:
+                    break
+                self._cascade(level, (self._tick // span) % self.slots)
+
+            index = self._tick % self.slots
+            slot = self._wheels[0][index]
+            if slot:
+                self._wheels[0][index] = {}
+                for key in slot:
+                    del self._entries[key]
+                due.extend(slot)
+        return due
+
+    def next_timeout(self):
+        """Time, in seconds, until the wheel should be advanced, or `None`."""
+        if not self._entries:
+            return None
+        # Up to the end of the current rotation of the first level, when the
+        # next level may have to be moved down
+        ticks = self.slots - self._tick % self.slots
+        for offset in range(1, ticks + 1):
+            if self._wheels[0][(self._tick + offset) % self.slots]:
+                ticks = offset
+                break
+        deadline = (self._tick + ticks) * self.resolution
+        return max(deadline - self.clock(), 0)
+
+    def run(self, callback):
+        """Call `callback` with the keys whose deadline passed, forever."""
+        while True:
+            timeout = self.next_timeout()
+            self._wakeup = eventlet.Event()
+            with eventlet.Timeout(timeout, False):
+                self._wakeup.wait()
+            self._wakeup = None
+            due = self.advance()
+            if due:
+                callback(due)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _now_tick(self):
+        return int(self.clock() / self.resolution)
+
+    def _place(self, key, tick):
+        delta = tick - self._tick
+        level = 0
+        while level < self.levels - 1 and delta >= self.slots ** (level + 1):
+            level += 1
+        # Deadlines beyond the horizon wait in the furthest slot
+        horizon = self._tick + self.slots ** self.levels - 1
+        index = (min(tick, horizon) // self.slots ** level) % self.slots
+        self._wheels[level][index][key] = tick
+        self._entries[key] = (level, index)
+
+    def _cascade(self, level, index):
+        slot = self._wheels[level][index]
+        self._wheels[level][index] = {}
+        for key, tick in slot.items():
+            self._place(key, tick)
+
+
+class ExpiryTracker:
+
+    """Track the time to live of keys to act at their exact deadline.
+
+    Redis only publishes `expired` notifications when it finds an expired
+    key, either when it is accessed or in its active expiry cycle, which only
+    samples a few keys at a time. With large keyspaces that can be seconds or
+    minutes after the deadline.
+
+    The tracker watches the `expire` notifications of the keys, fetches their
+    time to live (with a pipeline per batch of keys) and keeps their deadlines
+    in a `TimingWheel`, forgetting them on `set`, `persist`, `del`, `expired`
+    and `rename_from`. Synthetic `snapshot` notifications carry the time to
+    live of their keys already. At the deadline of a key, depending on
+    `action`, the key is either touched (with a pipeline per db of the keys
+    due at once) or `fire` is called with its db and key.
+
+    Memory is bounded by the number of keys being tracked, plus up to
+    `MAX_FIRED_KEYS` keys whose `expired` notification was dispatched.
+    """
+
+    def __init__(
+        self,
+        client,
+        fire,
+        action=TOUCH,
+        resolution=DEFAULT_RESOLUTION,
+        lookup_size=100,
+        lookup_latency=0.005,
+    ):
+        """Initialize the tracker.
+
+        Args:
+            client (StrictRedis): Redis client, used as a template for the
+                clients of every db.
+            fire (callable): called with the db and key of every key when
+                its deadline passes, with the `dispatch` action.
+            action (str): what to do at the deadline of a key, `touch` or
+                `dispatch`.
+            resolution (float): duration, in seconds, of the ticks of the
+                timing wheel.
+            lookup_size (int): maximum number of keys whose time to live is
+                fetched with a single pipeline.
+            lookup_latency (float): maximum time, in seconds, a key waits for
+                its time to live to be fetched.
+        """
+        self.clients = DbClients(client)
+        self.action = action
+        self.wheel = TimingWheel(resolution=resolution)
+        self.fired = FiredKeys()
+        self._fire = fire
+        self._lookups = Batcher(
+            self._lookup, lookup_size, lookup_latency, key=lambda item: item[0]
+        )
+
+    def observe(self, message):
+        """Update the deadlines with a notification.
+
+        Returns:
+            bool: whether the notification should be dispatched, `False` for
+            the `expired` notifications of the keys already dispatched by the
+            tracker.
+        """
+        if message['type'] != 'pmessage':
+            return True
+        db, key, event = debounce_key(message)
+        if isinstance(event, bytes):
+            event = event.decode('ascii')
+        item = (int(db), key)
+
+        if message.get('synthetic'):
+            if event == SNAPSHOT_EVENT and message['pttl'] >= 0:
+                self.wheel.schedule(item, self.wheel.clock() + message['pttl'] / 1000)
+        elif event == 'expire':
+            self._lookups.add(item)
+        elif event in CANCELLING_EVENTS:
+            self.wheel.cancel(item)
+            if event == 'expired' and self.fired.pop(item):
+                return False
+        return True
+
+    def run(self):
+        """Act on the deadlines of the keys, forever."""
+        self.wheel.run(self._expire)
+
+    def close(self):
+        """Discard the pending lookups and disconnect."""
+        self._lookups.cancel()
+        self.clients.close()
+
+    def _lookup(self, items):
+        db = items[0][0]
+        pipeline = self.clients.get(db).pipeline(transaction=False)
+        for _, key in items:
+            pipeline.pttl(key)
+        try:
+            replies = pipeline.execute()
+        except Exception:
+            log.exception(
+                'Error looking up the deadlines of %d keys in db %s', len(items), db
+            )
+            return
+        now = self.wheel.clock()
+        for index, item in enumerate(items):
+            pttl = replies[index]
+            if pttl is not None and pttl >= 0:
+                self.wheel.schedule(item, now + pttl / 1000)
+            else:
+                # Gone, or no longer expiring
+                self.wheel.cancel(item)
+
+    def _expire(self, items):
+        if self.action == DISPATCH:
+            for db, key in items:
+                self.fired.add((db, key))
+                self._fire(db, key)
+            return
+
+        by_db = {}
+        for db, key in items:
+            by_db.setdefault(db, []).append(key)
+        for db, keys in by_db.items():
+            # Reading an expired key makes Redis delete it and publish its
+            # `expired` notification
+            pipeline = self.clients.get(db).pipeline(transaction=False)
+            for key in keys:
+                pipeline.exists(key)
+            try:
+                pipeline.execute()
+            except Exception:
+                log.exception('Error touching %d expiring keys in db %s', len(keys), db)
+
+
+class FiredKeys:
+
+    """Bounded set of the keys whose synthetic `expired` was dispatched."""
+
+    def __init__(self, max_size=MAX_FIRED_KEYS):
+        self.max_size = max_size
+        self._keys = OrderedDict()
+
+    def add(self, key):
+        self._keys[key] = None
+        if len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+
+    def pop(self, key):
+        """Forget `key`, returning whether it was there."""
+        return self._keys.pop(key, False) is None
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def expired_message(db, key):
+    """Build the synthetic `expired` notification of a key.
+
+    It looks like a key-space `pmessage` notification, subscribed to with the
+    channel itself as the pattern, plus `synthetic` (always `True`). The
+    fields are `bytes` if `key` is.
+    """
+    if isinstance(key, bytes):
+        channel = '__keyspace@{}__:'.format(db).encode() + key
+        event = b'expired'
+    else:
+        channel = '__keyspace@{}__:{}'.format(db, key)
+        event = 'expired'
+    return {
+        'type': 'pmessage',
+        'pattern': channel,
+        'channel': channel,
+        'data': event,
+        'synthetic': True,
+    }
@@ -0,0 +1,143 @@
+from collections import OrderedDict, deque
+from itertools import count
+
+import eventlet
+
+from .events import KEYEVENT, parse_channel
+
+BLOCK = 'block'
+"""Overflow policy making the reader wait until there is room in the queue."""
+
+DROP_OLDEST = 'drop_oldest'
+"""Overflow policy discarding the oldest queued message to make room."""
+
+DROP_NEWEST = 'drop_newest'
+"""Overflow policy discarding the incoming message."""
+
+COALESCE = 'coalesce'
+"""
+Overflow policy replacing the queued message about the same key (if any) with
+the incoming one, keeping its position. When the queue is full and no message
+about the same key is queued, the oldest message is discarded.
+"""
+
+OVERFLOW_POLICIES = frozenset((BLOCK, DROP_OLDEST, DROP_NEWEST, COALESCE))
+
+
+def notification_key(message):
+    """Coalescing key function identifying the Redis key of a message.
+
+    Args:
+        message (dict): notification message.
+
+    Returns:
+        tuple: the database and the key the notification is about.
+    """
+    kind, db, suffix = parse_channel(message['channel'])
+    key = message['data'] if kind == KEYEVENT else suffix
+    return db, key
+
+
+class HandoffQueue:
+
+    """Bounded queue between the Redis reader and the dispatch of messages.
+
+    The reader puts messages in the queue without waiting for them to be
+    handled, so the pub/sub socket keeps being drained while the container
+    has no free workers. A separate greenthread (`run`) takes them out in
+    order and hands them over to `dispatch`, which may block.
+
+    When the queue is full, the `overflow` policy decides what happens to the
+    incoming message (see `BLOCK`, `DROP_OLDEST`, `DROP_NEWEST` and
+    `COALESCE`). Discarded and coalesced messages are counted in `dropped` and
+    `coalesced` respectively.
+    """
+
+    def __init__(self, dispatch, max_size, overflow=BLOCK, key=None):
+        """Initialize the queue.
+
+        Args:
+            dispatch (callable): called with every message taken out of the
+                queue.
+            max_size (int): maximum number of queued messages.
+            overflow (str): overflow policy.
+            key (callable): function returning the coalescing key of a
+                message, only used by the `COALESCE` policy. Defaults to
+                `notification_key`.
+        """
+        self._dispatch = dispatch
+        self.max_size = max_size
+        self.overflow = overflow
+        self._key = notification_key if key is None else key
+        self.dropped = 0
+        self.coalesced = 0
+        self._messages = OrderedDict()
+        self._ids = count()
+        self._not_empty = None
+        # Events of the writers waiting for room, in arrival order
+        self._writers = deque()
+
+    def put(self, message):
+        """Queue a message, applying the overflow policy if the queue is full."""
+        if self.overflow == COALESCE:
+            message_id = self._coalescing_key(message)
+            if message_id in self._messages:
+                self._messages[message_id] = message
+                self.coalesced += 1
+                return
+        else:
+            message_id = next(self._ids)
+
+        while len(self._messages) >= self.max_size:
+            if self.overflow == BLOCK:
+                not_full = eventlet.Event()
+                self._writers.append(not_full)
+                not_full.wait()
+            elif self.overflow == DROP_NEWEST:
+                self.dropped += 1
+                return
+            else:
+                self._messages.popitem(last=False)
+                self.dropped += 1
+
+        self._messages[message_id] = message
+        if self._not_empty is not None:
+            self._not_empty.send()
+            self._not_empty = None
+
+    def run(self):
+        """Hand the queued messages over to `dispatch`, forever."""
+        while True:
+            while not self._messages:
+                self._not_empty = eventlet.Event()
+                self._not_empty.wait()
+            self._dispatch(self._pop())
+
+    def flush(self):
+        """Hand all the queued messages over to `dispatch`."""
+        while self._messages:
+            self._dispatch(self._pop())
+
+    def cancel(self):
+        """Discard all the queued messages."""
+        self._messages.clear()
+        while self._writers:
+            self._wake_writer()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def _pop(self):
+        _, message = self._messages.popitem(last=False)
+        self._wake_writer()
+        return message
+
+    def _wake_writer(self):
+        if self._writers:
+            self._writers.popleft().send()
+
+    def _coalescing_key(self, message):
+        if message['type'] != 'pmessage':
+            # Subscription confirmations are never coalesced
+            return next(self._ids)
+        return self._key(message)
@@ -0,0 +1,175 @@
+import logging
+import math
+import time
+from collections import deque
+
+from eventlet import sleep
+
+CANARY_PREFIX = '__rediskn:canary:'
+"""Prefix of the canary keys written by the lag probes."""
+
+CANARY_TTL = 60
+"""Time to live, in seconds, of the canary keys, so they go away with the probes."""
+
+CANARY_EVENT = 'set'
+"""Event of the canary notifications the lag is measured with."""
+
+DEFAULT_LAG_WINDOW = 100
+"""Default number of lag measurements the percentiles are computed over."""
+
+PERCENTILES = (50, 90, 99)
+"""Percentiles returned by `LagProbe.percentiles` by default."""
+
+log = logging.getLogger(__name__)
+
+
+class LagProbe:
+
+    """Measure the end-to-end lag of the notifications with a canary key.
+
+    Every `interval` seconds, the canary key is SET (with the current time as
+    its value) and the time until its key-space notification is observed is
+    measured, so it accounts for Redis, the pub/sub connection and however
+    the notifications are read and handed over. Only one probe is in flight
+    at a time: while its notification is late, the probe age is the lag.
+
+    When the lag goes over `threshold` seconds the probe is `lagging`, until
+    a notification arrives within the threshold again. `on_alert` is called
+    with the new state on every change. The entrypoints shedding load while
+    lagging count the notifications they drop in `shed`.
+    """
+
+    def __init__(
+        self,
+        client,
+        key,
+        interval,
+        threshold=None,
+        window=DEFAULT_LAG_WINDOW,
+        on_alert=None,
+        clock=time.monotonic,
+    ):
+        """Initialize the probe.
+
+        Args:
+            client (StrictRedis): Redis client of the db the canary key is
+                written to.
+            key (str): canary key.
+            interval (float): time, in seconds, between probes.
+            threshold (float): lag, in seconds, over which the probe is
+                lagging. No alerts by default.
+            window (int): number of measurements kept for the percentiles.
+            on_alert (callable): called with `True` when the lag goes over
+                `threshold` and with `False` when it recovers.
+            clock (callable): monotonic clock, in seconds.
+        """
+        self.client = client
+        self.key = key
+        self.interval = interval
+        self.threshold = threshold
+        self.clock = clock
+        self.samples = deque(maxlen=window)
+        self.lagging = False
+        self.shed = 0
+        self._on_alert = on_alert
+        self._raw_key = key.encode('utf-8')
+        self._sent_at = None
+
+    def run(self):
+        """Probe every `interval` seconds, forever."""
+        while True:
+            self.probe()
+            sleep(self.interval)
+
+    def probe(self):
+        """SET the canary key, unless a probe is still in flight."""
+        if self._sent_at is not None:
+            age = self.clock() - self._sent_at
+            if self.threshold is not None and age > self.threshold:
+                self._alert(True, age)
+            return
+
+        # The notification may be read before SET returns
+        self._sent_at = self.clock()
+        try:
+            self.client.set(self.key, repr(time.time()), ex=CANARY_TTL)
+        except Exception:
+            self._sent_at = None
+            log.exception('Error setting the canary key %s', self.key)
+
+    def is_canary(self, message):
+        """Whether `message` is a notification about the canary key."""
+        channel = message['channel']
+        if isinstance(channel, bytes):
+            return channel.endswith(self._raw_key) or message['data'] == self._raw_key
+        return channel.endswith(self.key) or message['data'] == self.key
+
+    def observe(self, message):
+        """Measure the lag with a canary notification.
+
+        Returns:
+            float: lag, in seconds, or `None` if the message is not the
+            notification of the probe in flight.
+        """
+        event = message['data']
+        if isinstance(event, bytes):
+            event = event.decode('ascii', 'replace')
+        if self._sent_at is None or event != CANARY_EVENT:
+            # Keyevent copies, duplicates through other patterns, expirations
+            return None
+
+        lag = self.clock() - self._sent_at
+        self._sent_at = None
+        self.samples.append(lag)
+        if self.threshold is not None:
+            self._alert(lag > self.threshold, lag)
+        return lag
+
+    def reset(self):
+        """Forget the probe in flight, whose notification may be lost."""
+        self._sent_at = None
+
+    def lag(self):
+        """Return the current lag: the age of a late probe or the last one."""
+        if self._sent_at is not None:
+            age = self.clock() - self._sent_at
+            if not self.samples or age > self.samples[-1]:
+                return age
+        return self.samples[-1] if self.samples else None
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """Return percentiles of the last measurements (nearest rank).
+
+        Returns:
+            dict: lag, in seconds, by percentile. Empty until measured.
+        """
+        samples = sorted(self.samples)
+        if not samples:
+            return {}
+        return {
+            percentile: samples[max(math.ceil(percentile / 100 * len(samples)), 1) - 1]
+            for percentile in percentiles
+        }
+
+    def close(self):
+        """Delete the canary key and disconnect."""
+        try:
+            self.client.delete(self.key)
+        except Exception:
+            log.exception('Error deleting the canary key %s', self.key)
+        self.client.connection_pool.disconnect()
+
+    def _alert(self, lagging, lag):
+        if lagging == self.lagging:
+            return
+        self.lagging = lagging
+        if lagging:
+            log.warning(
+                'Notifications are lagging %.3fs behind (threshold %.3fs)',
+                lag,
+                self.threshold,
+            )
+        else:
+            log.info('Notifications caught up (%.3fs behind)', lag)
+        if self._on_alert is not None:
+            self._on_alert(lagging)
@@ -0,0 +1,310 @@
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from .debounce import debounce_key
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+"""Default upper bounds, in seconds, of the buckets of the histograms."""
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+
+class Counter:
+
+    """Monotonically increasing value, per combination of label values."""
+
+    kind = COUNTER
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        """Yield the `(suffix, labels, value)` samples of the metric."""
+        for labels, value in self.values.items():
+            yield '', self._labels(labels), value
+
+    def _labels(self, labels, *extra):
+        return tuple(zip(self.labelnames, labels)) + extra  # noqa: B905
+
+
+class Gauge(Counter):
+
+    """Value that goes up and down, per combination of label values."""
+
+    kind = GAUGE
+
+    def set(self, value, labels=()):
+        self.values[labels] = value
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(Counter):
+
+    """Distribution of observed values, per combination of label values."""
+
+    kind = HISTOGRAM
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        counts = self.values.get(labels)
+        if counts is None:
+            # A count per bucket, then the +Inf one, the sum and the count
+            counts = self.values[labels] = [0] * (len(self.buckets) + 3)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def samples(self):
+        for labels, counts in self.values.items():
+            cumulative = 0
+            for index, bound in enumerate(self.buckets + ('+Inf',)):
+                cumulative += counts[index]
+                yield '_bucket', self._labels(labels, ('le', bound)), cumulative
+            yield '_sum', self._labels(labels), counts[-2]
+            yield '_count', self._labels(labels), counts[-1]
+
+
+class Registry:
+
+    """Collection of metrics, exported together."""
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+
+    def counter(self, name, documentation, labelnames=()):
+        """Return the counter called `name`, creating it if needed."""
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        """Return the gauge called `name`, creating it if needed."""
+        return self._get(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=()):
+        """Return the histogram called `name`, creating it if needed."""
+        return self._get(Histogram, name, documentation, labelnames)
+
+    def collect(self):
+        """Return all the metrics."""
+        return list(self.metrics.values())
+
+    def export(self, exporter):
+        """Export the metrics with `exporter`, a callable taking them."""
+        return exporter(self.collect())
+
+    def clear(self):
+        """Forget all the metrics."""
+        self.metrics.clear()
+
+    def _get(self, cls, name, documentation, labelnames):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, documentation, labelnames)
+        elif type(metric) is not cls:
+            raise ValueError('{} is already a {}'.format(name, metric.kind))
+        return metric
+
+
+REGISTRY = Registry()
+"""Registry of the entrypoints with metrics enabled."""
+
+
+def prometheus_text(metrics):
+    """Exporter rendering metrics in the Prometheus text exposition format.
+
+    Args:
+        metrics (list): metrics, as returned by `Registry.collect`.
+
+    Returns:
+        str: metrics in the Prometheus text format (version 0.0.4).
+    """
+    lines = []
+    for metric in metrics:
+        lines.append('# HELP {} {}'.format(metric.name, _escape(metric.documentation)))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+        for suffix, labels, value in metric.samples():
+            lines.append(
+                '{}{}{} {}'.format(
+                    metric.name, suffix, _format_labels(labels), _format_value(value)
+                )
+            )
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+class EntrypointMetrics:
+
+    """Metrics of the listener and dispatch hot path of an entrypoint.
+
+    Series about notifications are labelled by `entrypoint`, `db` and
+    `event`, the rest of them by `entrypoint` only.
+    """
+
+    def __init__(self, entrypoint, registry=REGISTRY):
+        """Initialize the metrics.
+
+        Args:
+            entrypoint (str): value of the `entrypoint` label.
+            registry (Registry): registry the metrics belong to.
+        """
+        self.entrypoint = entrypoint
+        self._labels = (entrypoint,)
+        self.notifications = registry.counter(
+            'rediskn_notifications_total',
+            'Keyspace notifications received.',
+            ('entrypoint', 'db', 'event'),
+        )
+        self.latency = registry.histogram(
+            'rediskn_latency_seconds',
+            'Time from receiving a notification to dispatching it (parsed '
+            'messages only).',
+            ('entrypoint', 'db', 'event'),
+        )
+        self.dispatched = registry.counter(
+            'rediskn_dispatched_total', 'Workers spawned.', ('entrypoint',)
+        )
+        self.dispatch_seconds = registry.histogram(
+            'rediskn_dispatch_seconds',
+            'Time spent spawning a worker, waiting while all of them are busy.',
+            ('entrypoint',),
+        )
+        self.workers = registry.gauge(
+            'rediskn_workers_in_flight', 'Workers running.', ('entrypoint',)
+        )
+        self.reconnects = registry.counter(
+            'rediskn_reconnects_total',
+            'Times listening failed and had to start over.',
+            ('entrypoint',),
+        )
+        self.errors = registry.gauge(
+            'rediskn_consecutive_errors',
+            'Errors since the last successful subscription.',
+            ('entrypoint',),
+        )
+        self.backoff = registry.gauge(
+            'rediskn_backoff_seconds',
+            'Current reconnection backoff.',
+            ('entrypoint',),
+        )
+        self.patterns = registry.gauge(
+            'rediskn_subscribed_patterns',
+            'Subscriptions of the connection, as last confirmed by Redis.',
+            ('entrypoint',),
+        )
+        self.lag = registry.histogram(
+            'rediskn_lag_seconds',
+            'End-to-end lag of the canary notifications.',
+            ('entrypoint',),
+        )
+        self.lagging = registry.gauge(
+            'rediskn_lagging',
+            'Whether the lag is over the threshold.',
+            ('entrypoint',),
+        )
+        self.shed = registry.counter(
+            'rediskn_shed_total',
+            'Notifications dropped while lagging.',
+            ('entrypoint',),
+        )
+
+    def received(self, message):
+        """Record a message received from Redis."""
+        if message['type'] == 'pmessage':
+            db, _, event = debounce_key(message)
+            self.notifications.inc((self.entrypoint, _text(db), _text(event)))
+        elif isinstance(message['data'], int):
+            # Subscription confirmation
+            self.patterns.set(message['data'], self._labels)
+            self.errors.set(0, self._labels)
+            self.backoff.set(0, self._labels)
+
+    def disconnected(self, backoff_factor):
+        """Record a failure listening."""
+        self.reconnects.inc(self._labels)
+        self.errors.inc(self._labels)
+        errors = self.errors.values[self._labels]
+        self.backoff.set(backoff_factor * 2 ** (errors - 1), self._labels)
+
+    def dispatching(self):
+        """Record a worker about to be spawned."""
+        self.workers.inc(self._labels)
+
+    def dispatched_worker(self, payload, duration):
+        """Record a worker spawned in `duration` seconds."""
+        self.dispatched.inc(self._labels)
+        self.dispatch_seconds.observe(duration, self._labels)
+
+        now = time.time()
+        for event in payload if isinstance(payload, list) else (payload,):
+            received_at = getattr(event, 'received_at', None)
+            if received_at is not None:
+                labels = (self.entrypoint, str(event.db), event.event)
+                self.latency.observe(now - received_at, labels)
+
+    def finished(self):
+        """Record a worker finished."""
+        self.workers.dec(self._labels)
+
+    def lag_measured(self, lag):
+        """Record the lag of a canary notification."""
+        self.lag.observe(lag, self._labels)
+
+    def lag_alert(self, lagging):
+        """Record the lag going over the threshold, or recovering."""
+        self.lagging.set(int(lagging), self._labels)
+
+    def shed_notification(self):
+        """Record a notification dropped while lagging."""
+        self.shed.inc(self._labels)
+
+
+def _text(value):
+    return value.decode('utf-8', 'replace') if isinstance(value, bytes) else value
+
+
+def _escape(text):
+    return text.replace('\\', r'\\').replace('\n', r'\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{{{}}}'.format(
+        ','.join(
+            '{}="{}"'.format(name, _escape(str(value)).replace('"', r'\"'))
+            for name, value in labels
+        )
+    )
+
+
+def _format_value(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
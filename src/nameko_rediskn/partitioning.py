@@ -0,0 +1,153 @@
+import logging
+import time
+import uuid
+from bisect import bisect
+from zlib import crc32
+
+from eventlet import sleep
+
+from .events import KEYEVENT, parse_channel
+
+DEFAULT_HEARTBEAT_INTERVAL = 1
+"""
+Default time, in seconds, between the heartbeats of the members of a
+partitioned entrypoint. Members missing three heartbeats in a row are
+considered gone and their partitions are taken over by the rest.
+"""
+
+DEFAULT_REPLICAS = 100
+"""Default number of points of every member in the hash ring."""
+
+MEMBERS_KEY_TEMPLATE = 'rediskn:members:{group}'
+"""
+Key of the sorted set holding the members of a group (scored by the time of
+their last heartbeat).
+"""
+
+log = logging.getLogger(__name__)
+
+
+def key_hash(key):
+    """Hash a Redis key (or hash ring point) into an unsigned 32-bit integer."""
+    if not isinstance(key, bytes):
+        key = key.encode('utf-8', 'surrogateescape')
+    return crc32(key) & 0xFFFFFFFF
+
+
+def partition_key(message):
+    """Return the Redis key a notification message is about."""
+    kind, _, suffix = parse_channel(message['channel'])
+    return message['data'] if kind == KEYEVENT else suffix
+
+
+class HashRing:
+
+    """Consistent hash ring assigning keys to members.
+
+    Every member is placed at `replicas` points of the ring and owns the keys
+    hashing between its points and the previous ones, so when a member joins
+    or leaves only the keys around its points change owner.
+    """
+
+    def __init__(self, members=(), replicas=DEFAULT_REPLICAS):
+        self.members = frozenset(members)
+        points = sorted(
+            (key_hash('{}-{}'.format(member, replica)), member)
+            for member in self.members
+            for replica in range(replicas)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key):
+        """Return the member owning `key`, or `None` if there are no members."""
+        if not self._points:
+            return None
+        index = bisect(self._points, key_hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def __len__(self):
+        return len(self.members)
+
+
+class Membership:
+
+    """Membership of a group of entrypoints partitioning the keyspace.
+
+    Every member records a heartbeat in a Redis sorted set and reads the rest
+    of the members from it, rebuilding its hash ring (and so rebalancing the
+    partitions) whenever members join or leave.
+
+    Heartbeats are scored using the local clock, so the clocks of the hosts
+    are expected to be kept in sync (e.g. with NTP).
+    """
+
+    def __init__(
+        self, client, group, member_id=None, interval=DEFAULT_HEARTBEAT_INTERVAL
+    ):
+        """Initialize the membership.
+
+        Args:
+            client (StrictRedis): Redis client.
+            group (str): name of the group, shared by all its members.
+            member_id (str): unique identifier of the member. Random by
+                default.
+            interval (float): time, in seconds, between heartbeats.
+        """
+        self.client = client
+        self.group = group
+        self.member_id = uuid.uuid4().hex if member_id is None else member_id
+        self.interval = interval
+        self.ttl = 3 * interval
+        self.key = MEMBERS_KEY_TEMPLATE.format(group=group)
+        # Own everything until the rest of the members are known
+        self.ring = HashRing([self.member_id])
+
+    def owns(self, key):
+        """Whether this member owns `key`."""
+        return self.ring.owner(key) == self.member_id
+
+    def heartbeat(self):
+        """Record a heartbeat and rebalance if the members have changed.
+
+        Returns:
+            bool: whether the members have changed.
+        """
+        now = time.time()
+        pipeline = self.client.pipeline(transaction=False)
+        # Raw commands, as the signature of ZADD changed in redis-py 3
+        pipeline.execute_command('ZADD', self.key, now, self.member_id)
+        pipeline.execute_command('ZREMRANGEBYSCORE', self.key, '-inf', now - self.ttl)
+        pipeline.execute_command('ZRANGE', self.key, 0, -1)
+        pipeline.execute_command('PEXPIRE', self.key, int(self.ttl * 10 * 1000))
+        _, _, members, _ = pipeline.execute()
+
+        members = set(_to_text(member) for member in members)
+        members.add(self.member_id)
+        if members == self.ring.members:
+            return False
+
+        self.ring = HashRing(members)
+        log.info(
+            'Rebalanced the partitions of %s across %d members',
+            self.group,
+            len(members),
+        )
+        return True
+
+    def run(self):
+        """Send heartbeats forever."""
+        while True:
+            sleep(self.interval)
+            try:
+                self.heartbeat()
+            except Exception:
+                log.exception('Error sending heartbeat for %s', self.group)
+
+    def leave(self):
+        """Leave the group, so the rest of the members take over right away."""
+        self.client.execute_command('ZREM', self.key, self.member_id)
+
+
+def _to_text(member):
+    return member.decode('utf-8') if isinstance(member, bytes) else member
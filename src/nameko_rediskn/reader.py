@@ -0,0 +1,268 @@
+from collections import deque
+
+from eventlet import patcher
+from eventlet.greenio import GreenSocket
+from redis.exceptions import ConnectionError
+
+from .resp import create_reader
+
+DEFAULT_MAX_PENDING = 10000
+"""Default maximum number of messages read and not yet taken by the hub."""
+
+POLL_INTERVAL = 1
+"""Maximum time, in seconds, the reader thread waits for data before
+checking whether it has been stopped."""
+
+READ_SIZE = 64 * 1024
+"""Maximum number of bytes read from the connection at once."""
+
+# Native modules, whether or not eventlet monkey patched them
+_select = patcher.original('select')
+_socket = patcher.original('socket')
+_threading = patcher.original('threading')
+
+
+class ThreadedReader:
+
+    """Read a pub/sub connection from a native thread.
+
+    Reading the socket and parsing the replies happen in a thread of their
+    own, outside of the eventlet hub, so that greenthreads are not starved by
+    a busy connection. Every read is parsed into as many messages as it
+    completes and added to the pending batches. The hub is woken up once
+    (through a socket pair) when batches are pending, and takes all of them
+    at once with `get`, however many have been read meanwhile.
+
+    When `max_pending` messages are pending, the thread stops reading until
+    the hub takes them, leaving the rest of them in the connection.
+
+    Commands (e.g. SUBSCRIBE) can still be sent through the connection from
+    the hub, only reading happens in the thread.
+    """
+
+    def __init__(
+        self, connection, max_pending=DEFAULT_MAX_PENDING, poll_interval=POLL_INTERVAL
+    ):
+        """Initialize the reader.
+
+        Args:
+            connection (Connection): connected pub/sub connection of
+                redis-py, whose replies have not been read yet.
+            max_pending (int): maximum number of messages read and not yet
+                taken by the hub.
+            poll_interval (float): maximum time, in seconds, the thread waits
+                for data before checking whether it has been stopped.
+        """
+        self.connection = connection
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.wakeups = 0
+        # Green sockets wrap the native (non-blocking) one
+        self._sock = getattr(connection._sock, 'fd', connection._sock)
+        self._encoder = connection.encoder
+        self._lock = _threading.Lock()
+        self._not_full = _threading.Condition(self._lock)
+        self._batches = deque()
+        self._pending = 0
+        self._signaled = False
+        self._stopped = False
+        self._error = None
+        wakeup, self._wakeup = _socket.socketpair()
+        self._wakeup_hub = GreenSocket(wakeup)
+        self._thread = _threading.Thread(
+            target=self._read, name='rediskn-reader', daemon=True
+        )
+
+    def start(self):
+        """Start reading in the thread."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop reading, shutting the connection down."""
+        with self._lock:
+            self._stopped = True
+            self._not_full.notify()
+        try:
+            # Wakes the thread up right away
+            self._sock.shutdown(_socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self._thread.is_alive():
+            self._thread.join()
+        self._wakeup.close()
+        self._wakeup_hub.close()
+
+    def get(self):
+        """Wait for messages, returning all the messages read meanwhile.
+
+        Raises:
+            Exception: the error the thread stopped reading with.
+        """
+        while True:
+            with self._lock:
+                batches, self._batches = self._batches, deque()
+                self._pending = 0
+                self._signaled = False
+                self._not_full.notify()
+                error = self._error
+            if batches:
+                self.wakeups += 1
+                return [message for batch in batches for message in batch]
+            if error is not None:
+                raise error
+            self._wakeup_hub.recv(64)
+
+    def _read(self):
+        reader = create_reader()
+        try:
+            while not self._stopped:
+                data = self._receive()
+                if data is None:
+                    continue
+
+                reader.feed(data)
+                batch = []
+                reply = reader.gets()
+                while reply is not False:
+                    batch.append(pubsub_message(reply, self._encoder))
+                    reply = reader.gets()
+                if batch:
+                    self._put(batch)
+        except Exception as exc:
+            if not self._stopped:
+                self._fail(exc)
+
+    def _receive(self):
+        readable, _, _ = _select.select([self._sock], [], [], self.poll_interval)
+        if not readable:
+            return None
+        try:
+            data = self._sock.recv(READ_SIZE)
+        except BlockingIOError:
+            return None
+        if not data:
+            raise ConnectionError('Connection closed by server.')
+        return data
+
+    def _put(self, batch):
+        with self._lock:
+            while self._pending >= self.max_pending and not self._stopped:
+                self._not_full.wait()
+            self._batches.append(batch)
+            self._pending += len(batch)
+            signal, self._signaled = not self._signaled, True
+        if signal:
+            self._wakeup.send(b'\0')
+
+    def _fail(self, exc):
+        with self._lock:
+            self._error = exc
+        self._wakeup.send(b'\0')
+
+
+def drain(pubsub, read_size=READ_SIZE):
+    """Yield the messages of a subscribed `PubSub`, reading them in bulk.
+
+    Unlike `PubSub.listen`, which waits for the socket and parses the reply
+    of every message on its own, each read takes everything available on the
+    connection (up to `read_size` bytes) and all the complete replies of the
+    data are yielded before reading again. A reply cut short by the read is
+    kept until the rest of it is read.
+
+    Falls back to `PubSub.listen` when the connection can not be read
+    outside of redis-py (see `can_read_directly`).
+
+    Args:
+        pubsub (PubSub): subscribed pub/sub of redis-py, whose replies have
+            not been read yet.
+        read_size (int): maximum number of bytes read at once.
+
+    Raises:
+        ConnectionError: the connection was closed by the server.
+    """
+    connection = pubsub.connection
+    if not can_read_directly(connection):
+        yield from pubsub.listen()
+        return
+
+    encoder = connection.encoder
+    reader = create_reader()
+    while True:
+        data = connection._sock.recv(read_size)
+        if not data:
+            raise ConnectionError('Connection closed by server.')
+        reader.feed(data)
+        reply = reader.gets()
+        while reply is not False:
+            yield pubsub_message(reply, encoder)
+            reply = reader.gets()
+
+
+def can_read_directly(connection):
+    """Return whether the replies of `connection` can be read from its socket.
+
+    Connections of redis-py 2.10 have no encoder to decode the replies with,
+    and replies already read (e.g. by the hiredis parser) have to be taken
+    from the parser of the connection, so both are left to redis-py.
+
+    Args:
+        connection (Connection): pub/sub connection of redis-py.
+
+    Returns:
+        bool: whether the connection is connected and nothing has been read
+            from it and not parsed yet.
+    """
+    if getattr(connection, 'encoder', None) is None:
+        return False
+    if getattr(connection, '_sock', None) is None:
+        return False
+    return not _buffered(connection._parser)
+
+
+def _buffered(parser):
+    # Reply cached by `HiredisParser.can_read`
+    if getattr(parser, '_next_response', False) is not False:
+        return True
+    reader = getattr(parser, '_reader', None)
+    if reader is not None:
+        # `has_data` is only available in recent versions of hiredis
+        has_data = getattr(reader, 'has_data', None)
+        return has_data is not None and has_data()
+    buffer = getattr(parser, '_buffer', None)
+    return buffer is not None and buffer.length > 0
+
+
+def pubsub_message(reply, encoder):
+    """Build the message of a pub/sub reply, as `PubSub.handle_message` does.
+
+    Args:
+        reply (list): reply of Redis, e.g. `[b'pmessage', pattern, channel,
+            data]`.
+        encoder (Encoder): encoder of the connection, decoding the values
+            if responses are decoded.
+
+    Returns:
+        dict: message with its `type`, `pattern`, `channel` and `data`.
+    """
+    if isinstance(reply, Exception):
+        # Error reply, e.g. to a command not allowed while subscribed
+        raise reply
+    message_type = reply[0].decode()
+    if message_type == 'pmessage':
+        pattern, channel, data = reply[1:]
+    elif message_type == 'pong':
+        pattern, channel, data = None, None, reply[1]
+    else:
+        pattern, channel, data = None, reply[1], reply[2]
+    return {
+        'type': message_type,
+        'pattern': _decode(pattern, encoder),
+        'channel': _decode(channel, encoder),
+        'data': _decode(data, encoder),
+    }
+
+
+def _decode(value, encoder):
+    if isinstance(value, list):
+        return [_decode(item, encoder) for item in value]
+    return encoder.decode(value)
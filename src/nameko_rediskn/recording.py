@@ -0,0 +1,211 @@
+import mmap
+import os
+import struct
+import time
+
+from eventlet import sleep
+
+LOG_MAGIC = b'RDKNLOG\x01'
+"""Header of the notification logs (name and format version)."""
+
+RECORD = struct.Struct('<dIII')
+"""Header of every record: timestamp and lengths of the pattern, channel and
+data that follow it."""
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+"""Default size, in bytes, of the write buffer of the recorders."""
+
+MAX_SPEED = None
+"""Replay speed without any waits between the notifications."""
+
+REPLAY_YIELD_INTERVAL = 1000
+"""Number of notifications replayed at full speed between yields to the hub."""
+
+_ENCODING = 'utf-8'
+
+
+class LogFormatError(Exception):
+
+    """The file is not a notification log."""
+
+
+class NotificationRecorder:
+
+    """Append the notifications received to a binary log.
+
+    Every notification is appended as a record of its receive time (seconds
+    since the epoch), pattern, channel and data, which are stored as bytes
+    (decoded messages are encoded as UTF-8) right after a fixed-size header
+    of the time and their lengths. Records are buffered, and only complete
+    ones are read back, so a log cut short by a crash is still readable.
+
+    An existing log is appended to.
+    """
+
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER_SIZE, clock=time.time):
+        """Initialize the recorder, opening the log.
+
+        Args:
+            path (str): path of the log.
+            buffer_size (int): size, in bytes, of the write buffer.
+            clock (callable): returns the receive time of the notifications.
+        """
+        self.path = path
+        self.clock = clock
+        self.recorded = 0
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, 'rb') as log:
+                _check_magic(log.read(len(LOG_MAGIC)), path)
+            self._file = open(path, 'ab', buffering=buffer_size)
+        else:
+            self._file = open(path, 'wb', buffering=buffer_size)
+            self._file.write(LOG_MAGIC)
+
+    def record(self, message):
+        """Record a `pmessage`, ignoring any other message."""
+        if message['type'] != 'pmessage':
+            return
+        pattern = _to_bytes(message['pattern'])
+        channel = _to_bytes(message['channel'])
+        data = _to_bytes(message['data'])
+        self._file.write(
+            RECORD.pack(self.clock(), len(pattern), len(channel), len(data))
+            + pattern
+            + channel
+            + data
+        )
+        self.recorded += 1
+
+    def flush(self):
+        """Write the buffered records to the log."""
+        self._file.flush()
+
+    def close(self):
+        """Write the buffered records and close the log."""
+        self._file.close()
+
+
+class NotificationLog:
+
+    """Read a notification log, mapping it into memory.
+
+    Iterating yields `(timestamp, pattern, channel, data)` tuples, with
+    `bytes` values, in the order they were recorded.
+
+    Example:
+
+        with NotificationLog('incident.log') as log:
+            for timestamp, pattern, channel, data in log:
+                ...
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as log:
+            _check_magic(log.read(len(LOG_MAGIC)), path)
+            self._map = mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __iter__(self):
+        data = self._map
+        size = len(data)
+        position = len(LOG_MAGIC)
+        while position + RECORD.size <= size:
+            timestamp, *lengths = RECORD.unpack_from(data, position)
+            position += RECORD.size
+            if position + sum(lengths) > size:
+                # Cut short while being written
+                return
+            values = [timestamp]
+            for length in lengths:
+                end = position + length
+                values.append(data[position:end])
+                position = end
+            yield tuple(values)
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def replay(
+    path,
+    handle_message,
+    speed=1,
+    decode_responses=True,
+    sleep=sleep,
+    clock=time.monotonic,
+):
+    """Replay a notification log.
+
+    Args:
+        path (str): path of the log.
+        handle_message (callable): called with every notification, as a
+            `pmessage` dictionary, e.g. the `handle_message` method of an
+            entrypoint.
+        speed (float): replay speed relative to the recording, e.g. `1` to
+            keep the recorded intervals between the notifications or `10` to
+            make them ten times shorter. `MAX_SPEED` replays them as fast as
+            they are handled, yielding to other greenthreads every
+            `REPLAY_YIELD_INTERVAL` notifications.
+        decode_responses (bool): when `False`, the `pattern`, `channel` and
+            `data` of the messages are `bytes` instead of decoded (as the
+            `decode_responses` argument of the entrypoints).
+
+    Returns:
+        int: number of notifications replayed.
+
+    Raises:
+        ValueError: if `speed` is not positive.
+    """
+    if speed is not MAX_SPEED and not speed > 0:
+        raise ValueError('`speed` must be a positive number or `MAX_SPEED`')
+    replayed = 0
+    with NotificationLog(path) as log:
+        started = recorded_start = None
+        for timestamp, pattern, channel, data in log:
+            if speed is MAX_SPEED:
+                if replayed % REPLAY_YIELD_INTERVAL == REPLAY_YIELD_INTERVAL - 1:
+                    sleep(0)
+            elif started is None:
+                started, recorded_start = clock(), timestamp
+            else:
+                wait = started + (timestamp - recorded_start) / speed - clock()
+                if wait > 0:
+                    sleep(wait)
+
+            if decode_responses:
+                pattern, channel, data = (
+                    _to_text(pattern),
+                    _to_text(channel),
+                    _to_text(data),
+                )
+            handle_message(
+                {
+                    'type': 'pmessage',
+                    'pattern': pattern,
+                    'channel': channel,
+                    'data': data,
+                }
+            )
+            replayed += 1
+    return replayed
+
+
+def _check_magic(header, path):
+    if header != LOG_MAGIC:
+        raise LogFormatError('{} is not a notification log'.format(path))
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode(_ENCODING, 'surrogateescape')
+
+
+def _to_text(value):
+    return value.decode(_ENCODING, 'surrogateescape')
@@ -1,13 +1,69 @@
 import logging
-from itertools import chain
+import time
+import uuid
+from collections import OrderedDict, deque
+from functools import partial
+from itertools import chain, count
 
+import eventlet
 from eventlet import sleep
 from nameko.exceptions import ConfigurationError
-from nameko.extensions import Entrypoint
+from nameko.extensions import Entrypoint, SharedExtension
 from redis import StrictRedis
+from redis.exceptions import ResponseError
+
+from .batching import Batcher
+from .cluster import DEFAULT_REFRESH_INTERVAL, ClusterReaders
+from .debounce import DEFAULT_MAX_PENDING_KEYS, Debouncer
+from .enrichment import DEFAULT_FETCH_SIZE, DEFAULT_FETCH_WINDOW, FETCHES, Enricher
+from .events import KeyspaceEvent
+from .expiry import EXPIRY_ACTIONS, TOUCH, ExpiryTracker, expired_message
+from .handoff import BLOCK, OVERFLOW_POLICIES, HandoffQueue
+from .lag import CANARY_PREFIX, LagProbe
+from .metrics import EntrypointMetrics
+from .partitioning import DEFAULT_HEARTBEAT_INTERVAL, Membership, partition_key
+from .reader import ThreadedReader, can_read_directly, drain
+from .recording import NotificationRecorder
+from .routing import (
+    SHARD_BY_HASH,
+    SHARD_STRATEGIES,
+    RoutingTable,
+    covering_patterns,
+    is_literal,
+    literal,
+    shard_patterns,
+)
+from .snapshot import DEFAULT_SCAN_COUNT, snapshot
+from .streams import (
+    BRIDGE_KEY_TEMPLATE,
+    DEFAULT_CLAIM_IDLE,
+    DEFAULT_LEADER_TTL,
+    DEFAULT_MAX_DELIVERIES,
+    DEFAULT_MAXLEN,
+    DEFAULT_READ_BLOCK,
+    DEFAULT_READ_COUNT,
+    LeaderElection,
+    entry_fields,
+    entry_message,
+    idle_consumers,
+    pending_entries,
+    stream_entries,
+)
+from .tracking import (
+    INVALIDATE_CHANNEL,
+    enable_tracking,
+    invalidation_messages,
+    key_prefixes,
+)
 
 REDIS_OPTIONS = {'encoding': 'utf-8', 'decode_responses': True}
 
+RAW_REDIS_OPTIONS = {'encoding': 'utf-8', 'decode_responses': False}
+"""
+Redis client options used when responses are not decoded: the `pattern`,
+`channel` and `data` of the messages are delivered as `bytes`, as read.
+"""
+
 NOTIFICATIONS_SETTING_KEY = 'notify-keyspace-events'
 """
 Configuration parameter used to enable keyspace events notifications.
@@ -32,6 +88,26 @@ KEYSPACE_TEMPLATE = '__keyspace@{db}__:{key}'
 REDIS_PMESSAGE_TYPE = 'pmessage'
 """Pattern-matching subscription message type."""
 
+REDIS_MESSAGE_TYPE = 'message'
+"""
+Exact channel subscription message type.
+
+Literal patterns (without glob-style special characters) are subscribed to
+with SUBSCRIBE instead of PSUBSCRIBE, which Redis resolves with a hash lookup
+instead of matching every published message against the pattern. Their
+messages are handed to the entrypoints as `pmessage` ones, though.
+"""
+
+SUBSCRIPTION_TYPES = frozenset(('psubscribe', 'subscribe'))
+"""Types of the messages confirming subscriptions."""
+
+SUBSCRIBE_CHUNK_SIZE = 1000
+"""
+Maximum number of channels or patterns sent in a single SUBSCRIBE or
+PSUBSCRIBE command. All the chunks are sent without waiting for the
+confirmations in between.
+"""
+
 DEFAULT_BACKOFF_FACTOR = 2
 """
 Default backoff factor for exponential backoff on errors while listening for
@@ -39,6 +115,12 @@ redis events. On an error, we will sleep for `backoff_factor * 2 ** (n - 1)`
 where `n` is the number of consecutive errors that have occurred.
 """
 
+DEFAULT_MAX_BATCH_LATENCY = 0.05
+"""
+Default maximum time, in seconds, a message waits in a partial batch before
+the batch is dispatched (only used when batching is enabled).
+"""
+
 log = logging.getLogger(__name__)
 
 
@@ -85,6 +167,11 @@ class RedisKNEntrypoint(Entrypoint):
     The subscription pattern has the same format, but it displays the original
     pattern that matched.
 
+    Literal patterns (those without glob-style special characters, e.g. a key
+    like `foo` in a given db) are subscribed to with SUBSCRIBE, which is
+    cheaper for Redis than PSUBSCRIBE. Their messages are still delivered as
+    `pmessage` (and `psubscribe`) messages, with the literal pattern.
+
     Message example:
 
         {
@@ -121,9 +208,196 @@ class RedisKNEntrypoint(Entrypoint):
                 key = message['channel'].split(':')[1]
 
                 # ...
+
+    Parsed messages:
+
+        When `parse_messages` is `True`, the decorated method is called with
+        `nameko_rediskn.events.KeyspaceEvent` instances instead, which expose
+        the `kind`, `db`, `key` and `event` of the notification (parsed from
+        the channel only when first needed), as well as the time it was
+        received and a sequence number. Subscription confirmations are
+        dropped.
+
+            @rediskn.subscribe(
+                uri_config_key='MY_REDIS', keys='foo/bar-*', parse_messages=True
+            )
+            def subscriber(self, event):
+                if event.event == 'expired':
+                    key = event.key
+                    # ...
+
+    Batch mode:
+
+        When `batch_size` is provided, messages are accumulated and the
+        decorated method is called with a list of messages instead, so the
+        cost of spawning a worker is shared by all the messages in the batch.
+        A batch is dispatched as soon as it is full or when its oldest message
+        has waited for `max_batch_latency` seconds.
+
+            from nameko_rediskn import rediskn
+            from nameko_rediskn.batching import group_by_db
+
+
+            class MyService:
+
+                name = 'my-service'
+
+                @rediskn.subscribe(
+                    uri_config_key='MY_REDIS',
+                    events='expired',
+                    dbs=[0, 1],
+                    batch_size=500,
+                    batch_key=group_by_db,
+                )
+                def subscriber(self, messages):
+                    # ...
+
+    Handoff queue:
+
+        By default the messages are handed over to the workers as they are
+        read, so the connection is not read while the container has no free
+        workers, and Redis closes it once its pub/sub output buffer limit is
+        exceeded. With `max_queue_size` they are queued instead and handed
+        over by a separate greenthread, the `overflow` policy deciding what
+        to do when the queue is full. The `dropped` and `coalesced` counters
+        of `handoff` keep track of the messages that never reached a worker.
+
+    Debouncing:
+
+        With `debounce`, bursts of notifications with the same db, key and
+        event (e.g. hundreds of `hset` on the same hash) are collapsed into
+        their latest notification, dispatched once no other one has been
+        received for `debounce` seconds (or `max_wait` seconds after the
+        first one). Its `merged` field (an attribute of parsed messages)
+        holds the number of notifications it stands for.
+
+    Partitioned mode:
+
+        Every service instance receives every notification. When
+        `partitioned` is `True`, the instances running the entrypoint send
+        heartbeats to Redis and place themselves in a consistent hash ring,
+        so each notification is only dispatched by the instance owning its
+        key. The keys are rebalanced when instances join or leave.
+
+    Redis Cluster:
+
+        Redis Cluster nodes only publish the notifications of their own keys.
+        With the `cluster` setting of the `REDIS` config, the master nodes
+        are discovered with CLUSTER SLOTS and each one is listened to by its
+        own greenthread, all of them feeding the same entrypoint. The
+        topology is checked again every `cluster_refresh_interval` seconds,
+        following slot migrations and failovers.
+
+    Multiple connections:
+
+        A single pub/sub connection, read by a single greenthread, caps the
+        rate of notifications that can be received. With `connections`, the
+        patterns are split across that many connections (see `shard_by`),
+        each one read by its own greenthread and reconnecting on its own.
+
+    Snapshots:
+
+        Handlers only learn about the keys that change while subscribed. With
+        `snapshot`, every time the entrypoint subscribes (on start and after
+        reconnecting) the keys matching `keys` in every db of `dbs` are
+        scanned, and a synthetic key-space notification with the `snapshot`
+        event is dispatched for each one of them (see
+        `nameko_rediskn.snapshot.snapshot_message`) before the live
+        notifications.
+
+    Expiry tracking:
+
+        Redis publishes `expired` notifications when it gets to delete the
+        keys, which can be long after their deadline. With `track_expiry`,
+        the deadlines of the keys matching `keys` are tracked in process
+        (following their `expire`, `set`, `persist` and `del` notifications,
+        see `nameko_rediskn.expiry`) and, at the deadline of a key, it is
+        either touched so that Redis expires it right away (`touch`, the
+        default `expiry_action`) or a synthetic `expired` notification is
+        dispatched (`dispatch`), dropping the one published by Redis.
+
+    Client-side caching invalidations:
+
+        With `tracking`, keyspace notifications are not used at all (so they
+        do not need to be enabled in Redis). The pub/sub connection enables
+        CLIENT TRACKING in broadcasting mode for the prefixes of `keys`,
+        redirecting the invalidation messages to itself, and every modified
+        key matching `keys` is dispatched as a key-space notification with
+        the `invalidate` event and `*` as the db (see
+        `nameko_rediskn.tracking`). It requires Redis 6.
+
+    Fetching:
+
+        With `fetch`, the value (`value`), time to live (`ttl`) or type
+        (`type`) of the key of every notification is fetched before it is
+        dispatched, so handlers do not have to. Notifications are collected
+        for up to `fetch_window` seconds per db and their keys are fetched
+        with a single MGET or pipeline (see `nameko_rediskn.enrichment`).
+
+    Lag probe:
+
+        With `lag_probe`, a canary key (under `__rediskn:canary:`, in the
+        first db of `dbs`) is SET every `lag_probe` seconds and the time
+        until its key-space notification goes through the connection and the
+        handoff queue is measured (see `nameko_rediskn.lag`). Canary
+        notifications are never dispatched. Over `lag_threshold` seconds, a
+        warning is logged and, with `shed_load`, notifications are dropped
+        until the lag is back under the threshold. It requires the `K` and
+        `$` (or `A`) notification flags.
+
+    Recording:
+
+        With `record`, every notification received is appended to a binary
+        log, which `nameko_rediskn.recording.replay` feeds back into an
+        entrypoint at the recorded pace, faster or as fast as it goes (e.g.
+        to reproduce an incident or benchmark against real traffic).
+
+    Metrics:
+
+        With the `metrics` setting of the `REDIS` config, the notifications
+        received, dispatch times, workers in flight, reconnections, backoff,
+        subscribed patterns and lag of the entrypoint are recorded in
+        `nameko_rediskn.metrics.REGISTRY` (see `nameko_rediskn.metrics`).
+        Otherwise, nothing is recorded.
     """
 
-    def __init__(self, uri_config_key, events=None, keys=None, dbs=None, **kwargs):
+    def __init__(
+        self,
+        uri_config_key,
+        events=None,
+        keys=None,
+        dbs=None,
+        batch_size=None,
+        max_batch_latency=DEFAULT_MAX_BATCH_LATENCY,
+        adaptive_batch_size=False,
+        batch_key=None,
+        parse_messages=False,
+        decode_responses=True,
+        max_queue_size=None,
+        overflow=BLOCK,
+        coalesce_key=None,
+        debounce=None,
+        max_wait=None,
+        max_pending_keys=DEFAULT_MAX_PENDING_KEYS,
+        partitioned=False,
+        heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+        connections=1,
+        shard_by=SHARD_BY_HASH,
+        snapshot=False,
+        scan_count=DEFAULT_SCAN_COUNT,
+        scan_rate=None,
+        track_expiry=False,
+        expiry_action=TOUCH,
+        tracking=False,
+        fetch=None,
+        fetch_window=DEFAULT_FETCH_WINDOW,
+        fetch_size=DEFAULT_FETCH_SIZE,
+        lag_probe=None,
+        lag_threshold=None,
+        shed_load=False,
+        record=None,
+        **kwargs
+    ):
         """Initialize the entrypoint.
 
         Args:
@@ -131,76 +405,567 @@ class RedisKNEntrypoint(Entrypoint):
             events (str or list(str)): one or more events to subscribe to.
             keys (str or list(str)): one or more keys to subscribe to.
             dbs (str or list(str)): one or more DBs to subscribe to.
+            batch_size (int): enables batch mode, dispatching lists of up to
+                `batch_size` messages.
+            max_batch_latency (float): maximum time, in seconds, a message
+                waits before its batch is dispatched.
+            adaptive_batch_size (bool): grow the batch size (up to
+                `batch_size`) while messages arrive in bursts and shrink it
+                when they don't.
+            batch_key (callable): function taking a message and returning
+                its batch group, so that every batch holds messages of a
+                single group (e.g. `nameko_rediskn.batching.group_by_db`).
+            parse_messages (bool): deliver `KeyspaceEvent` instances instead
+                of dictionaries, dropping subscription confirmations.
+            decode_responses (bool): when `False`, the `pattern`, `channel`
+                and `data` of the messages are not decoded but delivered as
+                `bytes`, so binary key names are kept intact.
+            max_queue_size (int): hand the messages over to the workers
+                through a queue of up to `max_queue_size` messages, so that
+                the connection keeps being read while no workers are free.
+            overflow (str): what to do with new messages when the queue is
+                full, one of `block`, `drop_oldest`, `drop_newest` or
+                `coalesce` (see `nameko_rediskn.handoff`).
+            coalesce_key (callable): function taking a message and returning
+                the key used to coalesce it. Defaults to the Redis key of the
+                notification.
+            debounce (float): collapse the notifications with the same db,
+                key and event received within `debounce` seconds of each
+                other into the latest one.
+            max_wait (float): maximum time, in seconds, a debounced
+                notification is held back.
+            max_pending_keys (int): maximum number of keys with a debounced
+                notification pending, the oldest one being dispatched early
+                when it is reached.
+            partitioned (bool): only dispatch the notifications about the
+                keys owned by this service instance, partitioning the keys
+                between all the running instances of the service.
+            heartbeat_interval (float): time, in seconds, between the
+                heartbeats of a partitioned entrypoint.
+            connections (int): number of pub/sub connections the patterns are
+                split across, each one read by its own greenthread (not used
+                with `shared_pubsub`).
+            shard_by (str): how the patterns are split across connections:
+                `db`, `pattern` (in turns) or `hash`.
+            snapshot (bool): emit a synthetic `snapshot` notification for
+                every existing key matching `keys` when subscribing (and
+                resubscribing after errors).
+            scan_count (int): number of keys requested with every SCAN
+                command of a snapshot.
+            scan_rate (float): maximum number of keys per second scanned in a
+                snapshot. Unlimited by default.
+            track_expiry (bool): track the deadlines of the keys matching
+                `keys` to act on them as soon as they expire.
+            expiry_action (str): what to do at the deadline of a tracked
+                key, `touch` or `dispatch`.
+            tracking (bool): get the keys matching `keys` modified through
+                client-side caching invalidations instead of keyspace
+                notifications.
+            fetch (str or callable): attach the `value`, `ttl` (as `pttl`)
+                or `type` (as `key_type`) of the key to every notification.
+                A callable is called with a pipeline and the key, and must
+                queue the command whose reply is attached as `value`.
+            fetch_window (float): maximum time, in seconds, a notification
+                waits for its key to be fetched.
+            fetch_size (int): maximum number of keys fetched at once.
+            lag_probe (float): measure the end-to-end lag of the
+                notifications by writing a canary key every `lag_probe`
+                seconds.
+            lag_threshold (float): lag, in seconds, over which a warning is
+                logged.
+            shed_load (bool): drop the notifications while the lag is over
+                `lag_threshold`.
+            record (str): path of a log the notifications received are
+                appended to (see `nameko_rediskn.recording`).
         """
         self.uri_config_key = uri_config_key
 
-        self.events = [] if events is None else _to_list(events)
-        self.keys = [] if keys is None else _to_list(keys)
-        self.dbs = None if dbs is None else _to_list(dbs)
+        self.events = [] if events is None else to_list(events)
+        self.keys = [] if keys is None else to_list(keys)
+        self.dbs = None if dbs is None else to_list(dbs)
+
+        self.batch_size = batch_size
+        self.max_batch_latency = max_batch_latency
+        self.adaptive_batch_size = adaptive_batch_size
+        self.batch_key = batch_key
+        self.parse_messages = parse_messages
+        self.decode_responses = decode_responses
+        self.max_queue_size = max_queue_size
+        self.overflow = overflow
+        self.coalesce_key = coalesce_key
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.max_pending_keys = max_pending_keys
+        self.partitioned = partitioned
+        self.heartbeat_interval = heartbeat_interval
+        self.connections = connections
+        self.shard_by = shard_by
+        self.snapshot = snapshot
+        self.scan_count = scan_count
+        self.scan_rate = scan_rate
+        self.track_expiry = track_expiry
+        self.expiry_action = expiry_action
+        self.tracking = tracking
+        self.fetch = fetch
+        self.fetch_window = fetch_window
+        self.fetch_size = fetch_size
+        self.lag_probe = lag_probe
+        self.lag_threshold = lag_threshold
+        self.shed_load = shed_load
+        self.record = record
+
+        self.hub = RedisKNHub(uri_config_key)
 
         self.client = None
+        self.subscribe_duration = None
         self._thread = None
+        self._batcher = None
+        self._debouncer = None
+        self._enricher = None
+        self.metrics = None
+        self.membership = None
+        self._membership_thread = None
+        self.expiry = None
+        self._expiry_thread = None
+        self.lag = None
+        self._lag_thread = None
+        self.recorder = None
+        self.handoff = None
+        self._handoff_thread = None
+        self._snapshots = {}
+        self._held = None
+        self._channels = {}
+        self._sequence = count(1)
+        self._shared_pubsub = False
+        self._threaded_reader = False
         super().__init__(**kwargs)
 
     def setup(self):
-        if not self.events and not self.keys:
-            error_message = 'Provide either `events` or `keys` to get notifications'
-            log.error(error_message)
-            raise ConfigurationError(error_message)
-
         self._redis_uri = self.container.config['REDIS_URIS'][self.uri_config_key]
         redis_config = self.container.config.get('REDIS', {})
         self._notification_events = redis_config.get('notification_events')
         self._backoff_factor = redis_config.get(
             'pubsub_backoff_factor', DEFAULT_BACKOFF_FACTOR
         )
+        self._shared_pubsub = redis_config.get('shared_pubsub', False)
+        self._threaded_reader = redis_config.get('threaded_reader', False)
+        self._cluster = redis_config.get('cluster', False)
+        self._cluster_refresh_interval = redis_config.get(
+            'cluster_refresh_interval', DEFAULT_REFRESH_INTERVAL
+        )
+        if self.tracking:
+            # Invalidations are redirected to a connection of its own
+            self._shared_pubsub = False
+        self._validate()
+
+        if redis_config.get('metrics', False):
+            self.metrics = EntrypointMetrics(
+                '{}.{}'.format(self.container.service_name, self.method_name)
+            )
+
+        if self.batch_size is not None:
+            self._batcher = Batcher(
+                self._dispatch,
+                self.batch_size,
+                self.max_batch_latency,
+                adaptive=self.adaptive_batch_size,
+                key=self.batch_key,
+            )
+
+        if self.debounce is not None:
+            self._debouncer = Debouncer(
+                self._debounced,
+                self.debounce,
+                max_wait=self.max_wait,
+                max_pending=self.max_pending_keys,
+            )
+
+        if self.fetch is not None:
+            client = StrictRedis.from_url(
+                self._redis_uri, **redis_options(self.decode_responses)
+            )
+            self._enricher = Enricher(
+                client,
+                self.fetch,
+                self._deliver,
+                window=self.fetch_window,
+                size=self.fetch_size,
+            )
+
+        if self.max_queue_size is not None:
+            self.handoff = HandoffQueue(
+                self._handle,
+                self.max_queue_size,
+                overflow=self.overflow,
+                key=self.coalesce_key,
+            )
         super().setup()
 
+    def _validate(self):
+        _check(
+            self.events or self.keys,
+            'Provide either `events` or `keys` to get notifications',
+        )
+        _check(
+            self.batch_size is None or self.batch_size >= 1,
+            '`batch_size` must be a positive integer',
+        )
+        _check(self.connections >= 1, '`connections` must be a positive integer')
+        _check(
+            self.shard_by in SHARD_STRATEGIES,
+            'Unknown `shard_by` strategy: {}'.format(self.shard_by),
+        )
+        _check(
+            self.debounce is None or self.debounce > 0,
+            '`debounce` must be a positive number',
+        )
+        _check(
+            self.max_wait is None or self.max_wait > 0,
+            '`max_wait` must be a positive number',
+        )
+        _check(
+            self.max_queue_size is None or self.max_queue_size >= 1,
+            '`max_queue_size` must be a positive integer',
+        )
+        _check(
+            self.max_queue_size is None or self.overflow in OVERFLOW_POLICIES,
+            'Unknown `overflow` policy: {}'.format(self.overflow),
+        )
+        _check(
+            not (self._cluster and self._shared_pubsub),
+            '`cluster` and `shared_pubsub` can not be used together',
+        )
+        _check(
+            not (self.snapshot and self._shared_pubsub),
+            '`snapshot` and `shared_pubsub` can not be used together',
+        )
+        _check(
+            not self.track_expiry or self.keys,
+            '`track_expiry` requires `keys` to watch',
+        )
+        _check(
+            self.expiry_action in EXPIRY_ACTIONS,
+            'Unknown `expiry_action`: {}'.format(self.expiry_action),
+        )
+        _check(
+            not self.tracking or (self.keys and not self.events),
+            '`tracking` only works with `keys`',
+        )
+        _check(
+            self.fetch is None or self.fetch in FETCHES or callable(self.fetch),
+            'Unknown `fetch`: {}'.format(self.fetch),
+        )
+        _check(self.fetch_size >= 1, '`fetch_size` must be a positive integer')
+        _check(
+            not (self.tracking and self.fetch is not None),
+            '`fetch` can not be used with `tracking`',
+        )
+        _check(
+            not (self.tracking and (self._cluster or self.track_expiry)),
+            '`tracking` can not be used with `cluster` or `track_expiry`',
+        )
+        _check(
+            self.lag_probe is None or self.lag_probe > 0,
+            '`lag_probe` must be a positive number',
+        )
+        _check(
+            self.lag_threshold is None or self.lag_probe is not None,
+            '`lag_threshold` requires `lag_probe`',
+        )
+        _check(
+            not self.shed_load or self.lag_threshold is not None,
+            '`shed_load` requires `lag_threshold`',
+        )
+        _check(
+            self.lag_probe is None or not (self._cluster or self.tracking),
+            '`lag_probe` can not be used with `cluster` or `tracking`',
+        )
+        _check(
+            self.record is None or not self.tracking,
+            '`record` can not be used with `tracking`',
+        )
+
     def start(self):
-        self._thread = self.container.spawn_managed_thread(self._run)
+        if self.partitioned:
+            self._join()
+        if self.track_expiry:
+            self._track_expiry()
+        if self.lag_probe is not None:
+            self._start_lag_probe()
+        if self.record is not None:
+            self.recorder = NotificationRecorder(self.record)
+        if self.handoff is not None:
+            self._handoff_thread = self.container.spawn_managed_thread(self.handoff.run)
+        if self._shared_pubsub:
+            self.hub.register(self)
+        else:
+            self._thread = self.container.spawn_managed_thread(self._run)
         super().start()
         log.debug("%s started", self)
 
     def stop(self):
-        self._kill_thread()
+        self._stop_listening()
+        self._stop_snapshots()
+        if self._held is not None:
+            self._release_held()
+        if self.membership is not None:
+            self._leave()
+        if self.expiry is not None:
+            self._untrack_expiry()
+        if self.lag is not None:
+            self._stop_lag_probe()
+        if self.recorder is not None:
+            self.recorder.close()
+        # Messages already received are still handled
+        if self.handoff is not None:
+            self.handoff.flush()
+        if self._debouncer is not None:
+            self._debouncer.flush()
+        if self._enricher is not None:
+            self._enricher.flush()
+            self._enricher.close()
+        if self._batcher is not None:
+            self._batcher.flush()
         super().stop()
         log.debug("%s stopped", self)
 
     def kill(self):
-        self._kill_thread()
+        self._stop_listening()
+        self._stop_snapshots()
+        self._held = None
+        if self.membership is not None:
+            self._leave()
+        if self.expiry is not None:
+            self._untrack_expiry()
+        if self.lag is not None:
+            self._stop_lag_probe()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self._handoff_thread is not None:
+            self._handoff_thread.kill()
+        if self.handoff is not None:
+            self.handoff.cancel()
+        if self._debouncer is not None:
+            self._debouncer.cancel()
+        if self._enricher is not None:
+            self._enricher.cancel()
+            self._enricher.close()
+        if self._batcher is not None:
+            self._batcher.cancel()
         super().kill()
         log.debug("%s killed", self)
 
+    def patterns(self):
+        """Return the subscription patterns of the entrypoint.
+
+        Returns:
+            list(str): key-event patterns followed by key-space patterns.
+        """
+        keyevent_patterns = (
+            KEYEVENT_TEMPLATE.format(db=db, event=event)
+            for db in self.dbs
+            for event in self.events
+        )
+
+        keyspace_patterns = (
+            KEYSPACE_TEMPLATE.format(db=db, key=key)
+            for db in self.dbs
+            for key in self.keys
+        )
+
+        canary_patterns = (
+            [KEYSPACE_TEMPLATE.format(db=self.dbs[0], key=self.lag.key)]
+            if self.lag is not None
+            else []
+        )
+
+        return list(chain(keyevent_patterns, keyspace_patterns, canary_patterns))
+
+    def handle_message(self, message):
+        """Handle a message received from Redis."""
+        if self.metrics is not None:
+            self.metrics.received(message)
+
+        if self.recorder is not None:
+            self._record(message)
+
+        if self.lag is not None and self._probed(message):
+            return
+
+        if (
+            self.membership is not None
+            and message['type'] == REDIS_PMESSAGE_TYPE
+            and not self.membership.owns(partition_key(message))
+        ):
+            # Another service instance owns the key
+            return
+
+        if self.expiry is not None and not self.expiry.observe(message):
+            # Already dispatched at the deadline of the key
+            return
+
+        if self.parse_messages:
+            if message['type'] != REDIS_PMESSAGE_TYPE:
+                # Subscription confirmations never reach the workers
+                return
+            message = KeyspaceEvent.from_message(message, sequence=next(self._sequence))
+
+        if self.handoff is None:
+            self._handle(message)
+        else:
+            self.handoff.put(message)
+
+    def _record(self, message):
+        if message.get('synthetic'):
+            # Emitted by the entrypoint itself (e.g. snapshots), replaying them
+            # would emit them twice
+            return
+        # Canary notifications are only meaningful to this instance
+        if self.lag is None or not self.lag.is_canary(message):
+            self.recorder.record(message)
+
+    def _handle(self, message):
+        if self.lag is not None and self._observe_lag(message):
+            return
+        if self._debouncer is not None and message['type'] == REDIS_PMESSAGE_TYPE:
+            self._debouncer.add(message)
+        else:
+            self._forward(message)
+
+    def _debounced(self, message, merged):
+        if isinstance(message, KeyspaceEvent):
+            message.merged = merged
+        else:
+            message = dict(message, merged=merged)
+        self._forward(message)
+
+    def _forward(self, message):
+        if self._enricher is None:
+            self._deliver(message)
+        else:
+            self._enricher.add(message)
+
+    def _deliver(self, message):
+        if self._batcher is None:
+            self._dispatch(message)
+        else:
+            self._batcher.add(message)
+
     def _run(self):
         """Run the main loop which listens for subscription events."""
         self._create_client()
-        pubsub = None
+        self._channels = _literal_channels(self.patterns(), self.decode_responses)
 
         log.info('Started listening to Redis keyspace notifications')
-        error_count = 0
 
         try:
-            while True:
-                try:
-                    pubsub = self._subscribe()
-
-                    for message in pubsub.listen():  # pragma: no branch
-                        error_count = 0
-                        self.container.spawn_worker(self, [message], {})
-                except Exception:
-                    log.exception(
-                        'Error while listening for redis keyspace notifications'
-                    )
-                    sleep(self._backoff_factor * 2 ** error_count)
-                    error_count += 1
-                finally:
-                    if pubsub is not None:
-                        pubsub.close()
+            if self._cluster:
+                ClusterReaders(
+                    self.client, self._listen_node, self._cluster_refresh_interval
+                ).run()
+            elif self.tracking:
+                self._listen_invalidations(self.client)
+            else:
+                self._listen_shards(self.client)
         finally:
             log.info('Stopped listening to Redis keyspace notifications')
 
+    def _listen_node(self, client):
+        """Listen to a single node of a Redis Cluster."""
+        if self._notification_events is not None:
+            # Every node publishes the notifications of its own keys
+            client.config_set(NOTIFICATIONS_SETTING_KEY, self._notification_events)
+
+        self._listen_shards(client)
+
+    def _listen_shards(self, client):
+        """Listen with one pub/sub connection per shard of the patterns."""
+        shards = shard_patterns(self.patterns(), self.connections, self.shard_by)
+        if len(shards) == 1:
+            self._listen_shard(client, shards[0])
+            return
+
+        # Every shard reconnects on its own, so a failing connection does not
+        # stall the rest
+        threads = [
+            eventlet.spawn(self._listen_shard, client, patterns) for patterns in shards
+        ]
+        try:
+            for thread in threads:
+                thread.wait()
+        finally:
+            for thread in threads:
+                thread.kill()
+
+    def _listen_shard(self, client, patterns):
+        _listen(
+            partial(self._subscribe, client, patterns),
+            self._receive,
+            self._backoff_factor,
+            on_subscribed=partial(
+                self._on_subscribed, client=client, patterns=patterns
+            ),
+            on_error=self._on_disconnected,
+            threaded=self._threaded_reader,
+        )
+
+    def _listen_invalidations(self, client):
+        _listen(
+            partial(self._subscribe_invalidations, client, key_prefixes(self.keys)),
+            self._receive_invalidation,
+            self._backoff_factor,
+            on_subscribed=partial(
+                self._on_subscribed, client=client, patterns=self.patterns()
+            ),
+            on_error=self._on_disconnected,
+            threaded=self._threaded_reader,
+        )
+
+    def _receive(self, message):
+        self._handle_live(_normalize(message, self._channels))
+
+    def _receive_invalidation(self, message):
+        if message['type'] != REDIS_MESSAGE_TYPE:
+            self._handle_live(_normalize(message, {}))
+            return
+        for notification in invalidation_messages(message, self.keys):
+            self._handle_live(notification)
+
+    def _handle_live(self, message):
+        if self._held is not None:
+            # Handled once the snapshots in progress are over
+            self._held.append(message)
+        else:
+            self.handle_message(message)
+
+    def _dispatch(self, payload):
+        if self.metrics is None:
+            self.container.spawn_worker(self, [payload], {})
+            return
+
+        self.metrics.dispatching()
+        finished = _call_once(self.metrics.finished)
+        started = time.monotonic()
+        try:
+            worker_ctx = self.container.spawn_worker(
+                self, [payload], {}, handle_result=partial(_handle_result, finished)
+            )
+        except Exception:
+            finished()
+            raise
+        self.metrics.dispatched_worker(payload, time.monotonic() - started)
+
+        # `handle_result` is skipped when dependency injection fails or the
+        # worker is killed, so the end of its greenthread is followed too (if
+        # it has not already finished)
+        thread = getattr(self.container, '_worker_threads', {}).get(worker_ctx)
+        if thread is not None:
+            thread.link(lambda gt: finished())
+
     def _create_client(self):
-        client = StrictRedis.from_url(self._redis_uri, **REDIS_OPTIONS)
+        client = StrictRedis.from_url(
+            self._redis_uri, **redis_options(self.decode_responses)
+        )
 
         if self.dbs is None:
             # Use the actual connected DB if no DBs have been provided
@@ -213,33 +978,1086 @@ class RedisKNEntrypoint(Entrypoint):
 
         self.client = client
 
-    def _subscribe(self):
+    def _subscribe(self, client, patterns):
         log.debug('%s setting up redis subscriptions', self)
-        pubsub = self.client.pubsub()
+        pubsub = client.pubsub()
+        count = _subscribe_all(pubsub, patterns)
+        return pubsub, count
+
+    def _subscribe_invalidations(self, client, prefixes):
+        log.debug('%s setting up client tracking', self)
+        pubsub = client.pubsub()
+        # Tracking has to be enabled before subscribing, which restricts the
+        # commands the connection accepts
+        pubsub.connection = client.connection_pool.get_connection('pubsub', None)
+        enable_tracking(pubsub.connection, prefixes)
+        pubsub.subscribe(INVALIDATE_CHANNEL)
+        return pubsub, 1
+
+    def _on_subscribed(self, count, duration, client=None, patterns=None):
+        self.subscribe_duration = duration
+        log.debug('%s subscribed to %d patterns in %.3fs', self, count, duration)
+        if self.snapshot:
+            self._start_snapshot(client, patterns)
+
+    def _start_snapshot(self, client, patterns):
+        """Take a snapshot in a greenthread of its own.
+
+        The connection keeps being read meanwhile, so Redis does not drop it
+        for exceeding its pub/sub output buffer limit, but the live
+        notifications are held back until the snapshot has been handed over.
+        """
+        key = (id(client), tuple(patterns))
+        running = self._snapshots.pop(key, None)
+        if running is not None:
+            # Superseded after reconnecting
+            running.kill()
+        if self._held is None:
+            self._held = deque()
+        self._snapshots[key] = self.container.spawn_managed_thread(
+            partial(self._take_snapshot, key, client, patterns)
+        )
 
-        keyevent_patterns = (
-            KEYEVENT_TEMPLATE.format(db=db, event=event)
-            for db in self.dbs
-            for event in self.events
+    def _take_snapshot(self, key, client, patterns):
+        try:
+            emitted = snapshot(
+                client,
+                patterns,
+                self.handle_message,
+                count=self.scan_count,
+                rate=self.scan_rate,
+            )
+            log.debug('%s emitted %d snapshot notifications', self, emitted)
+        except Exception:
+            log.exception('Error taking a snapshot of the keys of %s', self)
+        del self._snapshots[key]
+        self._release_held()
+
+    def _release_held(self):
+        # Another snapshot may start while the held notifications are handled
+        while self._held and not self._snapshots:
+            self.handle_message(self._held.popleft())
+        if not self._snapshots:
+            self._held = None
+
+    def _stop_snapshots(self):
+        snapshots, self._snapshots = self._snapshots, {}
+        for thread in snapshots.values():
+            thread.kill()
+
+    def _on_disconnected(self):
+        """Called when listening fails, before subscribing again.
+
+        Notifications are lost until then.
+        """
+        if self.metrics is not None:
+            self.metrics.disconnected(self._backoff_factor)
+        if self.lag is not None:
+            self.lag.reset()
+
+    def _join(self):
+        client = StrictRedis.from_url(self._redis_uri, **REDIS_OPTIONS)
+        group = '{}.{}'.format(self.container.service_name, self.method_name)
+        self.membership = Membership(client, group, interval=self.heartbeat_interval)
+        try:
+            self.membership.heartbeat()
+        except Exception:
+            log.exception('Error joining %s', group)
+        self._membership_thread = self.container.spawn_managed_thread(
+            self.membership.run
         )
 
-        keyspace_patterns = (
-            KEYSPACE_TEMPLATE.format(db=db, key=key)
-            for db in self.dbs
-            for key in self.keys
+    def _leave(self):
+        self._membership_thread.kill()
+        try:
+            self.membership.leave()
+        except Exception:
+            log.exception('Error leaving %s', self.membership.group)
+
+    def _track_expiry(self):
+        client = StrictRedis.from_url(self._redis_uri, **REDIS_OPTIONS)
+        self.expiry = ExpiryTracker(client, self._expired, action=self.expiry_action)
+        self._expiry_thread = self.container.spawn_managed_thread(self.expiry.run)
+
+    def _untrack_expiry(self):
+        self._expiry_thread.kill()
+        self.expiry.close()
+
+    def _expired(self, db, key):
+        self.handle_message(expired_message(db, key))
+
+    def _start_lag_probe(self):
+        options = {} if self.dbs is None else {'db': self.dbs[0]}
+        client = StrictRedis.from_url(self._redis_uri, **dict(REDIS_OPTIONS, **options))
+        key = '{}{}.{}:{}'.format(
+            CANARY_PREFIX,
+            self.container.service_name,
+            self.method_name,
+            uuid.uuid4().hex,
         )
+        self.lag = LagProbe(
+            client,
+            key,
+            self.lag_probe,
+            threshold=self.lag_threshold,
+            on_alert=self._on_lag_alert,
+        )
+        self._lag_thread = self.container.spawn_managed_thread(self.lag.run)
+
+    def _stop_lag_probe(self):
+        self._lag_thread.kill()
+        self.lag.close()
+
+    def _probed(self, message):
+        """Handle the canary notifications and shed load while lagging."""
+        if message['type'] != REDIS_PMESSAGE_TYPE:
+            # The probe in flight may have been sent before subscribing
+            self.lag.reset()
+            return False
+
+        if self.lag.is_canary(message):
+            # Timed through the handoff queue too, but never dispatched
+            if self.handoff is None:
+                self._handle(message)
+            else:
+                self.handoff.put(message)
+            return True
+
+        if self.shed_load and self.lag.lagging:
+            self.lag.shed += 1
+            if self.metrics is not None:
+                self.metrics.shed_notification()
+            return True
+        return False
+
+    def _observe_lag(self, message):
+        if message['type'] != REDIS_PMESSAGE_TYPE or not self.lag.is_canary(message):
+            return False
+        lag = self.lag.observe(message)
+        if lag is not None:
+            log.debug('%s notifications lag %.3fs behind', self, lag)
+            if self.metrics is not None:
+                self.metrics.lag_measured(lag)
+        return True
+
+    def _on_lag_alert(self, lagging):
+        if self.metrics is not None:
+            self.metrics.lag_alert(lagging)
+
+    def _stop_listening(self):
+        if self._shared_pubsub:
+            self.hub.unregister(self)
+        elif self._thread is not None:
+            self._thread.kill()
+
+
+class RedisKNStreamEntrypoint(RedisKNEntrypoint):
+
+    """Redis Streams entrypoint fed by keyspace notifications.
+
+    Pub/sub messages are lost while no connection is listening (e.g. while
+    reconnecting) and every service instance receives all of them. Instead,
+    this entrypoint consumes the notifications from a Redis stream with a
+    consumer group, so they survive restarts and are spread across instances.
 
-        for pattern in chain(keyevent_patterns, keyspace_patterns):
-            pubsub.psubscribe(pattern)
+    With `bridge` (the default), the service instances running the
+    entrypoint elect a single leader that subscribes to the notifications (as
+    configured with `events`, `keys` and `dbs`) and appends them to the stream
+    with pipelined XADD commands, trimmed to about `maxlen` entries.
 
-        return pubsub
+    Every instance reads batches of entries with XREADGROUP and calls the
+    decorated method with each one of them, a message like the ones of
+    `RedisKNEntrypoint` with the `id` of the entry. Entries are acknowledged
+    (XACK) once the worker succeeds, so delivery is at-least-once: entries
+    pending for longer than `claim_idle` milliseconds (e.g. because their
+    worker failed or their consumer died) are reclaimed (XCLAIM) and
+    delivered again, up to `max_deliveries` times. Entries that have been
+    delivered that many times are given up on: they are appended to
+    `dead_letter_stream` (if any) and acknowledged.
 
-    def _kill_thread(self):
+    Every instance reads as a consumer of its own, which is deleted from the
+    group when the entrypoint stops (unless entries are still pending on it).
+    Consumers idle for longer than `claim_idle` milliseconds with no pending
+    entries (e.g. of instances that died) are deleted by the rest of them.
+
+        @rediskn.stream_subscribe(
+            uri_config_key='MY_REDIS', stream='expirations', events='expired'
+        )
+        def subscriber(self, message):
+            key = message['data']
+            # ...
+    """
+
+    def __init__(
+        self,
+        uri_config_key,
+        stream,
+        group=None,
+        bridge=True,
+        maxlen=DEFAULT_MAXLEN,
+        read_count=DEFAULT_READ_COUNT,
+        read_block=DEFAULT_READ_BLOCK,
+        claim_idle=DEFAULT_CLAIM_IDLE,
+        max_deliveries=DEFAULT_MAX_DELIVERIES,
+        dead_letter_stream=None,
+        leader_ttl=DEFAULT_LEADER_TTL,
+        **kwargs
+    ):
+        """Initialize the entrypoint.
+
+        Args:
+            uri_config_key (str): Redis URI config key.
+            stream (str): stream key.
+            group (str): consumer group. Defaults to
+                `<service name>.<method name>`.
+            bridge (bool): append the notifications to the stream (only from
+                the elected instance). `events`, `keys` and `dbs` are passed
+                as keyword arguments, as for `RedisKNEntrypoint`.
+            maxlen (int): approximate maximum length of the stream.
+            read_count (int): maximum number of entries read at once (and
+                appended to the stream with a single pipeline).
+            read_block (int): time, in milliseconds, to wait for new entries.
+            claim_idle (int): time, in milliseconds, an entry can be pending
+                before it is reclaimed.
+            max_deliveries (int): number of times an entry is delivered
+                before it is given up on. Unlimited if `None`.
+            dead_letter_stream (str): stream the entries given up on are
+                appended to. They are only logged by default.
+            leader_ttl (float): time, in seconds, the bridge leadership lasts
+                unless renewed.
+        """
+        self.stream = stream
+        self.group = group
+        self.bridge = bridge
+        self.maxlen = maxlen
+        self.read_count = read_count
+        self.read_block = read_block
+        self.claim_idle = claim_idle
+        self.max_deliveries = max_deliveries
+        self.dead_letter_stream = dead_letter_stream
+        self.leader_ttl = leader_ttl
+
+        self.consumer = uuid.uuid4().hex
+        self.election = None
+        self.stream_client = None
+        self._read_client = None
+        self._consumer_thread = None
+        self._election_thread = None
+        super().__init__(uri_config_key, **kwargs)
+
+    def setup(self):
+        super().setup()
+        # The bridge listens with its own connection, only while elected
+        self._shared_pubsub = False
+        if self.group is None:
+            self.group = '{}.{}'.format(self.container.service_name, self.method_name)
+        self._batcher = Batcher(self._append, self.read_count, self.max_batch_latency)
+
+    def _validate(self):
+        if self.bridge:
+            super()._validate()
+        # Notifications are only appended to the stream, never dispatched
+        unsupported = {
+            'batch_size': self.batch_size is not None,
+            'parse_messages': self.parse_messages,
+            'max_queue_size': self.max_queue_size is not None,
+            'debounce': self.debounce is not None,
+            'partitioned': self.partitioned,
+            'track_expiry': self.track_expiry,
+            'tracking': self.tracking,
+            'fetch': self.fetch is not None,
+            'lag_probe': self.lag_probe is not None,
+            'record': self.record is not None,
+        }
+        for name, used in sorted(unsupported.items()):
+            _check(
+                not used, '`{}` can not be used with `stream_subscribe`'.format(name)
+            )
+        _check(
+            self.max_deliveries is None or self.max_deliveries >= 1,
+            '`max_deliveries` must be a positive integer',
+        )
+
+    def start(self):
+        self.stream_client = StrictRedis.from_url(
+            self._redis_uri, **redis_options(self.decode_responses)
+        )
+        # Killing the consumer may leave a reply unread in its connection, so
+        # it does not share connections with the workers
+        self._read_client = StrictRedis.from_url(
+            self._redis_uri, **redis_options(self.decode_responses)
+        )
+        if self.bridge:
+            self.election = LeaderElection(
+                StrictRedis.from_url(self._redis_uri, **REDIS_OPTIONS),
+                BRIDGE_KEY_TEMPLATE.format(stream=self.stream),
+                ttl=self.leader_ttl,
+            )
+            self._election_thread = self.container.spawn_managed_thread(
+                self._run_election
+            )
+        self._consumer_thread = self.container.spawn_managed_thread(self._consume)
+        log.debug("%s started", self)
+
+    def stop(self):
+        self._stop_streaming()
+        super().stop()
+        self._release()
+        self._remove_consumer()
+
+    def kill(self):
+        self._stop_streaming()
+        super().kill()
+        self._release()
+
+    def handle_message(self, message):
+        """Append a notification received from Redis to the stream."""
+        if message['type'] == REDIS_PMESSAGE_TYPE:
+            self._batcher.add(message)
+
+    def handle_result(self, entry_id, worker_ctx, result, exc_info):
+        """Acknowledge the entry of a successful worker."""
+        if exc_info is None:
+            try:
+                self.stream_client.execute_command(
+                    'XACK', self.stream, self.group, entry_id
+                )
+            except Exception:
+                log.exception('Error acknowledging %s entry %s', self.stream, entry_id)
+        return result, exc_info
+
+    def _append(self, messages):
+        pipeline = self.client.pipeline(transaction=False)
+        for message in messages:
+            pipeline.execute_command(
+                'XADD',
+                self.stream,
+                'MAXLEN',
+                '~',
+                self.maxlen,
+                '*',
+                *entry_fields(message),
+            )
+        try:
+            pipeline.execute()
+        except Exception:
+            log.exception(
+                'Error appending %d messages to %s', len(messages), self.stream
+            )
+
+    def _run_election(self):
+        while True:
+            try:
+                leader = self.election.refresh()
+            except Exception:
+                log.exception('Error electing the %s bridge', self.stream)
+                # Another instance may take over once the leadership expires
+                leader = self.election.is_leader = False
+
+            if leader and self._thread is None:
+                log.info('Bridging Redis keyspace notifications to %s', self.stream)
+                self._thread = self.container.spawn_managed_thread(self._run)
+            elif not leader and self._thread is not None:
+                log.info(
+                    'Stopped bridging Redis keyspace notifications to %s', self.stream
+                )
+                self._thread.kill()
+                self._thread = None
+
+            sleep(self.leader_ttl / 3)
+
+    def _consume(self):
+        self._create_group()
+        claimed_at = None
+        error_count = 0
+        while True:
+            try:
+                now = time.monotonic()
+                if claimed_at is None or now - claimed_at >= self.claim_idle / 1000:
+                    claimed_at = now
+                    self._dispatch_entries(self._claim())
+                    self._remove_idle_consumers()
+
+                reply = self._read_client.execute_command(
+                    'XREADGROUP',
+                    'GROUP',
+                    self.group,
+                    self.consumer,
+                    'COUNT',
+                    self.read_count,
+                    'BLOCK',
+                    self.read_block,
+                    'STREAMS',
+                    self.stream,
+                    '>',
+                )
+                self._dispatch_entries(stream_entries(reply))
+                error_count = 0
+            except Exception:
+                log.exception('Error reading %s', self.stream)
+                sleep(self._backoff_factor * 2 ** error_count)
+                error_count += 1
+
+    def _create_group(self):
+        try:
+            self._read_client.execute_command(
+                'XGROUP', 'CREATE', self.stream, self.group, '$', 'MKSTREAM'
+            )
+        except ResponseError as exc:
+            if 'BUSYGROUP' not in str(exc):
+                raise
+
+    def _claim(self):
+        reply = self._read_client.execute_command(
+            'XPENDING',
+            self.stream,
+            self.group,
+            '-',
+            '+',
+            self.read_count,
+            parse_detail=True,
+        )
+        pending = pending_entries(reply, self.claim_idle)
+        if not pending:
+            return []
+        ids = [entry_id for entry_id, _ in pending]
+        reply = self._read_client.execute_command(
+            'XCLAIM', self.stream, self.group, self.consumer, self.claim_idle, *ids
+        )
+        entries = stream_entries(reply)
+        if self.max_deliveries is None:
+            return entries
+
+        exhausted = {
+            entry_id
+            for entry_id, deliveries in pending
+            if deliveries >= self.max_deliveries
+        }
+        if exhausted:
+            self._give_up(
+                exhausted, [entry for entry in entries if entry[0] in exhausted]
+            )
+        return [entry for entry in entries if entry[0] not in exhausted]
+
+    def _give_up(self, ids, entries):
+        """Move entries delivered `max_deliveries` times out of the way."""
+        pipeline = self._read_client.pipeline(transaction=False)
+        if self.dead_letter_stream is not None:
+            for entry_id, fields in entries:
+                pipeline.execute_command(
+                    'XADD',
+                    self.dead_letter_stream,
+                    'MAXLEN',
+                    '~',
+                    self.maxlen,
+                    '*',
+                    'id',
+                    entry_id,
+                    *entry_fields(entry_message(entry_id, fields)),
+                )
+        pipeline.execute_command('XACK', self.stream, self.group, *sorted(ids))
+        pipeline.execute()
+        log.error(
+            'Gave up on %d entries of %s after %d deliveries: %s',
+            len(ids),
+            self.stream,
+            self.max_deliveries,
+            sorted(ids),
+        )
+
+    def _remove_idle_consumers(self):
+        reply = self._read_client.execute_command(
+            'XINFO', 'CONSUMERS', self.stream, self.group
+        )
+        for name in idle_consumers(reply, self.claim_idle):
+            if name != self.consumer:
+                log.debug('%s removing idle consumer %s', self, name)
+                self._read_client.execute_command(
+                    'XGROUP', 'DELCONSUMER', self.stream, self.group, name
+                )
+
+    def _dispatch_entries(self, entries):
+        for entry_id, fields in entries:
+            self.container.spawn_worker(
+                self,
+                [entry_message(entry_id, fields)],
+                {},
+                handle_result=partial(self.handle_result, entry_id),
+            )
+
+    def _stop_streaming(self):
+        for thread in (self._consumer_thread, self._election_thread):
+            if thread is not None:
+                thread.kill()
+        if self._read_client is not None:
+            self._read_client.connection_pool.disconnect()
+
+    def _remove_consumer(self):
+        """Delete the consumer of the instance from the group.
+
+        Entries still pending on it (e.g. of workers still running) would be
+        lost with it, so it is left for other instances to remove once they
+        have reclaimed them.
+        """
+        if self.stream_client is None:
+            return
+        try:
+            reply = self.stream_client.execute_command(
+                'XPENDING', self.stream, self.group, '-', '+', 1, self.consumer
+            )
+            if not reply:
+                self.stream_client.execute_command(
+                    'XGROUP', 'DELCONSUMER', self.stream, self.group, self.consumer
+                )
+        except Exception:
+            log.exception('Error removing the consumer of %s', self.stream)
+
+    def _release(self):
+        if self.election is None:
+            return
+        try:
+            self.election.release()
+        except Exception:
+            log.exception('Error releasing the %s bridge', self.stream)
+
+
+class RedisKNHub(SharedExtension):
+
+    """Share Redis pub/sub connections between `RedisKNEntrypoint` instances.
+
+    Enabled with the `shared_pubsub` setting of the `REDIS` config. Instead of
+    every entrypoint opening its own pub/sub connection, all the entrypoints
+    using the same Redis URI, in any container of the process, subscribe
+    through a single `SharedPubSub` connection that fans the received
+    messages out to them.
+
+    There is one hub per container and Redis URI config key, keeping track of
+    the entrypoints of the container that are currently registered.
+    """
+
+    def __init__(self, uri_config_key, **kwargs):
+        self.uri_config_key = uri_config_key
+        self.entrypoints = set()
+        super().__init__(**kwargs)
+
+    @property
+    def sharing_key(self):
+        return (type(self), self.uri_config_key)
+
+    def register(self, entrypoint):
+        """Start receiving the notifications of `entrypoint`."""
+        key = (entrypoint._redis_uri, entrypoint.decode_responses)
+        shared_pubsub = _shared_pubsubs.get(key)
+        if shared_pubsub is None:
+            shared_pubsub = SharedPubSub(
+                entrypoint._redis_uri,
+                notification_events=entrypoint._notification_events,
+                backoff_factor=entrypoint._backoff_factor,
+                decode_responses=entrypoint.decode_responses,
+                threaded_reader=entrypoint._threaded_reader,
+            )
+            _shared_pubsubs[key] = shared_pubsub
+
+        shared_pubsub.register(entrypoint)
+        self.entrypoints.add(entrypoint)
+
+    def unregister(self, entrypoint):
+        """Stop receiving the notifications of `entrypoint`."""
+        self.entrypoints.discard(entrypoint)
+
+        key = (entrypoint._redis_uri, entrypoint.decode_responses)
+        shared_pubsub = _shared_pubsubs.get(key)
+        if shared_pubsub is None:
+            return
+
+        shared_pubsub.unregister(entrypoint)
+        if not shared_pubsub.subscriptions:
+            shared_pubsub.close()
+            del _shared_pubsubs[key]
+
+    def stop(self):
+        self._unregister_all()
+        super().stop()
+
+    def kill(self):
+        self._unregister_all()
+        super().kill()
+
+    def _unregister_all(self):
+        for entrypoint in list(self.entrypoints):
+            self.unregister(entrypoint)
+
+
+class SharedPubSub:
+
+    """Pub/sub connection shared by all the entrypoints of a Redis URI.
+
+    Only the patterns that are not covered by other patterns are subscribed to
+    (e.g. `__keyspace@0__:foo*` is not if `__keyspace@0__:*` is), so that Redis
+    pushes every notification as few times as possible. Messages are read once
+    and routed to the entrypoints through a `RoutingTable` indexing all their
+    patterns, so that each entrypoint receives the same messages, with the same
+    `pattern`, as it would with its own connection.
+
+    Subscription confirmations are only handed to the entrypoints whose
+    pattern has actually been subscribed to, but every entrypoint is told
+    (through its `_on_subscribed` callback) once the patterns covering its own
+    are subscribed to. When a new pattern covers patterns already subscribed
+    to, their messages keep being routed from the old patterns, which are only
+    unsubscribed from, until the new one is confirmed.
+
+    Entrypoints that do not decode responses use their own shared connection.
+    Only the channel and pattern of their messages are decoded, to route them.
+    """
+
+    def __init__(
+        self,
+        redis_uri,
+        notification_events=None,
+        backoff_factor=None,
+        decode_responses=True,
+        threaded_reader=False,
+    ):
+        """Initialize the shared connection.
+
+        Args:
+            redis_uri (str): Redis URI.
+            notification_events (str): value for `notify-keyspace-events`,
+                which is only set if provided.
+            backoff_factor (float): exponential backoff factor for reconnecting
+                on errors.
+            decode_responses (bool): whether to decode the messages.
+            threaded_reader (bool): read the connection from a native thread
+                (see `nameko_rediskn.reader.ThreadedReader`).
+        """
+        self.redis_uri = redis_uri
+        self.decode_responses = decode_responses
+        self.threaded_reader = threaded_reader
+        self.client = StrictRedis.from_url(redis_uri, **redis_options(decode_responses))
+        self.subscriptions = {}
+        self.subscribed = set()
+        self.routes = RoutingTable()
+        self.pubsub = None
+        self._notification_events = notification_events
+        self._backoff_factor = (
+            DEFAULT_BACKOFF_FACTOR if backoff_factor is None else backoff_factor
+        )
+        self.subscribe_duration = None
+        # Pattern covering every pattern, and the one its messages are
+        # currently routed from
+        self._targets = {}
+        self._owners = {}
+        self._channels = {}
+        self._thread = None
+        # Patterns subscribed to through the connection, and confirmed
+        self._sent = set()
+        self._active = set()
+        # Entrypoints waiting for the confirmations of the patterns covering
+        # theirs
+        self._waiting = {}
+
+    def register(self, entrypoint):
+        """Subscribe to the patterns of `entrypoint` and start listening."""
+        if entrypoint.dbs is None:
+            # Use the actual connected DB if no DBs have been provided
+            entrypoint.dbs = [self.client.connection_pool.connection_kwargs['db']]
+
+        for pattern in entrypoint.patterns():
+            self.subscriptions.setdefault(pattern, []).append(entrypoint)
+            self.routes.add(pattern, entrypoint)
+
+        self._update_subscriptions()
+        self._wait_for(entrypoint)
+        if self._thread is None:
+            self._thread = eventlet.spawn(self._run)
+
+    def unregister(self, entrypoint):
+        """Stop handing messages to `entrypoint`."""
+        self._waiting.pop(entrypoint, None)
+        for pattern, entrypoints in list(self.subscriptions.items()):
+            while entrypoint in entrypoints:
+                entrypoints.remove(entrypoint)
+                self.routes.remove(pattern, entrypoint)
+            if not entrypoints:
+                del self.subscriptions[pattern]
+
+        if self.subscriptions:
+            self._update_subscriptions()
+
+    def close(self):
+        """Stop listening and close the connection."""
         if self._thread is not None:
             self._thread.kill()
+            self._thread = None
+
+    def handle_message(self, message):
+        """Hand a message to the entrypoints subscribed to its channel."""
+        message = _normalize(message, self._channels)
+        channel = message['channel']
+        if not self.decode_responses:
+            channel = _to_text(channel)
+
+        if message['type'] != REDIS_PMESSAGE_TYPE:
+            # Subscription confirmations are sent for the subscribed pattern
+            for entrypoint in self.subscriptions.get(channel, ()):
+                self._hand_over(entrypoint, dict(message))
+            if message['type'] in SUBSCRIPTION_TYPES:
+                self._confirm(channel)
+            else:
+                self._active.discard(channel)
+            return
+
+        subscribed = message['pattern']
+        if not self.decode_responses:
+            subscribed = _to_text(subscribed)
+
+        for pattern, entrypoint in self.routes.match(channel):
+            # Redis sends a message per subscribed pattern matching the
+            # channel, each route is only handled by one of them
+            if self._owners.get(pattern) == subscribed:
+                if not self.decode_responses:
+                    pattern = _to_bytes(pattern)
+                self._hand_over(entrypoint, dict(message, pattern=pattern))
+
+    def _hand_over(self, entrypoint, message):
+        try:
+            entrypoint.handle_message(message)
+        except Exception:
+            # One failing entrypoint must not affect the rest of them
+            log.exception('Error handing a message over to %s', entrypoint)
+
+    def _run(self):
+        if self._notification_events is not None:
+            # This should ideally be set in redis.conf
+            self.client.config_set(NOTIFICATIONS_SETTING_KEY, self._notification_events)
+
+        log.info('Started listening to Redis keyspace notifications (shared)')
+
+        try:
+            _listen(
+                self._subscribe,
+                self.handle_message,
+                self._backoff_factor,
+                on_subscribed=self._on_subscribed,
+                on_error=self._on_disconnected,
+                threaded=self.threaded_reader,
+            )
+        finally:
+            self.pubsub = None
+            log.info('Stopped listening to Redis keyspace notifications (shared)')
+
+    def _subscribe(self):
+        log.debug('%s setting up redis subscriptions', self)
+        self.pubsub = None
+        self._reset()
+        pubsub = self.client.pubsub()
+        count = 0
+        # Entrypoints may register while subscribing, their patterns are
+        # subscribed to as well
+        while self.subscribed - self._sent:
+            patterns = sorted(self.subscribed - self._sent)
+            self._sent.update(patterns)
+            count += _subscribe_all(pubsub, patterns)
+        self.pubsub = pubsub
+        for entrypoint in self._entrypoints():
+            self._wait_for(entrypoint)
+        return pubsub, count
+
+    def _on_subscribed(self, count, duration):
+        # Entrypoints are told once their own patterns are confirmed
+        self.subscribe_duration = duration
+        log.debug('%s subscribed to %d patterns in %.3fs', self, count, duration)
+
+    def _on_disconnected(self):
+        self.pubsub = None
+        self._reset()
+        for entrypoint in self._entrypoints():
+            entrypoint._on_disconnected()
+
+    def _reset(self):
+        self._sent = set()
+        self._active = set()
+        self._waiting = {}
+        self._owners = {}
+        self._route()
+
+    def _entrypoints(self):
+        return {
+            entrypoint
+            for entrypoints in self.subscriptions.values()
+            for entrypoint in entrypoints
+        }
+
+    def _wait_for(self, entrypoint):
+        patterns = {
+            self._targets[pattern] for pattern in entrypoint.patterns()
+        } - self._active
+        if patterns:
+            self._waiting[entrypoint] = (patterns, len(patterns), time.monotonic())
+        else:
+            # Covered by the patterns already subscribed to
+            entrypoint._on_subscribed(0, 0.0)
+
+    def _confirm(self, pattern):
+        self._active.add(pattern)
+        self._route()
+        self._unsubscribe_stale()
+        for entrypoint, (patterns, total, started) in list(self._waiting.items()):
+            patterns.discard(pattern)
+            if not patterns:
+                del self._waiting[entrypoint]
+                entrypoint._on_subscribed(total, time.monotonic() - started)
+
+    def _update_subscriptions(self):
+        self._targets = covering_patterns(self.subscriptions)
+        self.subscribed = set(self._targets.values())
+        self._route()
+
+        if self.pubsub is not None:
+            new_patterns = sorted(self.subscribed - self._sent)
+            if new_patterns:
+                self._sent.update(new_patterns)
+                self._execute(_subscribe_all, self.pubsub, new_patterns)
+            self._unsubscribe_stale()
+
+    def _route(self):
+        # Patterns are routed from the pattern covering them once it is
+        # confirmed, until then from the confirmed pattern they were routed
+        # from (if any), so that no message is missed in between
+        owners = {}
+        for pattern, target in self._targets.items():
+            owner = self._owners.get(pattern)
+            if target in self._active or owner not in self._active:
+                owner = target
+            owners[pattern] = owner
+        self._owners = owners
+        self._channels = _literal_channels(
+            self.subscribed | self._sent, self.decode_responses
+        )
+
+    def _unsubscribe_stale(self):
+        if self.pubsub is None:
+            return
+        stale_patterns = sorted(
+            self._sent - self.subscribed - set(self._owners.values())
+        )
+        if stale_patterns:
+            self._sent.difference_update(stale_patterns)
+            self._execute(_unsubscribe_all, self.pubsub, stale_patterns)
+
+    def _execute(self, command, *args):
+        try:
+            command(*args)
+        except Exception:
+            # The listener will subscribe again when it reconnects
+            log.exception('Error updating shared redis subscriptions')
+
+    def __repr__(self):
+        return '<{} [{}] at 0x{:x}>'.format(
+            type(self).__name__, self.redis_uri, id(self)
+        )
+
+
+_shared_pubsubs = {}
+"""
+Shared pub/sub connections of the process, by Redis URI and whether they
+decode responses.
+"""
+
+
+def _subscribe_all(pubsub, patterns):
+    """Subscribe to `patterns` with as few commands as possible.
+
+    Literal patterns are subscribed to with SUBSCRIBE and the rest of them
+    with PSUBSCRIBE.
+
+    Args:
+        pubsub (PubSub): pub/sub instance.
+        patterns (iterable(str)): patterns to subscribe to.
+
+    Returns:
+        int: number of channels and patterns subscribed to (one confirmation
+        message is received for each of them).
+    """
+    channels, patterns = _split_patterns(patterns)
+    _chunked(pubsub.subscribe, channels)
+    _chunked(pubsub.psubscribe, patterns)
+    return len(channels) + len(patterns)
+
+
+def _unsubscribe_all(pubsub, patterns):
+    """Unsubscribe from `patterns` subscribed to with `_subscribe_all`."""
+    channels, patterns = _split_patterns(patterns)
+    _chunked(pubsub.unsubscribe, channels)
+    _chunked(pubsub.punsubscribe, patterns)
+
+
+def _split_patterns(patterns):
+    patterns = list(OrderedDict.fromkeys(patterns))
+    channels = [literal(pattern) for pattern in patterns if is_literal(pattern)]
+    patterns = [pattern for pattern in patterns if not is_literal(pattern)]
+    return list(OrderedDict.fromkeys(channels)), patterns
+
+
+def _chunked(command, args):
+    for start in range(0, len(args), SUBSCRIBE_CHUNK_SIZE):
+        end = start + SUBSCRIBE_CHUNK_SIZE
+        command(*args[start:end])
+
+
+def _literal_channels(patterns, decode_responses=True):
+    """Map the channels of the literal `patterns` to their pattern.
+
+    Both are encoded if responses are not decoded, as they are received.
+    """
+    channels = {
+        literal(pattern): pattern for pattern in patterns if is_literal(pattern)
+    }
+    if decode_responses:
+        return channels
+    return {
+        _to_bytes(channel): _to_bytes(pattern) for channel, pattern in channels.items()
+    }
+
+
+def _check(condition, error_message):
+    if not condition:
+        log.error(error_message)
+        raise ConfigurationError(error_message)
+
+
+def redis_options(decode_responses):
+    """Return the options of the Redis clients of an entrypoint.
+
+    Args:
+        decode_responses (bool): whether the responses are decoded.
+    """
+    return REDIS_OPTIONS if decode_responses else RAW_REDIS_OPTIONS
+
+
+def _to_text(value):
+    return value.decode(RAW_REDIS_OPTIONS['encoding'], 'surrogateescape')
+
+
+def _to_bytes(value):
+    return value.encode(RAW_REDIS_OPTIONS['encoding'], 'surrogateescape')
+
+
+def _normalize(message, channels):
+    """Give the messages of SUBSCRIBE subscriptions the PSUBSCRIBE shape.
+
+    Args:
+        message (dict): message received from Redis.
+        channels (dict): patterns of the subscribed channels, by channel.
+
+    Returns:
+        dict: `message` as it would have been received through PSUBSCRIBE,
+        with the `pmessage`, `psubscribe` or `punsubscribe` type.
+    """
+    message_type = message['type']
+    if message_type == REDIS_MESSAGE_TYPE:
+        channel = message['channel']
+        return dict(
+            message,
+            type=REDIS_PMESSAGE_TYPE,
+            pattern=channels.get(channel, channel),
+        )
+    if message_type in ('subscribe', 'unsubscribe'):
+        channel = message['channel']
+        return dict(
+            message, type='p' + message_type, channel=channels.get(channel, channel)
+        )
+    return message
+
+
+def _listen(
+    subscribe,
+    handle_message,
+    backoff_factor,
+    on_subscribed=None,
+    on_error=None,
+    threaded=False,
+):
+    """Listen for subscription events, reconnecting on errors.
+
+    Args:
+        subscribe (callable): returns a subscribed `PubSub` instance and the
+            number of subscription confirmations to expect.
+        handle_message (callable): called with every message received.
+        backoff_factor (float): exponential backoff factor.
+        on_subscribed (callable): called with the number of subscriptions and
+            the time it took to subscribe once all the confirmations have been
+            received.
+        on_error (callable): called every time listening fails, before
+            backing off.
+        threaded (bool): read the connection from a native thread, instead
+            of the eventlet hub.
+    """
+    error_count = 0
+
+    while True:
+        pubsub = messages = None
+        try:
+            started = time.monotonic()
+            pubsub, pending = subscribe()
+            count = pending
+
+            messages = _read_in_thread(pubsub) if threaded else drain(pubsub)
+            for message in messages:  # pragma: no branch
+                error_count = 0
+                if pending and message['type'] in SUBSCRIPTION_TYPES:
+                    pending -= 1
+                    if not pending and on_subscribed is not None:
+                        on_subscribed(count, time.monotonic() - started)
+                handle_message(message)
+        except Exception:
+            log.exception('Error while listening for redis keyspace notifications')
+            if on_error is not None:
+                on_error()
+            sleep(backoff_factor * 2 ** error_count)
+            error_count += 1
+        finally:
+            if messages is not None:
+                # The reader thread is stopped before closing the connection
+                messages.close()
+            if pubsub is not None:
+                pubsub.close()
+
+
+def _read_in_thread(pubsub):
+    """Yield the messages of `pubsub`, read by a `ThreadedReader`."""
+    if not can_read_directly(pubsub.connection):
+        yield from pubsub.listen()
+        return
+
+    reader = ThreadedReader(pubsub.connection)
+    reader.start()
+    try:
+        while True:
+            yield from reader.get()
+    finally:
+        reader.stop()
+
+
+def _call_once(func):
+    """Return a function calling `func` the first time it is called only."""
+    called = []
+
+    def call(*args):
+        if not called:
+            called.append(True)
+            func()
+
+    return call
+
+
+def _handle_result(finished, worker_ctx, result, exc_info):
+    finished()
+    return result, exc_info
 
 
-def _to_list(arg):
+def to_list(arg):
+    """Return `arg` as a list, wrapping a single value."""
     if isinstance(arg, tuple):
         return list(arg)
     if not isinstance(arg, list):
@@ -248,3 +2066,4 @@ def _to_list(arg):
 
 
 subscribe = RedisKNEntrypoint.decorator
+stream_subscribe = RedisKNStreamEntrypoint.decorator
@@ -0,0 +1,107 @@
+from redis.exceptions import InvalidResponse, ResponseError
+
+try:
+    import hiredis
+except ImportError:
+    hiredis = None
+
+COMPACT_SIZE = 64 * 1024
+"""Size, in bytes, of the replies parsed that the buffer is compacted at."""
+
+
+class _Incomplete(Exception):
+    pass
+
+
+class RespReader:
+
+    """Incremental parser of the replies of Redis (RESP2).
+
+    It has the interface of `hiredis.Reader`: data read from the connection
+    is fed as it comes and `gets` returns the replies as soon as they are
+    complete, keeping any partial reply until the rest of it is fed. Bulk
+    strings are returned as `bytes`, and error replies as `ResponseError`
+    instances.
+
+    Example:
+
+        reader = RespReader()
+        reader.feed(sock.recv(65536))
+        reply = reader.gets()
+        while reply is not False:
+            ...
+            reply = reader.gets()
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def feed(self, data):
+        """Add data read from the connection."""
+        if self._position >= COMPACT_SIZE:
+            del self._buffer[: self._position]
+            self._position = 0
+        self._buffer += data
+
+    def gets(self):
+        """Return the next complete reply, or `False` if there is none."""
+        try:
+            reply, self._position = self._parse(self._position)
+        except _Incomplete:
+            return False
+        if self._position == len(self._buffer):
+            self._buffer.clear()
+            self._position = 0
+        return reply
+
+    def _parse(self, position):
+        buffer = self._buffer
+        end = buffer.find(b'\r\n', position)
+        if end < 0:
+            raise _Incomplete()
+        kind = chr(buffer[position])
+        start = position + 1
+        line = bytes(buffer[start:end])
+        position = end + 2
+
+        if kind == '$':
+            return self._parse_bulk(int(line), position)
+        if kind == '*':
+            return self._parse_array(int(line), position)
+        if kind == ':':
+            return int(line), position
+        if kind == '+':
+            return line, position
+        if kind == '-':
+            return ResponseError(line.decode('utf-8', 'replace')), position
+        raise InvalidResponse('Protocol Error: {!r}'.format(kind.encode() + line))
+
+    def _parse_bulk(self, length, position):
+        if length < 0:
+            return None, position
+        end = position + length
+        if len(self._buffer) < end + 2:
+            raise _Incomplete()
+        return bytes(self._buffer[position:end]), end + 2
+
+    def _parse_array(self, length, position):
+        if length < 0:
+            return None, position
+        reply = []
+        for _ in range(length):
+            item, position = self._parse(position)
+            reply.append(item)
+        return reply, position
+
+
+def create_reader():
+    """Return an incremental parser of the replies of Redis.
+
+    `hiredis.Reader` is used when hiredis is installed (e.g. with the
+    `hiredis` extra), and `RespReader` otherwise. Either way, error replies
+    are returned as `ResponseError` instances.
+    """
+    if hiredis is not None:
+        return hiredis.Reader(protocolError=InvalidResponse, replyError=ResponseError)
+    return RespReader()
@@ -0,0 +1,339 @@
+import re
+from zlib import crc32
+
+GLOB_CHARS = frozenset('*?[')
+"""Characters with a special meaning in Redis glob-style patterns."""
+
+SHARD_BY_DB = 'db'
+"""Sharding strategy assigning all the patterns of a db to the same shard."""
+
+SHARD_BY_PATTERN = 'pattern'
+"""Sharding strategy assigning the patterns to the shards in turns."""
+
+SHARD_BY_HASH = 'hash'
+"""Sharding strategy assigning the patterns to shards by their hash."""
+
+SHARD_STRATEGIES = frozenset((SHARD_BY_DB, SHARD_BY_PATTERN, SHARD_BY_HASH))
+
+
+def unescape(pattern):
+    """Split a Redis glob-style pattern into literal and special characters.
+
+    Args:
+        pattern (str): Redis glob-style pattern.
+
+    Returns:
+        list(tuple(str, bool)): characters of the pattern, with escaping
+        backslashes removed, paired with whether they are special.
+    """
+    chars = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            chars.append((char, False))
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        else:
+            chars.append((char, char in GLOB_CHARS))
+    if escaped:
+        # A trailing backslash matches itself
+        chars.append(('\\', False))
+    return chars
+
+
+def is_literal(pattern):
+    """Whether a Redis glob-style pattern only matches a single channel."""
+    return not any(special for _, special in unescape(pattern))
+
+
+def literal(pattern):
+    """Return the channel matched by a literal pattern."""
+    return ''.join(char for char, _ in unescape(pattern))
+
+
+def prefix(pattern):
+    """Return the prefix of a `<literal>*` pattern, or `None`."""
+    chars = unescape(pattern)
+    while chars and chars[-1] == ('*', True):
+        chars.pop()
+    if len(chars) == len(unescape(pattern)):
+        return None
+    if any(special for _, special in chars):
+        return None
+    return ''.join(char for char, _ in chars)
+
+
+def compile_glob(pattern):
+    """Compile a Redis glob-style pattern into a regular expression.
+
+    Supports `*`, `?`, `[...]` character classes (with `^` negation and
+    ranges) and backslash escaping, as Redis does for PSUBSCRIBE.
+
+    Args:
+        pattern (str): Redis glob-style pattern.
+
+    Returns:
+        re.Pattern: compiled regular expression matching whole channels.
+    """
+    regex = []
+    index = 0
+    length = len(pattern)
+    while index < length:
+        char = pattern[index]
+        index += 1
+        if char == '\\' and index < length:
+            regex.append(re.escape(pattern[index]))
+            index += 1
+        elif char == '*':
+            regex.append('.*')
+        elif char == '?':
+            regex.append('.')
+        elif char == '[':
+            end = _class_end(pattern, index)
+            regex.append(_character_class(pattern[index:end]))
+            index = end + 1
+        else:
+            regex.append(re.escape(char))
+    return re.compile(''.join(regex), re.DOTALL)
+
+
+def _class_end(pattern, start):
+    index = start
+    if pattern.startswith('^', index):
+        index += 1
+    while index < len(pattern):
+        if pattern[index] == '\\':
+            index += 2
+        elif pattern[index] == ']':
+            return index
+        else:
+            index += 1
+    # Redis closes unterminated classes at the end of the pattern
+    return len(pattern)
+
+
+def _character_class(body):
+    negate = body.startswith('^')
+    if negate:
+        body = body[1:]
+
+    items = []
+    index = 0
+    while index < len(body):
+        char = body[index]
+        if char == '\\' and index + 1 < len(body):
+            items.append(re.escape(body[index + 1]))
+            index += 2
+        elif index + 2 < len(body) and body[index + 1] == '-':
+            start, end = sorted((char, body[index + 2]))
+            items.append('{}-{}'.format(re.escape(start), re.escape(end)))
+            index += 3
+        else:
+            items.append(re.escape(char))
+            index += 1
+
+    if not items:
+        # Redis never matches an empty class
+        return '(?!)' if not negate else '.'
+    return '[{}{}]'.format('^' if negate else '', ''.join(items))
+
+
+def covers(pattern, other):
+    """Whether every channel matched by `other` is also matched by `pattern`.
+
+    This is only decided for patterns whose only special character is `*`
+    (e.g. `__keyspace@0__:*`), and for other patterns with no classes or
+    escapes, which covers the common cases. Otherwise only equal patterns
+    are considered to cover each other.
+    """
+    if pattern == other:
+        return True
+    if '\\' in pattern or '?' in pattern or '[' in pattern:
+        return False
+    if '\\' in other or '[' in other:
+        # The characters of a class or an escape could be matched by the
+        # literal characters of `pattern` (e.g. `*b*` and `[ab]`)
+        return False
+    # Any `*` or `?` of `other` falls within one of the `*` of `pattern`,
+    # which match anything
+    return compile_glob(pattern).fullmatch(other) is not None
+
+
+def covering_patterns(patterns):
+    """Find the patterns to subscribe to in order to receive `patterns`.
+
+    Patterns covered by another pattern are redundant: subscribing to both
+    would make Redis send the same notification twice.
+
+    Args:
+        patterns (iterable(str)): patterns of interest.
+
+    Returns:
+        dict: maps every pattern to the pattern that covers it (itself, if it
+        is not covered by any other pattern).
+    """
+    kept = []
+    for pattern in sorted(set(patterns)):
+        if any(covers(other, pattern) for other in kept):
+            continue
+        kept = [other for other in kept if not covers(pattern, other)]
+        kept.append(pattern)
+
+    owners = {}
+    for pattern in patterns:
+        owners[pattern] = next(other for other in kept if covers(other, pattern))
+    return owners
+
+
+def shard_patterns(patterns, shards, shard_by=SHARD_BY_HASH):
+    """Split notification patterns into shards.
+
+    Args:
+        patterns (list(str)): key-event and key-space patterns.
+        shards (int): maximum number of shards.
+        shard_by (str): sharding strategy, one of `SHARD_BY_DB`,
+            `SHARD_BY_PATTERN` or `SHARD_BY_HASH`.
+
+    Returns:
+        list(list(str)): the patterns of every shard, leaving empty shards
+        out.
+    """
+    if shard_by == SHARD_BY_DB:
+        dbs = sorted(set(_pattern_db(pattern) for pattern in patterns))
+        indexes = [dbs.index(_pattern_db(pattern)) for pattern in patterns]
+    elif shard_by == SHARD_BY_PATTERN:
+        indexes = list(range(len(patterns)))
+    else:
+        indexes = [crc32(pattern.encode('utf-8')) for pattern in patterns]
+
+    split = [[] for _ in range(shards)]
+    for position, pattern in enumerate(patterns):
+        split[indexes[position] % shards].append(pattern)
+    return [shard for shard in split if shard]
+
+
+def _pattern_db(pattern):
+    # Patterns follow the `__key<kind>@<db>__:<suffix>` templates
+    start = pattern.index('@') + 1
+    end = pattern.index('__:')
+    return pattern[start:end]
+
+
+class _TrieNode:
+
+    __slots__ = ('children', 'routes')
+
+    def __init__(self):
+        self.children = {}
+        self.routes = []
+
+
+class RoutingTable:
+
+    """Index of Redis glob-style patterns to find the ones matching a channel.
+
+    Patterns are indexed depending on their shape, so that looking up the
+    routes of a channel does not require matching it against every pattern:
+
+        - Literal patterns (e.g. `__keyevent@0__:expired`) are looked up in a
+          hash table.
+        - Prefix patterns (e.g. `__keyspace@0__:user:*`) are looked up in a
+          prefix trie, walking the channel once.
+        - Any other pattern (e.g. `__keyspace@*__:user:?`) is matched with a
+          compiled regular expression.
+
+    Each pattern can be routed to any number of targets.
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._trie = _TrieNode()
+        self._globs = {}
+        self._routes = {}
+
+    def add(self, pattern, target):
+        """Route the channels matching `pattern` to `target`."""
+        targets = self._routes.setdefault(pattern, [])
+        targets.append(target)
+        route = (pattern, target)
+
+        if is_literal(pattern):
+            self._exact.setdefault(literal(pattern), []).append(route)
+            return
+
+        pattern_prefix = prefix(pattern)
+        if pattern_prefix is not None:
+            node = self._trie
+            for char in pattern_prefix:
+                node = node.children.setdefault(char, _TrieNode())
+            node.routes.append(route)
+            return
+
+        if pattern not in self._globs:
+            self._globs[pattern] = (compile_glob(pattern), [])
+        self._globs[pattern][1].append(route)
+
+    def remove(self, pattern, target):
+        """Stop routing the channels matching `pattern` to `target`."""
+        targets = self._routes.get(pattern, [])
+        if target not in targets:
+            return
+        targets.remove(target)
+        if not targets:
+            del self._routes[pattern]
+        route = (pattern, target)
+
+        if is_literal(pattern):
+            channel = literal(pattern)
+            self._exact[channel].remove(route)
+            if not self._exact[channel]:
+                del self._exact[channel]
+            return
+
+        pattern_prefix = prefix(pattern)
+        if pattern_prefix is not None:
+            # Empty trie nodes are left in place, they are cheap to walk
+            node = self._trie
+            for char in pattern_prefix:
+                node = node.children[char]
+            node.routes.remove(route)
+            return
+
+        routes = self._globs[pattern][1]
+        routes.remove(route)
+        if not routes:
+            del self._globs[pattern]
+
+    def match(self, channel):
+        """Find the routes of a channel.
+
+        Args:
+            channel (str): channel name.
+
+        Returns:
+            list(tuple(str, object)): `(pattern, target)` pairs for every
+            pattern that matches the channel.
+        """
+        routes = list(self._exact.get(channel, ()))
+
+        node = self._trie
+        routes.extend(node.routes)
+        for char in channel:
+            node = node.children.get(char)
+            if node is None:
+                break
+            routes.extend(node.routes)
+
+        for regex, glob_routes in self._globs.values():
+            if regex.fullmatch(channel) is not None:
+                routes.extend(glob_routes)
+
+        return routes
+
+    def patterns(self):
+        """Return the routed patterns."""
+        return list(self._routes)
+
+    def __len__(self):
+        return sum(len(targets) for targets in self._routes.values())
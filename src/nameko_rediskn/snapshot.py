@@ -0,0 +1,128 @@
+import time
+
+from eventlet import sleep
+
+from .cluster import DbClients
+from .events import KEYSPACE, parse_channel
+
+SNAPSHOT_EVENT = 'snapshot'
+"""Event of the synthetic notifications emitted for existing keys."""
+
+DEFAULT_SCAN_COUNT = 1000
+"""Default number of keys requested with every SCAN command."""
+
+
+def scan_keys(client, match, count=DEFAULT_SCAN_COUNT, rate=None):
+    """Iterate over the keys matching a pattern in batches.
+
+    Only one batch is held in memory at a time, however many keys there are.
+
+    Args:
+        client (StrictRedis): client connected to the db to scan.
+        match (str): Redis glob-style pattern of the keys.
+        count (int): number of keys requested with every SCAN command.
+        rate (float): maximum number of keys per second, so scanning a large
+            keyspace does not hog Redis. Unlimited by default.
+
+    Yields:
+        list: keys matching the pattern (SCAN may return the same key more
+        than once).
+    """
+    cursor = None
+    while cursor != 0:
+        started = time.monotonic()
+        cursor, keys = client.scan(cursor or 0, match=match, count=count)
+        cursor = int(cursor)
+        if keys:
+            yield keys
+
+        pause = 0
+        if rate is not None:
+            pause = len(keys) / rate - (time.monotonic() - started)
+        # Let other greenthreads run between batches
+        sleep(max(pause, 0))
+
+
+def snapshot(client, patterns, handle_message, count=DEFAULT_SCAN_COUNT, rate=None):
+    """Emit a synthetic notification for every key matching key-space patterns.
+
+    The type and the remaining time to live of the keys are fetched with a
+    pipeline per batch of keys.
+
+    Args:
+        client (StrictRedis): Redis client.
+        patterns (list(str)): subscription patterns, only key-space ones with
+            a specific db are used.
+        handle_message (callable): called with every synthetic message.
+        count (int): number of keys requested with every SCAN command.
+        rate (float): maximum number of keys per second.
+
+    Returns:
+        int: number of synthetic notifications emitted.
+    """
+    clients = DbClients(client)
+    try:
+        return _snapshot(clients, patterns, handle_message, count, rate)
+    finally:
+        clients.close()
+
+
+def _snapshot(clients, patterns, handle_message, count, rate):
+    emitted = 0
+    for pattern in patterns:
+        kind, db, match = parse_channel(pattern)
+        if kind != KEYSPACE or not db.isdigit():
+            continue
+
+        db = int(db)
+        db_client = clients.get(db)
+
+        for keys in scan_keys(db_client, match, count=count, rate=rate):
+            pipeline = db_client.pipeline(transaction=False)
+            for key in keys:
+                pipeline.type(key)
+                pipeline.pttl(key)
+            replies = pipeline.execute()
+
+            for index, key in enumerate(keys):
+                key_type = replies[2 * index]
+                pttl = replies[2 * index + 1]
+                if pttl == -2:
+                    # Gone since it was scanned
+                    continue
+                handle_message(snapshot_message(pattern, db, key, key_type, pttl))
+                emitted += 1
+    return emitted
+
+
+def snapshot_message(pattern, db, key, key_type, pttl):
+    """Build the synthetic notification of an existing key.
+
+    It looks like a key-space `pmessage` notification, with `snapshot` as the
+    event, plus:
+
+        `synthetic`: always `True`.
+        `key_type`: type of the key (e.g. `string` or `hash`).
+        `pttl`: remaining time to live of the key, in milliseconds (`-1` if
+        it does not expire).
+
+    The fields are `bytes` if `key` is.
+    """
+    if isinstance(key, bytes):
+        channel = '__keyspace@{}__:'.format(db).encode() + key
+        event = SNAPSHOT_EVENT.encode()
+        pattern = pattern.encode('utf-8', 'surrogateescape')
+    else:
+        channel = '__keyspace@{}__:{}'.format(db, key)
+        event = SNAPSHOT_EVENT
+    if isinstance(key_type, bytes):
+        key_type = key_type.decode('ascii')
+    return {
+        'type': 'pmessage',
+        'pattern': pattern,
+        'channel': channel,
+        'data': event,
+        'synthetic': True,
+        'key_type': key_type,
+        'pttl': pttl,
+    }
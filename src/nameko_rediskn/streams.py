@@ -0,0 +1,207 @@
+import uuid
+
+DEFAULT_MAXLEN = 1000000
+"""
+Default approximate maximum length of a bridge stream (`XADD MAXLEN ~`), so
+it does not grow unbounded when there are no consumers.
+"""
+
+DEFAULT_READ_COUNT = 100
+"""Default maximum number of entries read from a stream at once."""
+
+DEFAULT_READ_BLOCK = 1000
+"""Default time, in milliseconds, XREADGROUP waits for new entries."""
+
+DEFAULT_CLAIM_IDLE = 60000
+"""
+Default time, in milliseconds, an entry can be pending (delivered but not
+acknowledged) before another consumer reclaims it.
+"""
+
+DEFAULT_MAX_DELIVERIES = 10
+"""
+Default number of times an entry is delivered before it is given up on (moved
+to the dead-letter stream, if any, and acknowledged).
+"""
+
+DEFAULT_LEADER_TTL = 5
+"""
+Default time, in seconds, the bridge leadership lasts unless renewed. It is
+renewed every third of it.
+"""
+
+BRIDGE_KEY_TEMPLATE = 'rediskn:bridge:{stream}'
+"""Key holding the identifier of the instance bridging into a stream."""
+
+MESSAGE_FIELDS = ('pattern', 'channel', 'data')
+"""Fields of the notification messages stored in stream entries."""
+
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderElection:
+
+    """Elect a single leader between service instances using a Redis lease.
+
+    The leader holds a key with a TTL (`SET NX PX`) that it renews before it
+    expires. If the leader dies, the key expires and another instance takes
+    over.
+    """
+
+    def __init__(self, client, key, ttl=DEFAULT_LEADER_TTL, member_id=None):
+        """Initialize the election.
+
+        Args:
+            client (StrictRedis): Redis client.
+            key (str): key holding the identifier of the leader.
+            ttl (float): time, in seconds, the leadership lasts unless renewed.
+            member_id (str): unique identifier of the instance. Random by
+                default.
+        """
+        self.client = client
+        self.key = key
+        self.ttl = ttl
+        self.member_id = uuid.uuid4().hex if member_id is None else member_id
+        self.is_leader = False
+
+    def refresh(self):
+        """Acquire or renew the leadership.
+
+        Returns:
+            bool: whether this instance is the leader.
+        """
+        ttl = int(self.ttl * 1000)
+        if self.is_leader:
+            renewed = self.client.eval(_RENEW_SCRIPT, 1, self.key, self.member_id, ttl)
+            self.is_leader = bool(renewed)
+        else:
+            acquired = self.client.set(self.key, self.member_id, nx=True, px=ttl)
+            self.is_leader = bool(acquired)
+        return self.is_leader
+
+    def release(self):
+        """Give the leadership up, if held."""
+        if self.is_leader:
+            self.is_leader = False
+            self.client.eval(_RELEASE_SCRIPT, 1, self.key, self.member_id)
+
+
+def entry_fields(message):
+    """Return the XADD field-value arguments of a notification message."""
+    fields = []
+    for field in MESSAGE_FIELDS:
+        fields.extend((field, message[field]))
+    return fields
+
+
+def entry_message(entry_id, fields):
+    """Build the message delivered for a stream entry.
+
+    Args:
+        entry_id (str): id of the entry.
+        fields (dict or list): fields of the entry, as a dictionary or as a
+            flat list of fields and values (depending on the version of
+            redis-py).
+
+    Returns:
+        dict: notification message, with its entry `id`.
+    """
+    if not isinstance(fields, dict):
+        fields = {
+            fields[index]: fields[index + 1] for index in range(0, len(fields), 2)
+        }
+    fields = {_to_str(field): value for field, value in fields.items()}
+    message = {'type': 'pmessage', 'id': entry_id}
+    for field in MESSAGE_FIELDS:
+        message[field] = fields.get(field)
+    return message
+
+
+def stream_entries(reply):
+    """Find the entries in an XREADGROUP or XCLAIM reply.
+
+    Args:
+        reply (list): reply, as returned by redis-py (parsed or not).
+
+    Returns:
+        list(tuple): `(id, fields)` of the entries, leaving deleted entries
+        out.
+    """
+    if not reply:
+        return []
+    if _is_stream_reply(reply):
+        # XREADGROUP replies are grouped by stream
+        reply = [entry for _, entries in reply for entry in entries]
+    return [(entry_id, fields) for entry_id, fields in reply if fields]
+
+
+def pending_entries(reply, min_idle):
+    """Find the pending entries idle for at least `min_idle` ms.
+
+    Args:
+        reply (list): XPENDING (extended form) reply, either parsed by
+            redis-py into dictionaries or as `[id, consumer, idle, count]`
+            lists.
+        min_idle (int): minimum idle time, in milliseconds.
+
+    Returns:
+        list(tuple): `(id, deliveries)` of the idle entries, with the number
+        of times they have been delivered.
+    """
+    entries = []
+    for entry in reply or ():
+        if isinstance(entry, dict):
+            entry_id, idle = entry['message_id'], entry['time_since_delivered']
+            deliveries = entry['times_delivered']
+        else:
+            entry_id, _, idle, deliveries = entry
+        if int(idle) >= min_idle:
+            entries.append((entry_id, int(deliveries)))
+    return entries
+
+
+def idle_consumers(reply, min_idle):
+    """Find the consumers with no pending entries idle for at least `min_idle` ms.
+
+    Args:
+        reply (list): XINFO CONSUMERS reply, either parsed by redis-py into
+            dictionaries or as `[field, value, ...]` lists.
+        min_idle (int): minimum idle time, in milliseconds.
+
+    Returns:
+        list(str): names of the idle consumers.
+    """
+    names = []
+    for consumer in reply or ():
+        if not isinstance(consumer, dict):
+            consumer = {
+                _to_str(consumer[index]): consumer[index + 1]
+                for index in range(0, len(consumer), 2)
+            }
+        if int(consumer['pending']) == 0 and int(consumer['idle']) >= min_idle:
+            names.append(_to_str(consumer['name']))
+    return names
+
+
+def _is_stream_reply(reply):
+    # `[[stream, [[id, fields], ...]], ...]` rather than `[[id, fields], ...]`
+    first = reply[0]
+    return isinstance(first[1], list) and (
+        not first[1] or isinstance(first[1][0], (list, tuple))
+    )
+
+
+def _to_str(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
@@ -0,0 +1,767 @@
+import heapq
+import itertools
+import socket
+from collections import defaultdict
+from functools import lru_cache
+
+import eventlet
+from eventlet.semaphore import Semaphore
+
+from .routing import compile_glob
+
+ALL_EVENT_CLASSES = 'g$lshzxet'
+"""Event classes enabled by the `A` notification flag."""
+
+PUBSUB_COMMANDS = frozenset(
+    ('SUBSCRIBE', 'PSUBSCRIBE', 'UNSUBSCRIBE', 'PUNSUBSCRIBE', 'PING', 'QUIT')
+)
+"""Commands allowed on a connection while it is subscribed."""
+
+ROUTES_CACHE_SIZE = 65536
+"""Maximum number of channels whose subscribers are cached."""
+
+DEFAULT_DRIVE_CHUNK = 1000
+"""Default number of writes between flushes of `FakeRedisServer.drive`."""
+
+_compile_glob = lru_cache(maxsize=1024)(compile_glob)
+
+
+class VirtualClock:
+
+    """Clock that only moves when told to, in seconds."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class CommandError(Exception):
+
+    """Error replied to a command, e.g. `ERR unknown command`."""
+
+
+class FakeRedisServer:
+
+    """In-process Redis server for tests, speaking RESP over TCP.
+
+    The server runs in a greenthread of the test process, listening on a
+    local port, so entrypoints, clients and redis-py connect to it with its
+    `uri` and exchange the same bytes as with Redis. It implements pub/sub
+    (SUBSCRIBE, PSUBSCRIBE, glob matching and PUBLISH) and a simulated
+    keyspace with the keyspace and keyevent notifications of its commands,
+    following the `notify-keyspace-events` flags:
+
+        strings: SET, GET, MGET.
+        hashes: HSET, HGETALL.
+        generic: DEL, EXISTS, EXPIRE, PEXPIRE, PERSIST, TTL, PTTL, TYPE,
+        SCAN, KEYS, DBSIZE, FLUSHDB, FLUSHALL.
+        connection: PING, ECHO, SELECT, QUIT, CLIENT (ID, SETNAME, GETNAME,
+        KILL TYPE), CONFIG (GET, SET).
+
+    Time is virtual: keys only expire when `advance` moves the `clock` past
+    their deadline, and `drive` writes keys at a given rate of virtual time,
+    buffering the notifications and flushing them in chunks, so load tests
+    run as fast as the subscribers read and give the same results every time.
+
+    Example:
+
+        with FakeRedisServer(notify_keyspace_events='KEA') as server:
+            config['REDIS_URIS'] = {'MY_REDIS': server.uri()}
+            ...
+            server.drive(rate=100000, duration=1, keys=1000)
+    """
+
+    def __init__(self, notify_keyspace_events='', clock=None, host='127.0.0.1'):
+        """Initialize the server.
+
+        Args:
+            notify_keyspace_events (str): initial `notify-keyspace-events`
+                flags, none by default (as Redis).
+            clock (VirtualClock): virtual clock, starting at `0` by default.
+            host (str): address to listen on, on a free port.
+        """
+        self.clock = VirtualClock() if clock is None else clock
+        self.host = host
+        self.port = None
+        self.notify_keyspace_events = notify_keyspace_events
+        self.data = defaultdict(dict)
+        self.expires = defaultdict(dict)
+        self.connections = set()
+        self.channels = defaultdict(set)
+        self.patterns = {}
+        self.published = 0
+        self._routes = {}
+        self._pending = set()
+        self._deadlines = []
+        self._ids = itertools.count(1)
+        self._batching = 0
+        self._listener = None
+        self._thread = None
+        self._commands = {
+            name.replace('_redis_', '', 1).upper(): getattr(self, name)
+            for name in dir(self)
+            if name.startswith('_redis_')
+        }
+
+    @property
+    def notify_keyspace_events(self):
+        return self._flags
+
+    @notify_keyspace_events.setter
+    def notify_keyspace_events(self, flags):
+        self._flags = flags
+        self._classes = set(flags.replace('A', ALL_EVENT_CLASSES)) - {'K', 'E'}
+        self._keyspace = 'K' in flags
+        self._keyevent = 'E' in flags
+
+    def start(self):
+        """Start listening, on a free port."""
+        self._listener = eventlet.listen((self.host, 0))
+        self.port = self._listener.getsockname()[1]
+        self._thread = eventlet.spawn(self._accept)
+        return self
+
+    def stop(self):
+        """Stop listening and close every connection."""
+        if self._thread is not None:
+            self._thread.kill()
+            self._thread = None
+            self._listener.close()
+        for connection in list(self.connections):
+            connection.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def uri(self, db=0):
+        """Return the Redis URI of the server."""
+        return 'redis://{}:{}/{}'.format(self.host, self.port, db)
+
+    def set(self, key, value, db=0, px=None):
+        """SET a key, notifying it, optionally expiring in `px` milliseconds."""
+        self._set(db, _bytes(key), _bytes(value), px)
+        self._flush_unless_batching()
+
+    def delete(self, key, db=0):
+        """DEL a key, notifying it if it existed."""
+        self._delete(db, _bytes(key))
+        self._flush_unless_batching()
+
+    def advance(self, seconds):
+        """Move the clock forward, expiring (and notifying) the keys due."""
+        self._advance_to(self.clock.now + seconds)
+        self._flush_unless_batching()
+
+    def drive(
+        self,
+        rate,
+        duration,
+        keys=1000,
+        key_template='key:{}',
+        db=0,
+        px=None,
+        chunk=DEFAULT_DRIVE_CHUNK,
+    ):
+        """SET keys at a steady rate of virtual time.
+
+        Keys are written round-robin, every `1 / rate` seconds of virtual
+        time, expiring the keys due in between. Notifications are flushed to
+        the subscribers every `chunk` writes, yielding to let them read.
+
+        Args:
+            rate (float): writes per second of virtual time.
+            duration (float): seconds of virtual time to write for.
+            keys (int): number of distinct keys.
+            key_template (str): key name template, formatted with the index
+                of the key.
+            db (int): db written to.
+            px (int): time to live of the keys, in milliseconds.
+            chunk (int): number of writes between flushes.
+
+        Returns:
+            int: number of writes.
+        """
+        total = int(rate * duration)
+        started = self.clock.now
+        names = [_bytes(key_template.format(index)) for index in range(keys)]
+        self._batching += 1
+        try:
+            for index in range(total):
+                self._advance_to(started + index / rate)
+                self._set(db, names[index % keys], str(index).encode(), px)
+                if index % chunk == chunk - 1:
+                    self.flush()
+                    eventlet.sleep(0)
+            self._advance_to(started + duration)
+        finally:
+            self._batching -= 1
+        self._flush_unless_batching()
+        return total
+
+    def publish(self, channel, message):
+        """PUBLISH a message, returning the number of receivers."""
+        receivers = self._publish(_bytes(channel), _bytes(message))
+        self._flush_unless_batching()
+        return receivers
+
+    def notify(self, event_class, event, key, db=0):
+        """Publish the keyspace and keyevent notifications of an event.
+
+        Args:
+            event_class (str): class of the event, e.g. `$` for strings or
+                `g` for generic ones, published only when enabled in the
+                `notify-keyspace-events` flags.
+            event (str): event name, e.g. `set`.
+            key (str): key of the event.
+            db (int): db of the key.
+        """
+        self._notify(event_class, _bytes(event), _bytes(key), db)
+        self._flush_unless_batching()
+
+    def disconnect_pubsub(self):
+        """Close every subscribed connection (CLIENT KILL TYPE pubsub).
+
+        Returns:
+            int: number of connections closed.
+        """
+        subscribed = [conn for conn in self.connections if conn.subscribed]
+        for connection in subscribed:
+            connection.close()
+        return len(subscribed)
+
+    def flush(self):
+        """Send the buffered replies and messages of every connection."""
+        while self._pending:
+            self._pending.pop().flush()
+
+    def execute(self, connection, args):
+        """Execute a command received by `connection`."""
+        name = args[0].decode('ascii', 'replace').upper()
+        try:
+            reply = self._command(connection, name)(connection, *args[1:])
+        except CommandError as exc:
+            reply = exc
+        except (TypeError, ValueError, IndexError):
+            reply = CommandError(
+                "ERR wrong arguments for '{}' command".format(name.lower())
+            )
+        if reply is not _NO_REPLY:
+            connection.write(encode(reply))
+
+    def _command(self, connection, name):
+        command = self._commands.get(name)
+        if command is None:
+            raise CommandError("ERR unknown command '{}'".format(name.lower()))
+        if connection.subscribed and name not in PUBSUB_COMMANDS:
+            raise CommandError(
+                'ERR only (P)SUBSCRIBE / (P)UNSUBSCRIBE / PING / QUIT '
+                'allowed in this context'
+            )
+        return command
+
+    def _accept(self):
+        while True:
+            sock, _ = self._listener.accept()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = _Connection(self, sock, next(self._ids))
+            self.connections.add(connection)
+            connection.thread = eventlet.spawn(connection.run)
+
+    def _disconnected(self, connection):
+        self.connections.discard(connection)
+        self._pending.discard(connection)
+        for channel in connection.channels:
+            self._unsubscribe(self.channels, channel, connection)
+        for pattern in connection.patterns:
+            self._unsubscribe(self.patterns, pattern, connection)
+
+    def _flush_unless_batching(self):
+        if not self._batching:
+            self.flush()
+
+    # Keyspace
+
+    def _lookup(self, db, key):
+        deadline = self.expires[db].get(key)
+        if deadline is not None and deadline <= self.clock.now:
+            self._expire(db, key)
+        return self.data[db].get(key)
+
+    def _set(self, db, key, value, px=None):
+        self.data[db][key] = value
+        self.expires[db].pop(key, None)
+        self._notify('$', b'set', key, db)
+        if px is not None:
+            self._set_deadline(db, key, px)
+            self._notify('g', b'expire', key, db)
+
+    def _delete(self, db, key):
+        if self._lookup(db, key) is None:
+            return False
+        del self.data[db][key]
+        self.expires[db].pop(key, None)
+        self._notify('g', b'del', key, db)
+        return True
+
+    def _set_deadline(self, db, key, milliseconds):
+        deadline = self.clock.now + milliseconds / 1000
+        self.expires[db][key] = deadline
+        heapq.heappush(self._deadlines, (deadline, db, key))
+
+    def _expire(self, db, key):
+        del self.data[db][key]
+        del self.expires[db][key]
+        self._notify('x', b'expired', key, db)
+
+    def _advance_to(self, now):
+        self.clock.now = now
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= now:
+            deadline, db, key = heapq.heappop(deadlines)
+            if self.expires[db].get(key) == deadline:
+                self._expire(db, key)
+
+    def _notify(self, event_class, event, key, db):
+        if event_class not in self._classes:
+            return
+        if self._keyspace:
+            self._publish(b'__keyspace@%d__:%s' % (db, key), event)
+        if self._keyevent:
+            self._publish(b'__keyevent@%d__:%s' % (db, event), key)
+
+    # Pub/sub
+
+    def _publish(self, channel, message):
+        self.published += 1
+        routes = self._routes.get(channel)
+        if routes is None:
+            routes = self._route(channel)
+        if not routes:
+            return 0
+
+        payload = b'$%d\r\n%s\r\n$%d\r\n%s\r\n' % (
+            len(channel),
+            channel,
+            len(message),
+            message,
+        )
+        receivers = 0
+        for prefix, subscribers in routes:
+            data = prefix + payload
+            for connection in subscribers:
+                connection.write(data)
+            receivers += len(subscribers)
+        return receivers
+
+    def _route(self, channel):
+        # Reply prefixes and subscribers of a channel, cached until the
+        # subscriptions change: matching every pattern is the slow part
+        routes = []
+        subscribers = self.channels.get(channel)
+        if subscribers:
+            routes.append((_MESSAGE_PREFIX, subscribers))
+        text = channel.decode('utf-8', 'surrogateescape')
+        for pattern, (regex, subscribers) in self.patterns.items():
+            if regex.fullmatch(text) is not None:
+                routes.append((_PMESSAGE_PREFIX + encode(pattern), subscribers))
+
+        if len(self._routes) >= ROUTES_CACHE_SIZE:
+            self._routes.clear()
+        self._routes[channel] = routes
+        return routes
+
+    def _subscribe(self, connection, kind, subscriptions, names):
+        self._routes.clear()
+        for name in names:
+            if kind == b'psubscribe':
+                if name not in self.patterns:
+                    regex = _compile_glob(name.decode('utf-8', 'surrogateescape'))
+                    self.patterns[name] = (regex, set())
+                self.patterns[name][1].add(connection)
+            else:
+                self.channels[name].add(connection)
+            subscriptions.add(name)
+            connection.write(encode([kind, name, connection.subscriptions]))
+        return _NO_REPLY
+
+    def _unsubscribe(self, index, name, connection):
+        self._routes.clear()
+        subscribers = index.get(name)
+        if subscribers is None:
+            return
+        if index is self.patterns:
+            subscribers = subscribers[1]
+        subscribers.discard(connection)
+        if not subscribers:
+            del index[name]
+
+    def _unsubscribe_all(self, connection, kind, subscriptions, index, names):
+        if not names:
+            names = sorted(subscriptions)
+            if not names:
+                connection.write(encode([kind, None, 0]))
+        for name in names:
+            subscriptions.discard(name)
+            self._unsubscribe(index, name, connection)
+            connection.write(encode([kind, name, connection.subscriptions]))
+        return _NO_REPLY
+
+    # Commands
+
+    def _redis_ping(self, connection, message=None):
+        if connection.subscribed:
+            return [b'pong', message or b'']
+        return _Status('PONG') if message is None else message
+
+    def _redis_echo(self, connection, message):
+        return message
+
+    def _redis_quit(self, connection):
+        connection.write(encode(_Status('OK')))
+        connection.closing = True
+        return _NO_REPLY
+
+    def _redis_select(self, connection, db):
+        connection.db = int(db)
+        return _Status('OK')
+
+    def _redis_client(self, connection, subcommand, *args):
+        subcommand = subcommand.upper()
+        if subcommand == b'ID':
+            return connection.id
+        if subcommand == b'SETNAME':
+            connection.name = args[0]
+            return _Status('OK')
+        if subcommand == b'GETNAME':
+            return connection.name
+        if subcommand == b'KILL' and args[0].upper() == b'TYPE':
+            if args[1].lower() != b'pubsub':
+                raise CommandError('ERR only pubsub clients can be killed')
+            return self.disconnect_pubsub()
+        raise CommandError('ERR unsupported CLIENT subcommand')
+
+    def _redis_config(self, connection, subcommand, name, *args):
+        subcommand = subcommand.upper()
+        setting = name.lower() == b'notify-keyspace-events'
+        if subcommand == b'GET':
+            return [name, self._flags.encode()] if setting else []
+        if subcommand == b'SET' and setting:
+            self.notify_keyspace_events = args[0].decode('ascii')
+            return _Status('OK')
+        raise CommandError('ERR unsupported CONFIG parameter')
+
+    def _redis_subscribe(self, connection, *channels):
+        return self._subscribe(connection, b'subscribe', connection.channels, channels)
+
+    def _redis_psubscribe(self, connection, *patterns):
+        return self._subscribe(connection, b'psubscribe', connection.patterns, patterns)
+
+    def _redis_unsubscribe(self, connection, *channels):
+        return self._unsubscribe_all(
+            connection, b'unsubscribe', connection.channels, self.channels, channels
+        )
+
+    def _redis_punsubscribe(self, connection, *patterns):
+        return self._unsubscribe_all(
+            connection, b'punsubscribe', connection.patterns, self.patterns, patterns
+        )
+
+    def _redis_publish(self, connection, channel, message):
+        return self._publish(channel, message)
+
+    def _redis_set(self, connection, key, value, *options):
+        options = [option.upper() for option in options]
+        exists = self._lookup(connection.db, key) is not None
+        if (b'NX' in options and exists) or (b'XX' in options and not exists):
+            return None
+        px = None
+        if b'EX' in options:
+            px = int(options[options.index(b'EX') + 1]) * 1000
+        elif b'PX' in options:
+            px = int(options[options.index(b'PX') + 1])
+        self._set(connection.db, key, value, px)
+        return _Status('OK')
+
+    def _redis_get(self, connection, key):
+        value = self._lookup(connection.db, key)
+        if value is not None and not isinstance(value, bytes):
+            raise CommandError(_WRONGTYPE)
+        return value
+
+    def _redis_mget(self, connection, *keys):
+        values = (self._lookup(connection.db, key) for key in keys)
+        return [value if isinstance(value, bytes) else None for value in values]
+
+    def _redis_hset(self, connection, key, *pairs):
+        if not pairs or len(pairs) % 2:
+            raise CommandError("ERR wrong number of arguments for 'hset' command")
+        value = self._lookup(connection.db, key)
+        if value is None:
+            value = self.data[connection.db][key] = {}
+        elif not isinstance(value, dict):
+            raise CommandError(_WRONGTYPE)
+        added = 0
+        for index in range(0, len(pairs), 2):
+            added += pairs[index] not in value
+            value[pairs[index]] = pairs[index + 1]
+        self._notify('h', b'hset', key, connection.db)
+        return added
+
+    def _redis_hgetall(self, connection, key):
+        value = self._lookup(connection.db, key) or {}
+        if not isinstance(value, dict):
+            raise CommandError(_WRONGTYPE)
+        return list(itertools.chain.from_iterable(value.items()))
+
+    def _redis_del(self, connection, *keys):
+        return sum(self._delete(connection.db, key) for key in keys)
+
+    def _redis_exists(self, connection, *keys):
+        return sum(self._lookup(connection.db, key) is not None for key in keys)
+
+    def _redis_expire(self, connection, key, seconds):
+        return self._redis_pexpire(connection, key, int(seconds) * 1000)
+
+    def _redis_pexpire(self, connection, key, milliseconds):
+        if self._lookup(connection.db, key) is None:
+            return 0
+        self._set_deadline(connection.db, key, int(milliseconds))
+        self._notify('g', b'expire', key, connection.db)
+        return 1
+
+    def _redis_persist(self, connection, key):
+        if self._lookup(connection.db, key) is None:
+            return 0
+        if self.expires[connection.db].pop(key, None) is None:
+            return 0
+        self._notify('g', b'persist', key, connection.db)
+        return 1
+
+    def _redis_pttl(self, connection, key):
+        if self._lookup(connection.db, key) is None:
+            return -2
+        deadline = self.expires[connection.db].get(key)
+        if deadline is None:
+            return -1
+        return int(round((deadline - self.clock.now) * 1000))
+
+    def _redis_ttl(self, connection, key):
+        pttl = self._redis_pttl(connection, key)
+        return pttl if pttl < 0 else int(round(pttl / 1000))
+
+    def _redis_type(self, connection, key):
+        value = self._lookup(connection.db, key)
+        if value is None:
+            return _Status('none')
+        return _Status('hash' if isinstance(value, dict) else 'string')
+
+    def _redis_keys(self, connection, pattern):
+        return self._matching_keys(connection.db, pattern)
+
+    def _redis_scan(self, connection, cursor, *options):
+        options = list(options)
+        upper = [option.upper() for option in options]
+        pattern = options[upper.index(b'MATCH') + 1] if b'MATCH' in upper else b'*'
+        count = int(options[upper.index(b'COUNT') + 1]) if b'COUNT' in upper else 10
+        keys = self._matching_keys(connection.db, b'*')
+        start = int(cursor)
+        end = start + count
+        regex = _compile_glob(pattern.decode('utf-8', 'surrogateescape'))
+        found = [
+            key
+            for key in keys[start:end]
+            if regex.fullmatch(key.decode('utf-8', 'surrogateescape')) is not None
+        ]
+        return [str(end if end < len(keys) else 0).encode(), found]
+
+    def _redis_dbsize(self, connection):
+        return len(self._matching_keys(connection.db, b'*'))
+
+    def _redis_flushdb(self, connection):
+        self.data[connection.db].clear()
+        self.expires[connection.db].clear()
+        return _Status('OK')
+
+    def _redis_flushall(self, connection):
+        self.data.clear()
+        self.expires.clear()
+        self._deadlines = []
+        return _Status('OK')
+
+    def _matching_keys(self, db, pattern):
+        regex = _compile_glob(pattern.decode('utf-8', 'surrogateescape'))
+        return sorted(
+            key
+            for key in list(self.data[db])
+            if self._lookup(db, key) is not None
+            and regex.fullmatch(key.decode('utf-8', 'surrogateescape')) is not None
+        )
+
+
+class _Connection:
+
+    """Client connection of a `FakeRedisServer`."""
+
+    def __init__(self, server, sock, connection_id):
+        self.server = server
+        self.sock = sock
+        self.id = connection_id
+        self.db = 0
+        self.name = None
+        self.channels = set()
+        self.patterns = set()
+        self.closing = False
+        self.closed = False
+        self.thread = None
+        self._output = []
+        self._sending = Semaphore()
+
+    @property
+    def subscribed(self):
+        return bool(self.channels or self.patterns)
+
+    @property
+    def subscriptions(self):
+        return len(self.channels) + len(self.patterns)
+
+    def run(self):
+        buffer = b''
+        try:
+            while not self.closing:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                commands, buffer = parse_commands(buffer + data)
+                for args in filter(None, commands):
+                    self.server.execute(self, args)
+                self.server.flush()
+        except (OSError, EOFError):
+            # EOFError: closed by the server while reading
+            pass
+        finally:
+            self.close()
+
+    def write(self, data):
+        if not self._output:
+            self.server._pending.add(self)
+        self._output.append(data)
+
+    def flush(self):
+        if not self._output:
+            return
+        # The reader and the publisher flush from different greenthreads
+        with self._sending:
+            data = b''.join(self._output)
+            self._output = []
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self.close()
+
+    def close(self):
+        # Closing twice would close a file descriptor reused by another socket
+        if self.closed:
+            return
+        self.closed = True
+        self.server._disconnected(self)
+        self._output = []
+        if self.thread is not None and self.thread is not eventlet.getcurrent():
+            # Stops reading before the file descriptor can be reused
+            self.thread.kill()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class _Status(str):
+
+    """Simple string reply, e.g. `+OK`."""
+
+
+_NO_REPLY = object()
+
+_MESSAGE_PREFIX = b'*3\r\n$7\r\nmessage\r\n'
+
+_PMESSAGE_PREFIX = b'*4\r\n$8\r\npmessage\r\n'
+
+_WRONGTYPE = 'WRONGTYPE Operation against a key holding the wrong kind of value'
+
+
+def encode(reply):
+    """Encode a reply in RESP.
+
+    Args:
+        reply: `None` (null bulk), `int`, `bytes` or `str` (bulk strings), a
+            list (array) of them, a status or a `CommandError` (error).
+
+    Returns:
+        bytes: encoded reply.
+    """
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, _Status):
+        return b'+%s\r\n' % reply.encode()
+    if isinstance(reply, CommandError):
+        return b'-%s\r\n' % str(reply).encode()
+    if isinstance(reply, bool) or isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, str):
+        reply = reply.encode('utf-8', 'surrogateescape')
+    if isinstance(reply, bytes):
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+    return b'*%d\r\n' % len(reply) + b''.join(encode(item) for item in reply)
+
+
+def parse_commands(buffer):
+    """Parse the complete RESP commands at the start of `buffer`.
+
+    Returns:
+        tuple: list of commands (lists of `bytes` arguments) and the rest of
+        the buffer, holding an incomplete command (if any).
+    """
+    commands = []
+    position = 0
+    while position < len(buffer):
+        command, end = _parse_command(buffer, position)
+        if command is None:
+            break
+        commands.append(command)
+        position = end
+    return commands, buffer[position:]
+
+
+def _parse_command(buffer, start):
+    end = buffer.find(b'\r\n', start)
+    if end < 0:
+        return None, start
+    line = buffer[start:end]
+    if not line.startswith(b'*'):
+        # Inline command
+        return line.split(), end + 2
+
+    args = []
+    position = end + 2
+    for _ in range(int(line[1:])):
+        end = buffer.find(b'\r\n', position)
+        if end < 0:
+            return None, start
+        first = end + 2
+        last = first + int(buffer[position:end][1:])
+        if len(buffer) < last + 2:
+            return None, start
+        args.append(buffer[first:last])
+        position = last + 2
+    return args, position
+
+
+def _bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8', 'surrogateescape')
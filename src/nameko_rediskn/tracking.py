@@ -0,0 +1,135 @@
+from functools import lru_cache
+
+from .routing import compile_glob, unescape
+
+INVALIDATE_CHANNEL = '__redis__:invalidate'
+"""Channel invalidation messages are published to (RESP2 redirection)."""
+
+INVALIDATE_EVENT = 'invalidate'
+"""Event of the notifications built from invalidation messages."""
+
+ALL_KEYS = '*'
+"""
+Key of the notification built when every key is invalidated at once (e.g. on
+FLUSHALL, or when the server evicts its tracking table).
+"""
+
+_DB = '*'
+
+_compile_glob = lru_cache(maxsize=256)(compile_glob)
+
+
+def key_prefixes(keys):
+    """Find the prefixes to track the keys matching glob-style patterns.
+
+    Broadcasting mode only supports prefixes, which must not overlap, so every
+    pattern is reduced to the literal characters before its first special one
+    and the prefixes extending a shorter one are left out.
+
+    Args:
+        keys (list(str)): Redis glob-style key patterns.
+
+    Returns:
+        list(str): sorted prefixes. `['']` stands for every key.
+    """
+    candidates = set()
+    for pattern in keys:
+        chars = []
+        for char, special in unescape(pattern):
+            if special:
+                break
+            chars.append(char)
+        candidates.add(''.join(chars))
+
+    prefixes = []
+    # Sorting puts every prefix right before the ones extending it
+    for candidate in sorted(candidates):
+        if not any(candidate.startswith(prefix) for prefix in prefixes):
+            prefixes.append(candidate)
+    return prefixes
+
+
+def tracking_command(client_id, prefixes):
+    """Build the CLIENT TRACKING command redirecting to a connection.
+
+    Args:
+        client_id (int): id of the connection receiving the invalidations.
+        prefixes (list(str)): prefixes of the keys to track, as returned by
+            `key_prefixes`.
+
+    Returns:
+        list: command arguments.
+    """
+    command = ['CLIENT', 'TRACKING', 'ON', 'REDIRECT', client_id, 'BCAST']
+    for prefix in prefixes:
+        if prefix:
+            command.extend(('PREFIX', prefix))
+    return command
+
+
+def enable_tracking(connection, prefixes):
+    """Track keys in broadcasting mode, redirecting to `connection` itself.
+
+    Once `connection` subscribes to `INVALIDATE_CHANNEL`, Redis publishes the
+    keys modified to it, without keyspace notifications being enabled.
+
+    Args:
+        connection (Connection): connection about to subscribe.
+        prefixes (list(str)): prefixes of the keys to track.
+
+    Returns:
+        int: id of the connection.
+    """
+    connection.send_command('CLIENT', 'ID')
+    client_id = int(connection.read_response())
+    connection.send_command(*tracking_command(client_id, prefixes))
+    connection.read_response()
+    return client_id
+
+
+def invalidation_messages(message, keys):
+    """Build the notifications of an invalidation message.
+
+    Every invalidated key matching one of the `keys` patterns gets a
+    key-space `pmessage` notification with the `invalidate` event. Tracking
+    is not per db, so the db of the notifications is `*`. When every key is
+    invalidated at once, a single notification is built with `*` as the key.
+
+    Args:
+        message (dict): `message` received on `INVALIDATE_CHANNEL`, whose
+            data is the list of invalidated keys (or `None`).
+        keys (list(str)): Redis glob-style key patterns.
+
+    Returns:
+        list(dict): notification messages, with `bytes` fields if the keys
+        are `bytes`.
+    """
+    raw = isinstance(message['channel'], bytes)
+    invalidated = message['data']
+    if invalidated is None:
+        pattern = _keyspace(ALL_KEYS)
+        return [_message(pattern, pattern, raw)]
+
+    regexes = [(key, _compile_glob(key)) for key in keys]
+    messages = []
+    for key in invalidated:
+        text = key.decode('utf-8', 'surrogateescape') if raw else key
+        for pattern, regex in regexes:
+            if regex.fullmatch(text) is not None:
+                messages.append(_message(_keyspace(pattern), _keyspace(text), raw))
+                break
+    return messages
+
+
+def _keyspace(key):
+    return '__keyspace@{}__:{}'.format(_DB, key)
+
+
+def _message(pattern, channel, raw):
+    event = INVALIDATE_EVENT
+    if raw:
+        pattern, channel, event = (
+            value.encode('utf-8', 'surrogateescape')
+            for value in (pattern, channel, event)
+        )
+    return {'type': 'pmessage', 'pattern': pattern, 'channel': channel, 'data': event}
@@ -80,6 +80,8 @@ def log_mock():
 @pytest.fixture
 def mock_strict_redis():
     with patch('nameko_rediskn.rediskn.StrictRedis') as m:
+        # Mocked pub/subs have no socket to drain, their `listen` is read
+        m.from_url.return_value.pubsub.return_value.connection._sock = None
         yield m
 
 
@@ -98,6 +100,7 @@ def mock_container(mock_container, config):
     mock_container.spawn_managed_thread = eventlet.spawn
     mock_container.config = config
     mock_container.service_name = 'MockService'
+    mock_container.shared_extensions = {}
     return mock_container
 
 
@@ -0,0 +1,149 @@
+from unittest.mock import Mock, call
+
+import pytest
+from eventlet import sleep
+
+from nameko_rediskn.batching import Batcher, group_by_db, group_by_key_prefix
+from tests import TIME_SLEEP
+
+
+def keyspace_message(key, event='set', db=0):
+    return {
+        'type': 'pmessage',
+        'pattern': '__keyspace@*__:*',
+        'channel': '__keyspace@{}__:{}'.format(db, key),
+        'data': event,
+    }
+
+
+def keyevent_message(key, event='set', db=0):
+    return {
+        'type': 'pmessage',
+        'pattern': '__keyevent@*__:*',
+        'channel': '__keyevent@{}__:{}'.format(db, event),
+        'data': key,
+    }
+
+
+@pytest.fixture
+def flush():
+    return Mock()
+
+
+class TestBatchKeys:
+    @pytest.mark.parametrize(
+        'message, expected',
+        [
+            (keyspace_message('foo', db=0), '0'),
+            (keyspace_message('a:b', db=12), '12'),
+            (keyevent_message('foo', db=3), '3'),
+        ],
+    )
+    def test_group_by_db(self, message, expected):
+        assert group_by_db(message) == expected
+
+    @pytest.mark.parametrize(
+        'message, separator, expected',
+        [
+            (keyspace_message('user:1:name'), ':', 'user'),
+            (keyevent_message('user:1:name'), ':', 'user'),
+            (keyspace_message('foo/bar'), '/', 'foo'),
+            (keyspace_message('foo'), ':', 'foo'),
+            (
+                {
+                    'type': 'pmessage',
+                    'pattern': b'__keyevent@*__:*',
+                    'channel': b'__keyevent@0__:set',
+                    'data': b'user:\xff',
+                },
+                ':',
+                b'user',
+            ),
+            (
+                {
+                    'type': 'psubscribe',
+                    'pattern': None,
+                    'channel': '__keyevent@*__:*',
+                    'data': 1,
+                },
+                ':',
+                None,
+            ),
+        ],
+    )
+    def test_group_by_key_prefix(self, message, separator, expected):
+        assert group_by_key_prefix(separator)(message) == expected
+
+
+class TestBatcher:
+    def test_flushes_full_batches(self, flush):
+        batcher = Batcher(flush, batch_size=2, max_latency=10)
+        messages = [keyspace_message(str(index)) for index in range(5)]
+
+        for message in messages:
+            batcher.add(message)
+
+        assert flush.call_args_list == [call(messages[0:2]), call(messages[2:4])]
+        assert len(batcher) == 1
+
+    def test_flushes_partial_batches_after_max_latency(self, flush):
+        batcher = Batcher(flush, batch_size=10, max_latency=TIME_SLEEP / 2)
+        messages = [keyspace_message('foo'), keyspace_message('bar')]
+
+        for message in messages:
+            batcher.add(message)
+        assert flush.call_args_list == []
+
+        sleep(TIME_SLEEP)
+
+        assert flush.call_args_list == [call(messages)]
+        assert len(batcher) == 0
+
+    def test_groups_messages_by_key(self, flush):
+        batcher = Batcher(flush, batch_size=2, max_latency=10, key=group_by_db)
+        db_0 = [keyspace_message('foo', db=0), keyspace_message('bar', db=0)]
+        db_1 = [keyspace_message('foo', db=1), keyspace_message('bar', db=1)]
+
+        for message in (db_0[0], db_1[0], db_0[1], db_1[1]):
+            batcher.add(message)
+
+        assert flush.call_args_list == [call(db_0), call(db_1)]
+
+    def test_flush(self, flush):
+        batcher = Batcher(flush, batch_size=10, max_latency=TIME_SLEEP / 2)
+        message = keyspace_message('foo')
+        batcher.add(message)
+
+        batcher.flush()
+        sleep(TIME_SLEEP)
+
+        assert flush.call_args_list == [call([message])]
+
+    def test_cancel(self, flush):
+        batcher = Batcher(flush, batch_size=10, max_latency=TIME_SLEEP / 2)
+        batcher.add(keyspace_message('foo'))
+
+        batcher.cancel()
+        sleep(TIME_SLEEP)
+
+        assert flush.call_args_list == []
+        assert len(batcher) == 0
+
+    def test_adaptive_batch_size(self, flush):
+        batcher = Batcher(
+            flush, batch_size=4, max_latency=TIME_SLEEP / 2, adaptive=True
+        )
+        assert batcher.current_size == 1
+
+        for index in range(7):
+            batcher.add(keyspace_message(str(index)))
+
+        # Batches of 1, 2 and 4 messages
+        assert [len(args[0]) for args, _ in flush.call_args_list] == [1, 2, 4]
+        assert batcher.current_size == 4
+
+        batcher.add(keyspace_message('foo'))
+        sleep(TIME_SLEEP)
+
+        assert len(flush.call_args_list[-1][0][0]) == 1
+        assert batcher.current_size == 2
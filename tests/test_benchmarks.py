@@ -0,0 +1,218 @@
+import json
+from unittest.mock import Mock, call
+
+import pytest
+
+from benchmarks import cli
+from benchmarks.load import generate, key_name, key_patterns, run_load
+from benchmarks.results import (
+    analyse,
+    analyse_replay,
+    compare,
+    match_latencies,
+    percentile,
+)
+from benchmarks.runner import Recorder
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def client():
+    return Mock()
+
+
+class TestLoad:
+    def test_key_name(self):
+        assert [key_name(index, 4, 2) for index in range(5)] == [
+            'bench:0:0',
+            'bench:1:1',
+            'bench:0:2',
+            'bench:1:3',
+            'bench:0:0',
+        ]
+        assert key_patterns(2) == ['bench:0:*', 'bench:1:*']
+
+    def test_generate(self, client, clock):
+        batches = generate(client, 1000, 0.05, 10, 2, clock=clock, sleep=clock.sleep)
+
+        assert sum(count for _, _, count in batches) == 50
+        # Contiguous writes, a pipeline per tick
+        assert [first for _, first, _ in batches] == [
+            sum(count for _, _, count in batches[:index])
+            for index in range(len(batches))
+        ]
+        assert len(batches) == client.pipeline.call_count > 1
+        pipeline = client.pipeline.return_value
+        assert pipeline.set.call_args_list[:2] == [
+            call('bench:0:0', 0),
+            call('bench:1:1', 1),
+        ]
+
+    def test_run_load_with_kill(self, client, clock):
+        load = run_load(
+            client,
+            100,
+            0.1,
+            10,
+            2,
+            kill=True,
+            drain=1,
+            recovery_window=0.1,
+            clock=clock,
+            sleep=clock.sleep,
+        )
+
+        client.execute_command.assert_called_once_with(
+            'CLIENT', 'KILL', 'TYPE', 'pubsub'
+        )
+        assert load['killed_at'] > load['throughput'][-1][0]
+        assert load['recovery'][0][1] == 10
+
+
+class TestResults:
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([], 50) is None
+
+    def test_match_latencies(self):
+        batches = [[10.0, 0, 2], [11.0, 2, 2]]
+        notifications = [
+            (10.5, '__keyspace@0__:bench:0:0'),
+            (10.25, b'__keyspace@0__:bench:1:1'),
+            (11.75, '__keyspace@0__:bench:0:0'),
+            (12.0, '__keyspace@0__:foo'),
+        ]
+
+        assert match_latencies(batches, notifications, 2, 2) == [0.25, 0.5, 0.75]
+
+    def test_analyse(self):
+        recorder = Recorder()
+        recorder.notifications = [
+            (10.5, '__keyspace@0__:bench:0:0'),
+            (11.0, '__keyspace@0__:bench:1:1'),
+            (15.5, '__keyspace@0__:bench:0:0'),
+        ]
+        load = {
+            'throughput': [[10.0, 0, 3]],
+            'recovery': [[14.0, 3, 1]],
+            'killed_at': 13.0,
+        }
+
+        results = analyse(load, recorder, 3, 2, 1024)
+
+        assert results == {
+            'writes': 3,
+            'notifications': 2,
+            'lost': 1,
+            'notifications_per_second': 2.0,
+            'latency': {'p50': 0.5, 'p90': 1.0, 'p99': 1.0, 'max': 1.0},
+            'memory_growth_bytes': 1024,
+            'recovery_seconds': 2.5,
+        }
+
+    def test_analyse_replay(self):
+        recorder = Recorder()
+        recorder.notifications = [
+            (10.5, '__keyspace@0__:foo'),
+            (11.0, '__keyspace@0__:bar'),
+            (12.0, '__keyspace@0__:foo'),
+        ]
+        fed = [
+            (10.0, '__keyspace@0__:foo'),
+            (10.0, '__keyspace@0__:bar'),
+            (11.0, '__keyspace@0__:foo'),
+            (11.0, '__keyspace@0__:baz'),
+        ]
+
+        assert analyse_replay(fed, recorder) == {
+            'replayed': 4,
+            'notifications': 3,
+            'lost': 1,
+            'notifications_per_second': 1.5,
+            'latency': {'p50': 1.0, 'p90': 1.0, 'p99': 1.0, 'max': 1.0},
+        }
+
+    def test_compare(self):
+        baseline = {
+            'results': {
+                'notifications_per_second': 1000,
+                'latency': {'p50': 0.01, 'p99': 0.1},
+                'memory_growth_bytes': 0,
+                'recovery_seconds': None,
+            }
+        }
+        current = {
+            'results': {
+                'notifications_per_second': 850,
+                'latency': {'p50': 0.0105, 'p99': 0.05},
+                'memory_growth_bytes': 4096,
+                'recovery_seconds': 1,
+            }
+        }
+
+        assert compare(baseline, current) == [
+            ('notifications_per_second', 1000, 850, -0.15, True),
+            ('latency.p50', 0.01, 0.0105, pytest.approx(0.05), False),
+            ('latency.p99', 0.1, 0.05, -0.5, False),
+            ('memory_growth_bytes', 0, 4096, None, True),
+        ]
+
+
+class TestRecorder:
+    def test_record(self):
+        recorder = Recorder(clock=lambda: 10.0)
+        recorder.record({'type': 'psubscribe', 'channel': 'bench:0:*'})
+        recorder.record(
+            [
+                {'type': 'pmessage', 'channel': '__keyspace@0__:bench:0:0'},
+                {'type': 'pmessage', 'channel': '__keyspace@0__:bench:0:2'},
+            ]
+        )
+
+        assert recorder.subscriptions == [10.0]
+        assert recorder.notifications == [
+            (10.0, '__keyspace@0__:bench:0:0'),
+            (10.0, '__keyspace@0__:bench:0:2'),
+        ]
+
+
+class TestCli:
+    @pytest.mark.parametrize(
+        'option, expected',
+        [
+            ('parse_messages=True', ('parse_messages', True)),
+            ('batch_size=10', ('batch_size', 10)),
+            ('shard_by=db', ('shard_by', 'db')),
+        ],
+    )
+    def test_option(self, option, expected):
+        assert cli._option(option) == expected
+
+    def test_compare(self, tmpdir, capsys):
+        baseline = tmpdir.join('baseline.json')
+        current = tmpdir.join('current.json')
+        baseline.write(json.dumps({'results': {'notifications_per_second': 100}}))
+        current.write(json.dumps({'results': {'notifications_per_second': 50}}))
+
+        assert cli.main(['compare', str(baseline), str(current)]) == 1
+        assert 'REGRESSION' in capsys.readouterr().out
+
+        assert cli.main(['compare', str(baseline), str(baseline)]) == 0
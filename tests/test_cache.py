@@ -0,0 +1,311 @@
+from unittest.mock import Mock, call, patch
+
+import eventlet
+import pytest
+from eventlet import sleep
+from redis import ConnectionError
+
+from nameko_rediskn import rediskn
+from nameko_rediskn.cache import (
+    MISSING,
+    CachedRedis,
+    InvalidationListener,
+    NearCache,
+    RedisKNCache,
+)
+from tests import TIME_SLEEP, TIMEOUT, URI_CONFIG_KEY
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cache():
+    cache = NearCache(max_size=2)
+    cache.enable()
+    return cache
+
+
+def listen(*effects):
+    for effect in effects:
+        yield effect() if callable(effect) else effect
+
+
+def fill(cache, command, key, value):
+    token = cache.reserve(command, key)
+    return cache.put(command, key, value, token)
+
+
+class TestNearCache:
+    def test_get(self, cache):
+        assert cache.get('GET', 'a') is MISSING
+        assert fill(cache, 'GET', 'a', '1')
+        assert cache.get('GET', 'a') == '1'
+        assert cache.get('HGETALL', 'a') is MISSING
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_evicts_least_recently_used(self, cache):
+        fill(cache, 'GET', 'a', '1')
+        fill(cache, 'GET', 'b', '2')
+        cache.get('GET', 'a')
+        fill(cache, 'GET', 'c', '3')
+
+        assert cache.get('GET', 'b') is MISSING
+        assert cache.get('GET', 'a') == '1'
+        assert len(cache) == 2
+        assert cache.evicted == 1
+
+    def test_ttl(self):
+        clock = Clock()
+        cache = NearCache(ttl=10, clock=clock)
+        cache.enable()
+        fill(cache, 'GET', 'a', '1')
+
+        clock.now += 9
+        assert cache.get('GET', 'a') == '1'
+        clock.now += 1
+        assert cache.get('GET', 'a') is MISSING
+        assert len(cache) == 0
+
+    def test_invalidate(self, cache):
+        fill(cache, 'GET', 'a', '1')
+        fill(cache, 'HGETALL', 'a', {'b': '2'})
+
+        cache.invalidate('a')
+
+        assert len(cache) == 0
+
+    def test_str_and_bytes_keys(self, cache):
+        fill(cache, 'GET', 'a', '1')
+
+        assert cache.get('GET', b'a') == '1'
+
+        cache.invalidate(b'a')
+
+        assert cache.get('GET', 'a') is MISSING
+
+    def test_does_not_cache_values_invalidated_while_read(self, cache):
+        token = cache.reserve('GET', 'a')
+        cache.invalidate('a')
+
+        assert not cache.put('GET', 'a', 'stale', token)
+        assert cache.get('GET', 'a') is MISSING
+
+    def test_does_not_cache_while_disabled(self, cache):
+        fill(cache, 'GET', 'a', '1')
+        cache.disable()
+
+        assert len(cache) == 0
+        assert not fill(cache, 'GET', 'a', '1')
+
+
+class TestCachedRedis:
+    @pytest.fixture
+    def client(self):
+        client = Mock()
+        client.get.side_effect = lambda key: 'value of {}'.format(key)
+        client.hgetall.return_value = {'name': 'foo'}
+        return client
+
+    @pytest.fixture
+    def redis(self, client, cache):
+        return CachedRedis(client, cache, lambda key: key.startswith('user:'))
+
+    def test_reads_through_cache(self, redis, client):
+        assert redis.get('user:1') == 'value of user:1'
+        assert redis.get('user:1') == 'value of user:1'
+        assert redis.hgetall('user:1') == {'name': 'foo'}
+        assert redis.hgetall('user:1') == {'name': 'foo'}
+
+        assert client.get.call_args_list == [call('user:1')]
+        assert client.hgetall.call_args_list == [call('user:1')]
+
+    def test_does_not_cache_other_keys(self, redis, client, cache):
+        redis.get('order:1')
+        redis.get('order:1')
+
+        assert client.get.call_count == 2
+        assert len(cache) == 0
+
+    def test_invalidate(self, redis, client):
+        redis.get('user:1')
+        redis.invalidate('user:1')
+        redis.get('user:1')
+
+        assert client.get.call_count == 2
+
+    def test_read_error(self, redis, client, cache):
+        client.get.side_effect = ConnectionError('Boom!')
+
+        with pytest.raises(ConnectionError):
+            redis.get('user:1')
+
+        assert cache._reservations == {}
+
+
+class TestInvalidationListener:
+    @pytest.fixture
+    def listener(self, mock_container, cache):
+        listener = InvalidationListener(
+            cache, URI_CONFIG_KEY, keys='user:*', dbs=[0]
+        ).bind(mock_container, 'redis')
+        listener.setup()
+        return listener
+
+    def test_invalidates_keys(self, listener, cache):
+        fill(cache, 'GET', 'user:1', '1')
+        fill(cache, 'GET', 'user:2', '2')
+
+        listener.handle_message(
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@0__:user:*',
+                'channel': '__keyspace@0__:user:1',
+                'data': 'set',
+            }
+        )
+
+        assert cache.get('GET', 'user:1') is MISSING
+        assert cache.get('GET', 'user:2') == '2'
+
+    def test_raw_responses(self, mock_container, cache):
+        listener = InvalidationListener(
+            cache, URI_CONFIG_KEY, keys='user:*', dbs=[0], decode_responses=False
+        ).bind(mock_container, 'redis')
+        listener.setup()
+        client = Mock()
+        client.get.return_value = b'1'
+        redis = CachedRedis(client, cache, lambda key: True)
+        redis.get('user:1')
+
+        listener.handle_message(
+            {
+                'type': 'pmessage',
+                'pattern': b'__keyspace@0__:user:*',
+                'channel': b'__keyspace@0__:user:1',
+                'data': b'set',
+            }
+        )
+
+        assert len(cache) == 0
+        redis.get('user:1')
+        assert client.get.call_count == 2
+
+    def test_flushes_on_reconnect(
+        self, listener, cache, mock_container, mock_redis_client, mock_pubsub
+    ):
+        cache.disable()
+        confirmation = {
+            'type': 'psubscribe',
+            'pattern': None,
+            'channel': '__keyspace@0__:user:*',
+            'data': 1,
+        }
+
+        def check_enabled():
+            assert cache.enabled
+            fill(cache, 'GET', 'user:1', '1')
+            raise ConnectionError('Boom!')
+
+        mock_pubsub.listen.side_effect = [
+            listen(confirmation, check_enabled),
+            listen(eventlet.Event().wait),
+        ]
+
+        with eventlet.Timeout(TIMEOUT):
+            listener.start()
+            sleep(TIME_SLEEP)
+            # Not cached until subscribed again
+            assert not cache.enabled
+            assert len(cache) == 0
+            listener.stop()
+
+    def test_shared_pubsub(self, mock_container, config, cache, mock_pubsub):
+        config['REDIS']['shared_pubsub'] = True
+        cache.disable()
+        mock_pubsub.listen.return_value = listen(
+            {
+                'type': 'psubscribe',
+                'pattern': None,
+                'channel': '__keyspace@0__:*',
+                'data': 1,
+            },
+            eventlet.Event().wait,
+        )
+        entrypoint = rediskn.RedisKNEntrypoint(
+            uri_config_key=URI_CONFIG_KEY, keys='*', dbs=[0]
+        ).bind(mock_container, 'test_method')
+        entrypoint.setup()
+        # Its pattern is covered by the one of the entrypoint, so it is not
+        # subscribed to (nor confirmed) again
+        listener = InvalidationListener(
+            cache, URI_CONFIG_KEY, keys='user:*', dbs=[0]
+        ).bind(mock_container, 'redis')
+        listener.setup()
+
+        try:
+            with eventlet.Timeout(TIMEOUT):
+                entrypoint.start()
+                sleep(TIME_SLEEP)
+                listener.start()
+
+                assert cache.enabled
+                assert mock_pubsub.psubscribe.call_args_list == [
+                    call('__keyspace@0__:*')
+                ]
+
+                listener.stop()
+                entrypoint.stop()
+        finally:
+            rediskn._shared_pubsubs.clear()
+
+    def test_flushes_on_all_keys_invalidation(self, mock_container, cache):
+        listener = InvalidationListener(
+            cache, URI_CONFIG_KEY, keys='user:*', tracking=True
+        ).bind(mock_container, 'redis')
+        fill(cache, 'GET', 'user:1', '1')
+
+        listener.handle_message(
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@*__:*',
+                'channel': '__keyspace@*__:*',
+                'data': 'invalidate',
+            }
+        )
+
+        assert len(cache) == 0
+
+
+class TestRedisKNCache:
+    @pytest.fixture
+    def dependency(self, mock_container):
+        with patch('nameko_rediskn.cache.StrictRedis'):
+            dependency = RedisKNCache(
+                URI_CONFIG_KEY, keys=['user:*', 'session:?'], max_size=5, ttl=60
+            ).bind(mock_container, 'redis')
+            dependency.setup()
+            yield dependency
+
+    def test_binds_listener(self, dependency, mock_container):
+        listener = dependency.listener
+
+        assert isinstance(listener, InvalidationListener)
+        assert listener.container == mock_container
+        assert listener.keys == ['user:*', 'session:?']
+        assert listener.cache is dependency.cache
+        assert (dependency.cache.max_size, dependency.cache.ttl) == (5, 60)
+
+    def test_get_dependency(self, dependency):
+        redis = dependency.get_dependency(Mock())
+
+        assert redis.client is dependency.client
+        assert redis.cache is dependency.cache
+        assert dependency.cacheable('user:1')
+        assert dependency.cacheable(b'session:1')
+        assert not dependency.cacheable('session:12')
@@ -0,0 +1,134 @@
+from unittest.mock import Mock, call, patch
+
+import eventlet
+import pytest
+from eventlet import sleep
+from redis import ConnectionPool
+
+from nameko_rediskn.cluster import ClusterReaders, cluster_masters
+from tests import TIME_SLEEP, TIMEOUT
+
+
+def slots_reply(*nodes):
+    return [
+        [index * 1000, index * 1000 + 999, [host, port, 'id'], ['replica', 1, 'id']]
+        for index, (host, port) in enumerate(nodes)
+    ]
+
+
+@pytest.fixture
+def client():
+    client = Mock()
+    client.connection_pool = ConnectionPool(host='seed', port=7000, db=0)
+    return client
+
+
+@pytest.fixture
+def mock_strict_redis():
+    with patch('nameko_rediskn.cluster.StrictRedis') as mock_strict_redis:
+        mock_strict_redis.side_effect = lambda connection_pool: Mock(
+            connection_pool=connection_pool
+        )
+        yield mock_strict_redis
+
+
+@pytest.fixture
+def listen():
+    return Mock(side_effect=lambda client: eventlet.Event().wait())
+
+
+def test_cluster_masters():
+    slots = slots_reply(('10.0.0.1', 7000), (b'10.0.0.2', b'7001'), ('', 7002))
+    slots.append([3000, 3999, ['10.0.0.1', 7000, 'id']])
+
+    assert cluster_masters(slots, 'seed') == {
+        ('10.0.0.1', 7000),
+        ('10.0.0.2', 7001),
+        ('seed', 7002),
+    }
+
+
+class TestClusterReaders:
+    def test_listens_to_every_master(self, client, mock_strict_redis, listen):
+        client.execute_command.return_value = slots_reply(('a', 1), ('b', 2))
+        readers = ClusterReaders(client, listen)
+
+        readers.refresh()
+        sleep(TIME_SLEEP)
+
+        assert client.execute_command.call_args_list == [call('CLUSTER SLOTS')]
+        assert set(readers.readers) == {('a', 1), ('b', 2)}
+        listened = {
+            (pool.connection_kwargs['host'], pool.connection_kwargs['port'])
+            for (client,), _ in listen.call_args_list
+            for pool in [client.connection_pool]
+        }
+        assert listened == {('a', 1), ('b', 2)}
+        readers.close()
+
+    def test_follows_topology_changes(self, client, mock_strict_redis, listen):
+        client.execute_command.return_value = slots_reply(('a', 1), ('b', 2))
+        readers = ClusterReaders(client, listen)
+        readers.refresh()
+        sleep(TIME_SLEEP)
+        reader_a = readers.readers[('a', 1)]
+        pool_b = readers._clients[('b', 2)].connection_pool
+
+        # `b` failed over to `c`
+        client.execute_command.return_value = slots_reply(('a', 1), ('c', 3))
+        with patch.object(pool_b, 'disconnect') as disconnect:
+            readers.refresh()
+        sleep(TIME_SLEEP)
+
+        assert set(readers.readers) == {('a', 1), ('c', 3)}
+        assert readers.readers[('a', 1)] is reader_a
+        assert listen.call_count == 3
+        assert disconnect.call_args_list == [call()]
+        readers.close()
+
+    def test_close(self, client, mock_strict_redis, listen):
+        client.execute_command.return_value = slots_reply(('a', 1))
+        readers = ClusterReaders(client, listen)
+        readers.refresh()
+        pool = readers._clients[('a', 1)].connection_pool
+
+        with patch.object(pool, 'disconnect') as disconnect:
+            readers.close()
+
+        assert disconnect.call_args_list == [call()]
+        assert readers.readers == {}
+
+    def test_asks_other_nodes_if_seed_is_down(self, client, mock_strict_redis, listen):
+        client.execute_command.return_value = slots_reply(('a', 1))
+        readers = ClusterReaders(client, listen)
+        readers.refresh()
+
+        client.execute_command.side_effect = ConnectionError('Boom!')
+        node_client = readers._clients[('a', 1)]
+        node_client.execute_command.return_value = slots_reply(('a', 1), ('b', 2))
+        readers.refresh()
+
+        assert set(readers.readers) == {('a', 1), ('b', 2)}
+        readers.close()
+
+    def test_run(self, client, mock_strict_redis, listen):
+        client.execute_command.side_effect = [
+            ConnectionError('Boom!'),
+            slots_reply(('a', 1)),
+        ] + [slots_reply(('a', 1))] * 10
+        readers = ClusterReaders(client, listen, refresh_interval=TIME_SLEEP / 2)
+
+        with patch('nameko_rediskn.cluster.log') as log_mock:
+            with eventlet.Timeout(TIMEOUT):
+                thread = eventlet.spawn(readers.run)
+                sleep(TIME_SLEEP)
+                assert set(readers.readers) == {('a', 1)}
+                reader = readers.readers[('a', 1)]
+                thread.kill()
+                sleep(TIME_SLEEP / 2)
+
+        assert log_mock.exception.call_args_list == [
+            call('Error refreshing the Redis Cluster topology')
+        ]
+        assert reader.dead
+        assert readers.readers == {}
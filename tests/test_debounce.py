@@ -0,0 +1,112 @@
+from unittest.mock import Mock, call
+
+import pytest
+from eventlet import sleep
+
+from nameko_rediskn.debounce import Debouncer, debounce_key
+from tests import TIME_SLEEP
+
+
+def keyspace_message(key, event='hset', db=0):
+    return {
+        'type': 'pmessage',
+        'pattern': '__keyspace@*__:*',
+        'channel': '__keyspace@{}__:{}'.format(db, key),
+        'data': event,
+    }
+
+
+@pytest.fixture
+def flush():
+    return Mock()
+
+
+def test_debounce_key():
+    keyevent_message = {
+        'type': 'pmessage',
+        'pattern': '__keyevent@*__:*',
+        'channel': '__keyevent@2__:hset',
+        'data': 'foo',
+    }
+
+    assert debounce_key(keyspace_message('foo', db=2)) == ('2', 'foo', 'hset')
+    assert debounce_key(keyevent_message) == ('2', 'foo', 'hset')
+
+
+class TestDebouncer:
+    def test_collapses_bursts(self, flush):
+        debouncer = Debouncer(flush, window=TIME_SLEEP / 2)
+        messages = [keyspace_message('foo') for _ in range(3)]
+        other = keyspace_message('foo', event='del')
+
+        for message in messages + [other]:
+            debouncer.add(message)
+        assert flush.call_args_list == []
+
+        sleep(TIME_SLEEP)
+
+        assert flush.call_args_list == [call(messages[-1], 3), call(other, 1)]
+        assert len(debouncer) == 0
+
+    def test_window_restarts_on_every_message(self, flush):
+        debouncer = Debouncer(flush, window=TIME_SLEEP)
+        message = keyspace_message('foo')
+
+        for _ in range(3):
+            debouncer.add(message)
+            sleep(TIME_SLEEP * 2 / 3)
+        assert flush.call_args_list == []
+
+        sleep(TIME_SLEEP)
+
+        assert flush.call_args_list == [call(message, 3)]
+
+    def test_max_wait(self, flush):
+        debouncer = Debouncer(flush, window=TIME_SLEEP, max_wait=TIME_SLEEP * 1.5)
+        message = keyspace_message('foo')
+
+        for _ in range(4):
+            debouncer.add(message)
+            sleep(TIME_SLEEP * 2 / 3)
+
+        assert flush.call_args_list == [call(message, 3)]
+
+    def test_max_wait_shorter_than_window(self, flush):
+        debouncer = Debouncer(flush, window=10, max_wait=TIME_SLEEP)
+        message = keyspace_message('foo')
+
+        debouncer.add(message)
+        sleep(TIME_SLEEP * 2)
+
+        assert flush.call_args_list == [call(message, 1)]
+
+    def test_evicts_oldest_key(self, flush):
+        debouncer = Debouncer(flush, window=10, max_pending=2)
+        foo, bar, baz = (keyspace_message(key) for key in ('foo', 'bar', 'baz'))
+
+        for message in (foo, bar, foo, baz):
+            debouncer.add(message)
+
+        assert flush.call_args_list == [call(foo, 2)]
+        assert debouncer.evicted == 1
+        assert len(debouncer) == 2
+
+    def test_flush(self, flush):
+        debouncer = Debouncer(flush, window=TIME_SLEEP / 2)
+        message = keyspace_message('foo')
+        debouncer.add(message)
+
+        debouncer.flush()
+        sleep(TIME_SLEEP)
+
+        assert flush.call_args_list == [call(message, 1)]
+
+    def test_cancel(self, flush):
+        debouncer = Debouncer(flush, window=TIME_SLEEP / 2)
+        debouncer.add(keyspace_message('foo'))
+
+        debouncer.cancel()
+        sleep(TIME_SLEEP)
+
+        assert flush.call_args_list == []
+        assert len(debouncer) == 0
@@ -0,0 +1,127 @@
+from unittest.mock import Mock, call, patch
+
+import pytest
+from eventlet import sleep
+from redis import ConnectionError, ConnectionPool
+
+from nameko_rediskn.enrichment import Enricher
+from nameko_rediskn.events import KeyspaceEvent
+from tests import TIME_SLEEP
+
+
+@pytest.fixture
+def client():
+    client = Mock()
+    client.connection_pool = ConnectionPool(db=0)
+    return client
+
+
+def message(key, db=0):
+    return {
+        'type': 'pmessage',
+        'pattern': '__keyspace@{}__:*'.format(db),
+        'channel': '__keyspace@{}__:{}'.format(db, key),
+        'data': 'set',
+    }
+
+
+def test_fetches_values_with_mget(client):
+    client.mget.return_value = ['1', None]
+    forward = Mock()
+    enricher = Enricher(client, 'value', forward, size=2)
+
+    enricher.add(message('a'))
+    assert forward.call_args_list == []
+    enricher.add(message('b'))
+
+    assert client.mget.call_args_list == [call(['a', 'b'])]
+    assert forward.call_args_list == [
+        call(dict(message('a'), value='1')),
+        call(dict(message('b'), value=None)),
+    ]
+
+
+@pytest.mark.parametrize(
+    'fetch, command, replies, field, expected',
+    [
+        ('ttl', 'pttl', [1500], 'pttl', 1500),
+        ('type', 'type', [b'hash'], 'key_type', 'hash'),
+    ],
+)
+def test_fetches_with_pipeline(client, fetch, command, replies, field, expected):
+    pipeline = client.pipeline.return_value
+    pipeline.execute.return_value = replies
+    forward = Mock()
+    enricher = Enricher(client, fetch, forward)
+
+    enricher.add(message('a'))
+    enricher.flush()
+
+    assert getattr(pipeline, command).call_args_list == [call('a')]
+    assert forward.call_args_list == [call(dict(message('a'), **{field: expected}))]
+
+
+def test_fetches_with_callable(client):
+    pipeline = client.pipeline.return_value
+    pipeline.execute.return_value = [{'name': 'foo'}]
+    forward = Mock()
+    enricher = Enricher(client, lambda pipeline, key: pipeline.hgetall(key), forward)
+
+    event = KeyspaceEvent.from_message(message('a'))
+    enricher.add(event)
+    enricher.flush()
+
+    assert pipeline.hgetall.call_args_list == [call('a')]
+    assert forward.call_args_list == [call(event)]
+    assert event.value == {'name': 'foo'}
+
+
+def test_fetches_per_db_within_window(client):
+    forward = Mock()
+    enricher = Enricher(client, 'value', forward, window=TIME_SLEEP / 2)
+
+    with patch('nameko_rediskn.cluster.StrictRedis') as mock_strict_redis:
+        db_client = mock_strict_redis.return_value
+        db_client.mget.return_value = ['2']
+        client.mget.return_value = ['1', '3']
+
+        enricher.add(message('a'))
+        enricher.add(message('b', db=3))
+        enricher.add(message('c'))
+        sleep(TIME_SLEEP)
+
+    assert client.mget.call_args_list == [call(['a', 'c'])]
+    assert db_client.mget.call_args_list == [call(['b'])]
+    assert forward.call_count == 3
+
+    enricher.close()
+    assert db_client.connection_pool.disconnect.call_args_list == [call()]
+
+
+def test_forwards_other_messages_right_away(client):
+    forward = Mock()
+    enricher = Enricher(client, 'value', forward)
+    confirmation = {
+        'type': 'psubscribe',
+        'pattern': None,
+        'channel': '__keyspace@0__:*',
+        'data': 1,
+    }
+
+    enricher.add(confirmation)
+
+    assert forward.call_args_list == [call(confirmation)]
+    assert len(enricher) == 0
+
+
+def test_fetch_error(client):
+    client.mget.side_effect = ConnectionError('Boom!')
+    forward = Mock()
+    enricher = Enricher(client, 'value', forward)
+
+    with patch('nameko_rediskn.enrichment.log') as log:
+        enricher.add(message('a'))
+        enricher.flush()
+
+    assert forward.call_args_list == [call(dict(message('a'), value=None))]
+    assert log.exception.call_args_list == [call('Error fetching %d keys', 1)]
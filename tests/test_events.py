@@ -0,0 +1,155 @@
+import sys
+
+import pytest
+
+from nameko_rediskn.events import KeyspaceEvent, parse_channel
+
+
+class TestParseChannel:
+    @pytest.mark.parametrize(
+        'channel, expected',
+        [
+            ('__keyspace@0__:foo', ('keyspace', '0', 'foo')),
+            ('__keyspace@12__:foo:bar', ('keyspace', '12', 'foo:bar')),
+            ('__keyspace@0__:foo__:bar', ('keyspace', '0', 'foo__:bar')),
+            ('__keyevent@3__:expired', ('keyevent', '3', 'expired')),
+            ('__keyevent@*__:*', ('keyevent', '*', '*')),
+        ],
+    )
+    def test_parse(self, channel, expected):
+        assert parse_channel(channel) == expected
+
+    @pytest.mark.parametrize(
+        'channel', ['foo', '__keyspace@0:foo', '__other@0__:foo', 'keyspace@0__:a']
+    )
+    def test_raises_if_invalid_channel(self, channel):
+        with pytest.raises(ValueError):
+            parse_channel(channel)
+
+
+class TestKeyspaceEvent:
+    def test_keyspace_event(self):
+        event = KeyspaceEvent.from_message(
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@*__:*',
+                'channel': '__keyspace@5__:user:1:name',
+                'data': 'expired',
+            },
+            sequence=7,
+        )
+
+        assert event.kind == 'keyspace'
+        assert event.db == 5
+        assert event.key == 'user:1:name'
+        assert event.event == 'expired'
+        assert event.event is sys.intern('expired')
+        assert event.sequence == 7
+        assert event.received_at > 0
+
+    def test_keyevent_event(self):
+        event = KeyspaceEvent(
+            'pmessage', '__keyevent@*__:*', '__keyevent@0__:hset', 'user:1'
+        )
+
+        assert event.kind == 'keyevent'
+        assert event.db == 0
+        assert event.key == 'user:1'
+        assert event.event == 'hset'
+
+    def test_invalidation_event(self):
+        event = KeyspaceEvent(
+            'pmessage', '__keyspace@*__:user:*', '__keyspace@*__:user:1', 'invalidate'
+        )
+
+        assert event.db == '*'
+        assert event.key == 'user:1'
+        assert event.event == 'invalidate'
+
+    def test_parses_lazily_and_once(self):
+        event = KeyspaceEvent('pmessage', 'pattern', 'not-a-channel', 'set')
+
+        with pytest.raises(ValueError):
+            event.key
+
+        event.channel = '__keyspace@0__:foo'
+        assert event.key == 'foo'
+
+        event.channel = '__keyspace@1__:bar'
+        assert event.key == 'foo'
+
+    def test_item_access(self):
+        message = {
+            'type': 'pmessage',
+            'pattern': '__keyspace@*__:*',
+            'channel': '__keyspace@0__:foo',
+            'data': 'set',
+        }
+        event = KeyspaceEvent.from_message(message)
+
+        assert {name: event[name] for name in message} == message
+        with pytest.raises(KeyError):
+            event['key']
+
+    def test_slots(self):
+        event = KeyspaceEvent('pmessage', 'pattern', '__keyspace@0__:foo', 'set')
+
+        with pytest.raises(AttributeError):
+            event.extra = 'value'
+
+    def test_equality(self):
+        args = ('pmessage', '__keyspace@*__:*', '__keyspace@0__:foo', 'set')
+
+        assert KeyspaceEvent(*args, sequence=1) == KeyspaceEvent(*args, sequence=2)
+        assert KeyspaceEvent(*args) != KeyspaceEvent(*args[:3], 'del')
+        assert KeyspaceEvent(*args) != {'type': 'pmessage'}
+
+
+class TestRawKeyspaceEvent:
+    def test_parse_channel(self):
+        assert parse_channel(b'__keyspace@10__:\xff:bar') == (
+            'keyspace',
+            b'10',
+            b'\xff:bar',
+        )
+
+    def test_keyspace_event(self):
+        event = KeyspaceEvent(
+            'pmessage', b'__keyspace@*__:*', b'__keyspace@2__:\xff\xfe', b'expired'
+        )
+
+        assert event.kind == 'keyspace'
+        assert event.db == 2
+        assert event.key == b'\xff\xfe'
+        assert event.event == 'expired'
+        assert event.event is sys.intern('expired')
+
+    def test_keyevent_event(self):
+        event = KeyspaceEvent(
+            'pmessage', b'__keyevent@*__:*', b'__keyevent@0__:del', b'\xff'
+        )
+
+        assert event.kind == 'keyevent'
+        assert event.key == b'\xff'
+        assert event.event == 'del'
+
+
+def test_snapshot_event():
+    event = KeyspaceEvent.from_message(
+        {
+            'type': 'pmessage',
+            'pattern': '__keyspace@0__:*',
+            'channel': '__keyspace@0__:foo',
+            'data': 'snapshot',
+            'synthetic': True,
+            'key_type': 'hash',
+            'pttl': 100,
+        }
+    )
+
+    assert (event.event, event.synthetic, event.key_type, event.pttl) == (
+        'snapshot',
+        True,
+        'hash',
+        100,
+    )
@@ -0,0 +1,226 @@
+from unittest.mock import Mock, call, patch
+
+import eventlet
+import pytest
+from eventlet import sleep
+from redis import ConnectionError, ConnectionPool
+
+from nameko_rediskn.expiry import (
+    DISPATCH,
+    ExpiryTracker,
+    FiredKeys,
+    TimingWheel,
+    expired_message,
+)
+from nameko_rediskn.snapshot import snapshot_message
+from tests import TIME_SLEEP, TIMEOUT
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def wheel(clock):
+    return TimingWheel(resolution=0.01, slots=4, levels=3, clock=clock)
+
+
+class TestTimingWheel:
+    def test_fires_keys_at_their_deadline(self, wheel, clock):
+        wheel.schedule('a', clock.now + 0.02)
+        wheel.schedule('b', clock.now + 0.05)
+
+        clock.now += 0.01
+        assert wheel.advance() == []
+        clock.now += 0.01
+        assert wheel.advance() == ['a']
+        clock.now += 0.03
+        assert wheel.advance() == ['b']
+        assert len(wheel) == 0
+
+    @pytest.mark.parametrize('delay', [0.03, 0.1, 0.37, 0.63, 1.5, 7])
+    def test_cascades_far_deadlines(self, wheel, clock, delay):
+        wheel.schedule('key', clock.now + delay)
+
+        fired_at = None
+        for tick in range(1, 800):
+            clock.now = 1000.0 + tick * 0.01
+            if wheel.advance():
+                fired_at = tick * 0.01
+                break
+
+        assert fired_at == pytest.approx(delay)
+
+    def test_past_deadlines_fire_on_next_tick(self, wheel, clock):
+        wheel.schedule('key', clock.now - 5)
+
+        clock.now += 0.01
+        assert wheel.advance() == ['key']
+
+    def test_reschedules(self, wheel, clock):
+        wheel.schedule('key', clock.now + 0.02)
+        wheel.schedule('key', clock.now + 0.2)
+
+        clock.now += 0.1
+        assert wheel.advance() == []
+        clock.now += 0.1
+        assert wheel.advance() == ['key']
+
+    def test_cancels(self, wheel, clock):
+        wheel.schedule('key', clock.now + 0.2)
+        wheel.cancel('key')
+        wheel.cancel('unknown')
+
+        assert 'key' not in wheel
+        clock.now += 1
+        assert wheel.advance() == []
+
+    def test_next_timeout(self, wheel, clock):
+        assert wheel.next_timeout() is None
+
+        wheel.schedule('key', clock.now + 0.02)
+        assert wheel.next_timeout() == pytest.approx(0.02)
+
+        # Up to the end of the rotation of the first level
+        wheel.schedule('key', clock.now + 0.5)
+        assert wheel.next_timeout() == pytest.approx(0.04)
+
+    def test_run(self):
+        delay = TIME_SLEEP / 2
+        wheel = TimingWheel(resolution=0.001)
+        callback = Mock()
+        thread = eventlet.spawn(wheel.run, callback)
+        sleep()
+
+        with eventlet.Timeout(TIMEOUT):
+            wheel.schedule('later', wheel.clock() + delay * 4)
+            sleep()
+            wheel.schedule('sooner', wheel.clock() + delay)
+            sleep(delay * 2)
+            assert callback.call_args_list == [call(['sooner'])]
+            sleep(delay * 3)
+        thread.kill()
+
+        assert callback.call_args_list == [call(['sooner']), call(['later'])]
+
+
+class TestExpiryTracker:
+    @pytest.fixture
+    def client(self):
+        client = Mock()
+        client.connection_pool = ConnectionPool(db=0)
+        return client
+
+    @staticmethod
+    def message(key, event, db=0):
+        return {
+            'type': 'pmessage',
+            'pattern': '__keyspace@{}__:*'.format(db),
+            'channel': '__keyspace@{}__:{}'.format(db, key),
+            'data': event,
+        }
+
+    def test_looks_up_ttl_of_expiring_keys(self, client):
+        client.pipeline.return_value.execute.return_value = [1500, -2]
+        tracker = ExpiryTracker(client, Mock(), lookup_latency=TIME_SLEEP)
+
+        assert tracker.observe(self.message('a', 'expire'))
+        assert tracker.observe(self.message('b', 'expire'))
+        sleep(TIME_SLEEP * 2)
+
+        pipeline = client.pipeline.return_value
+        assert pipeline.pttl.call_args_list == [call('a'), call('b')]
+        assert (0, 'a') in tracker.wheel
+        assert (0, 'b') not in tracker.wheel
+
+    def test_lookup_error(self, client):
+        pipeline = client.pipeline.return_value
+        pipeline.execute.side_effect = [ConnectionError('Boom!'), [1500]]
+        tracker = ExpiryTracker(client, Mock(), lookup_size=1)
+
+        # The batch is full, so it is looked up right away
+        assert tracker.observe(self.message('a', 'expire'))
+        assert tracker.observe(self.message('b', 'expire'))
+
+        assert (0, 'a') not in tracker.wheel
+        assert (0, 'b') in tracker.wheel
+
+    @pytest.mark.parametrize('event', ['set', 'persist', 'del', 'expired'])
+    def test_forgets_keys(self, client, event):
+        tracker = ExpiryTracker(client, Mock())
+        tracker.wheel.schedule((0, 'a'), tracker.wheel.clock() + 10)
+
+        assert tracker.observe(self.message('a', event))
+        assert len(tracker.wheel) == 0
+
+    def test_tracks_snapshot_keys(self, client):
+        tracker = ExpiryTracker(client, Mock())
+
+        tracker.observe(snapshot_message('__keyspace@0__:*', 0, 'a', 'hash', 1500))
+        tracker.observe(snapshot_message('__keyspace@0__:*', 0, 'b', 'hash', -1))
+
+        assert (0, 'a') in tracker.wheel
+        assert (0, 'b') not in tracker.wheel
+
+    def test_touches_keys_at_deadline(self, client):
+        tracker = ExpiryTracker(client, Mock())
+        with patch('nameko_rediskn.cluster.StrictRedis') as mock_strict_redis:
+            tracker._expire([(0, 'a'), (3, 'b'), (0, 'c')])
+
+        pipeline = client.pipeline.return_value
+        assert pipeline.exists.call_args_list == [call('a'), call('c')]
+        db_pipeline = mock_strict_redis.return_value.pipeline.return_value
+        assert db_pipeline.exists.call_args_list == [call('b')]
+
+        tracker.close()
+        assert mock_strict_redis.return_value.connection_pool.disconnect.called
+
+    def test_dispatches_at_deadline(self, client):
+        fire = Mock()
+        tracker = ExpiryTracker(client, fire, action=DISPATCH)
+
+        tracker._expire([(0, 'a')])
+
+        assert fire.call_args_list == [call(0, 'a')]
+        assert client.pipeline.call_args_list == []
+        # The notification published by Redis is dropped, once
+        assert not tracker.observe(self.message('a', 'expired'))
+        assert tracker.observe(self.message('a', 'expired'))
+
+
+def test_fired_keys_are_bounded():
+    fired = FiredKeys(max_size=2)
+    for key in 'abc':
+        fired.add(key)
+
+    assert len(fired) == 2
+    assert not fired.pop('a')
+    assert fired.pop('c')
+
+
+@pytest.mark.parametrize(
+    'key, expected',
+    [
+        ('user:1', ('__keyspace@2__:user:1', 'expired')),
+        (b'user:\xff', (b'__keyspace@2__:user:\xff', b'expired')),
+    ],
+)
+def test_expired_message(key, expected):
+    channel, event = expected
+
+    assert expired_message(2, key) == {
+        'type': 'pmessage',
+        'pattern': channel,
+        'channel': channel,
+        'data': event,
+        'synthetic': True,
+    }
@@ -0,0 +1,176 @@
+from unittest.mock import Mock, call
+
+import eventlet
+import pytest
+from eventlet import sleep
+
+from nameko_rediskn.handoff import (
+    BLOCK,
+    COALESCE,
+    DROP_NEWEST,
+    DROP_OLDEST,
+    HandoffQueue,
+    notification_key,
+)
+from tests import TIME_SLEEP, TIMEOUT
+
+
+def keyspace_message(key, event='set', db=0):
+    return {
+        'type': 'pmessage',
+        'pattern': '__keyspace@*__:*',
+        'channel': '__keyspace@{}__:{}'.format(db, key),
+        'data': event,
+    }
+
+
+@pytest.fixture
+def dispatch():
+    return Mock()
+
+
+def test_notification_key():
+    keyevent_message = {
+        'type': 'pmessage',
+        'pattern': '__keyevent@*__:*',
+        'channel': '__keyevent@1__:expired',
+        'data': 'foo:bar',
+    }
+
+    assert notification_key(keyspace_message('foo:bar', db=1)) == ('1', 'foo:bar')
+    assert notification_key(keyevent_message) == ('1', 'foo:bar')
+
+
+class TestHandoffQueue:
+    def test_hands_messages_over_in_order(self, dispatch):
+        queue = HandoffQueue(dispatch, max_size=10)
+        messages = [keyspace_message(str(index)) for index in range(3)]
+        thread = eventlet.spawn(queue.run)
+
+        for message in messages:
+            queue.put(message)
+        sleep(TIME_SLEEP)
+        thread.kill()
+
+        assert dispatch.call_args_list == [call(message) for message in messages]
+        assert len(queue) == 0
+
+    def test_block(self, dispatch):
+        queue = HandoffQueue(dispatch, max_size=2, overflow=BLOCK)
+        messages = [keyspace_message(str(index)) for index in range(3)]
+        queue.put(messages[0])
+        queue.put(messages[1])
+
+        writer = eventlet.spawn(queue.put, messages[2])
+        sleep(TIME_SLEEP)
+        assert not writer.dead
+
+        queue.flush()
+        with eventlet.Timeout(TIMEOUT):
+            writer.wait()
+        queue.flush()
+
+        assert dispatch.call_args_list == [call(message) for message in messages]
+        assert queue.dropped == 0
+
+    def test_block_several_writers(self, dispatch):
+        queue = HandoffQueue(dispatch, max_size=1, overflow=BLOCK)
+        messages = [keyspace_message(str(index)) for index in range(4)]
+        queue.put(messages[0])
+
+        writers = [eventlet.spawn(queue.put, message) for message in messages[1:]]
+        sleep(TIME_SLEEP)
+        assert not any(writer.dead for writer in writers)
+
+        thread = eventlet.spawn(queue.run)
+        with eventlet.Timeout(TIMEOUT):
+            for writer in writers:
+                writer.wait()
+        sleep(TIME_SLEEP)
+        thread.kill()
+
+        assert dispatch.call_args_list == [call(message) for message in messages]
+
+    def test_drop_oldest(self, dispatch):
+        queue = HandoffQueue(dispatch, max_size=2, overflow=DROP_OLDEST)
+        messages = [keyspace_message(str(index)) for index in range(4)]
+
+        for message in messages:
+            queue.put(message)
+        queue.flush()
+
+        assert dispatch.call_args_list == [call(messages[2]), call(messages[3])]
+        assert queue.dropped == 2
+
+    def test_drop_newest(self, dispatch):
+        queue = HandoffQueue(dispatch, max_size=2, overflow=DROP_NEWEST)
+        messages = [keyspace_message(str(index)) for index in range(4)]
+
+        for message in messages:
+            queue.put(message)
+        queue.flush()
+
+        assert dispatch.call_args_list == [call(messages[0]), call(messages[1])]
+        assert queue.dropped == 2
+
+    def test_coalesce(self, dispatch):
+        queue = HandoffQueue(dispatch, max_size=2, overflow=COALESCE)
+        foo_set = keyspace_message('foo', event='set')
+        bar_set = keyspace_message('bar', event='set')
+        foo_expire = keyspace_message('foo', event='expire')
+        baz_set = keyspace_message('baz', event='set')
+
+        for message in (foo_set, bar_set, foo_expire, baz_set):
+            queue.put(message)
+        queue.flush()
+
+        # The message about `foo` is updated in place, then dropped to make
+        # room for `baz`
+        assert dispatch.call_args_list == [call(bar_set), call(baz_set)]
+        assert queue.coalesced == 1
+        assert queue.dropped == 1
+
+    def test_coalesce_custom_key(self, dispatch):
+        queue = HandoffQueue(
+            dispatch, max_size=10, overflow=COALESCE, key=lambda message: 'all'
+        )
+        messages = [keyspace_message(str(index)) for index in range(3)]
+
+        for message in messages:
+            queue.put(message)
+        queue.flush()
+
+        assert dispatch.call_args_list == [call(messages[2])]
+        assert queue.coalesced == 2
+
+    def test_does_not_coalesce_subscription_confirmations(self, dispatch):
+        queue = HandoffQueue(dispatch, max_size=10, overflow=COALESCE)
+        confirmation = {
+            'type': 'psubscribe',
+            'pattern': None,
+            'channel': '__keyspace@0__:*',
+            'data': 1,
+        }
+
+        queue.put(confirmation)
+        queue.put(confirmation)
+        queue.flush()
+
+        assert dispatch.call_args_list == [call(confirmation), call(confirmation)]
+
+    def test_cancel(self, dispatch):
+        queue = HandoffQueue(dispatch, max_size=1)
+        queue.put(keyspace_message('foo'))
+        writers = [
+            eventlet.spawn(queue.put, keyspace_message(key)) for key in ('bar', 'baz')
+        ]
+        sleep(TIME_SLEEP)
+
+        queue.cancel()
+        with eventlet.Timeout(TIMEOUT):
+            writers[0].wait()
+        sleep(TIME_SLEEP)
+
+        assert not writers[1].dead
+        assert len(queue) == 1
+        assert dispatch.call_args_list == []
@@ -0,0 +1,144 @@
+from unittest.mock import Mock, call
+
+import pytest
+from redis import ConnectionError
+
+from nameko_rediskn.lag import CANARY_TTL, LagProbe
+
+KEY = '__rediskn:canary:service.method:1'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def canary_message(event='set', raw=False):
+    message = {
+        'type': 'pmessage',
+        'pattern': '__keyspace@0__:' + KEY,
+        'channel': '__keyspace@0__:' + KEY,
+        'data': event,
+    }
+    if raw:
+        message = {
+            name: value.encode() if isinstance(value, str) else value
+            for name, value in message.items()
+        }
+    return message
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def on_alert():
+    return Mock()
+
+
+@pytest.fixture
+def probe(clock, on_alert):
+    return LagProbe(Mock(), KEY, 1, threshold=0.5, on_alert=on_alert, clock=clock)
+
+
+class TestLagProbe:
+    def test_measures_lag(self, probe, clock):
+        probe.probe()
+        clock.now += 0.25
+
+        assert probe.lag() == 0.25
+        assert probe.observe(canary_message()) == 0.25
+        assert probe.lag() == 0.25
+        assert probe.client.set.call_args_list == [
+            call(KEY, probe.client.set.call_args[0][1], ex=CANARY_TTL)
+        ]
+
+    def test_one_probe_in_flight(self, probe, clock):
+        probe.probe()
+        clock.now += 0.1
+        probe.probe()
+
+        assert probe.client.set.call_count == 1
+
+    @pytest.mark.parametrize('raw', [False, True])
+    def test_is_canary(self, probe, raw):
+        keyevent = {
+            'type': 'pmessage',
+            'pattern': '__keyevent@0__:*',
+            'channel': '__keyevent@0__:set',
+            'data': KEY,
+        }
+        other = dict(canary_message(), channel='__keyspace@0__:foo')
+        if raw:
+            keyevent, other = (
+                {
+                    name: value.encode() if isinstance(value, str) else value
+                    for name, value in message.items()
+                }
+                for message in (keyevent, other)
+            )
+
+        assert probe.is_canary(canary_message(raw=raw))
+        assert probe.is_canary(keyevent)
+        assert not probe.is_canary(other)
+
+    def test_ignores_other_events_and_duplicates(self, probe, clock):
+        probe.probe()
+
+        assert probe.observe(canary_message('expired')) is None
+        assert probe.observe(canary_message(raw=True)) == 0
+        assert probe.observe(canary_message()) is None
+        assert len(probe.samples) == 1
+
+    def test_alerts(self, probe, clock, on_alert):
+        probe.probe()
+        clock.now += 1
+        probe.probe()
+
+        assert probe.lagging
+        assert on_alert.call_args_list == [call(True)]
+
+        probe.observe(canary_message())
+        assert probe.lagging
+
+        probe.probe()
+        clock.now += 0.1
+        probe.observe(canary_message())
+        assert not probe.lagging
+        assert on_alert.call_args_list == [call(True), call(False)]
+
+    def test_reset(self, probe):
+        probe.probe()
+        probe.reset()
+
+        assert probe.observe(canary_message()) is None
+        probe.probe()
+        assert probe.client.set.call_count == 2
+
+    def test_set_error(self, probe):
+        probe.client.set.side_effect = ConnectionError('Boom!')
+        probe.probe()
+
+        assert probe.observe(canary_message()) is None
+
+    def test_percentiles(self, probe, clock):
+        assert probe.percentiles() == {}
+
+        for lag in range(1, 11):
+            clock.now = 0
+            probe.probe()
+            clock.now = lag / 100
+            probe.observe(canary_message())
+
+        assert probe.percentiles() == {50: 0.05, 90: 0.09, 99: 0.1}
+
+    def test_close(self, probe):
+        probe.close()
+
+        probe.client.delete.assert_called_once_with(KEY)
+        probe.client.connection_pool.disconnect.assert_called_once_with()
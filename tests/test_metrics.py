@@ -0,0 +1,156 @@
+from unittest.mock import Mock
+
+import pytest
+
+from nameko_rediskn.events import KeyspaceEvent
+from nameko_rediskn.metrics import EntrypointMetrics, Registry, prometheus_text
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+class TestRegistry:
+    def test_counter(self, registry):
+        counter = registry.counter('hits_total', 'Hits.', ('db',))
+        counter.inc(('0',))
+        counter.inc(('0',), amount=2)
+        counter.inc(('1',))
+
+        assert registry.counter('hits_total', 'Hits.', ('db',)) is counter
+        assert counter.values == {('0',): 3, ('1',): 1}
+
+    def test_gauge(self, registry):
+        gauge = registry.gauge('workers', 'Workers.')
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        assert gauge.values == {(): 1}
+
+        gauge.set(5)
+        assert gauge.values == {(): 5}
+
+    def test_histogram(self, registry):
+        histogram = registry.histogram('latency_seconds', 'Latency.')
+        histogram.buckets = (0.1, 1)
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+
+        assert list(histogram.samples()) == [
+            ('_bucket', (('le', 0.1),), 2),
+            ('_bucket', (('le', 1),), 3),
+            ('_bucket', (('le', '+Inf'),), 4),
+            ('_sum', (), 2.65),
+            ('_count', (), 4),
+        ]
+
+    def test_kind_mismatch(self, registry):
+        registry.counter('hits_total', 'Hits.')
+
+        with pytest.raises(ValueError) as exc:
+            registry.gauge('hits_total', 'Hits.')
+
+        assert str(exc.value) == 'hits_total is already a counter'
+
+    def test_export(self, registry):
+        counter = registry.counter('hits_total', 'Hits.')
+        exporter = Mock()
+
+        assert registry.export(exporter) == exporter.return_value
+        exporter.assert_called_once_with([counter])
+
+
+class TestPrometheusText:
+    def test_render(self, registry):
+        registry.counter('hits_total', 'Hits.', ('db', 'key')).inc(('0', 'a"b\\c'))
+        registry.gauge('workers', 'Workers\nrunning.').set(1.5)
+        histogram = registry.histogram('latency_seconds', 'Latency.')
+        histogram.buckets = (1,)
+        histogram.observe(0.5)
+
+        assert registry.export(prometheus_text) == (
+            '# HELP hits_total Hits.\n'
+            '# TYPE hits_total counter\n'
+            'hits_total{db="0",key="a\\"b\\\\c"} 1\n'
+            '# HELP workers Workers\\nrunning.\n'
+            '# TYPE workers gauge\n'
+            'workers 1.5\n'
+            '# HELP latency_seconds Latency.\n'
+            '# TYPE latency_seconds histogram\n'
+            'latency_seconds_bucket{le="1"} 1\n'
+            'latency_seconds_bucket{le="+Inf"} 1\n'
+            'latency_seconds_sum 0.5\n'
+            'latency_seconds_count 1\n'
+        )
+
+    def test_empty(self, registry):
+        assert registry.export(prometheus_text) == ''
+
+
+class TestEntrypointMetrics:
+    @pytest.fixture
+    def metrics(self, registry):
+        return EntrypointMetrics('service.method', registry=registry)
+
+    @pytest.mark.parametrize(
+        'message',
+        [
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@0__:*',
+                'channel': '__keyspace@0__:foo',
+                'data': 'set',
+            },
+            {
+                'type': 'pmessage',
+                'pattern': b'__keyevent@0__:*',
+                'channel': b'__keyevent@0__:set',
+                'data': b'foo',
+            },
+        ],
+    )
+    def test_received(self, metrics, message):
+        metrics.received(message)
+
+        assert metrics.notifications.values == {('service.method', '0', 'set'): 1}
+
+    def test_subscribed_and_disconnected(self, metrics):
+        labels = ('service.method',)
+        metrics.disconnected(2)
+        metrics.disconnected(2)
+
+        assert metrics.reconnects.values == {labels: 2}
+        assert metrics.errors.values == {labels: 2}
+        assert metrics.backoff.values == {labels: 4}
+
+        metrics.received(
+            {'type': 'psubscribe', 'pattern': None, 'channel': '*', 'data': 3}
+        )
+
+        assert metrics.reconnects.values == {labels: 2}
+        assert metrics.errors.values == {labels: 0}
+        assert metrics.backoff.values == {labels: 0}
+        assert metrics.patterns.values == {labels: 3}
+
+    def test_dispatched(self, metrics):
+        event = KeyspaceEvent.from_message(
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@0__:*',
+                'channel': '__keyspace@0__:foo',
+                'data': 'set',
+            }
+        )
+        metrics.dispatching()
+        metrics.dispatched_worker([event], 0.002)
+
+        assert metrics.workers.values == {('service.method',): 1}
+        assert metrics.dispatched.values == {('service.method',): 1}
+        assert metrics.dispatch_seconds.values[('service.method',)][-1] == 1
+        ((labels, counts),) = metrics.latency.values.items()
+        assert labels == ('service.method', '0', 'set')
+        assert counts[-1] == 1
+
+        metrics.finished()
+        assert metrics.workers.values == {('service.method',): 0}
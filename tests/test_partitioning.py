@@ -0,0 +1,98 @@
+from unittest.mock import Mock, call, patch
+
+import pytest
+
+from nameko_rediskn.partitioning import HashRing, Membership, key_hash, partition_key
+
+
+@pytest.fixture
+def client():
+    client = Mock()
+    client.pipeline.return_value.execute.return_value = [1, 0, ['member-1'], 1]
+    return client
+
+
+def test_key_hash():
+    assert key_hash('foo') == key_hash(b'foo')
+    assert 0 <= key_hash('\udcff') < 2**32
+
+
+@pytest.mark.parametrize(
+    'message',
+    [
+        {'channel': '__keyspace@0__:user:1', 'data': 'set'},
+        {'channel': '__keyevent@0__:set', 'data': 'user:1'},
+    ],
+)
+def test_partition_key(message):
+    assert partition_key(message) == 'user:1'
+
+
+class TestHashRing:
+    def test_empty(self):
+        assert HashRing().owner('foo') is None
+
+    def test_single_member(self):
+        ring = HashRing(['a'])
+
+        assert all(ring.owner(str(key)) == 'a' for key in range(100))
+
+    def test_distributes_keys(self):
+        ring = HashRing(['a', 'b', 'c'])
+        keys = ['user:{}'.format(index) for index in range(3000)]
+
+        owners = [ring.owner(key) for key in keys]
+
+        for member in ('a', 'b', 'c'):
+            assert 600 < owners.count(member) < 1400
+
+    def test_only_moves_keys_of_changed_members(self):
+        keys = ['user:{}'.format(index) for index in range(3000)]
+        before = HashRing(['a', 'b', 'c'])
+        after = HashRing(['a', 'b', 'c', 'd'])
+
+        for key in keys:
+            owner = after.owner(key)
+            assert owner == 'd' or owner == before.owner(key)
+
+
+class TestMembership:
+    def test_owns_everything_before_first_heartbeat(self, client):
+        membership = Membership(client, 'service.method', member_id='member-1')
+
+        assert all(membership.owns(str(key)) for key in range(100))
+
+    @patch('nameko_rediskn.partitioning.time.time', return_value=100.0)
+    def test_heartbeat(self, _, client):
+        client.pipeline.return_value.execute.return_value = [
+            1,
+            0,
+            ['member-1', b'member-2'],
+            1,
+        ]
+        membership = Membership(
+            client, 'service.method', member_id='member-1', interval=2
+        )
+
+        assert membership.heartbeat() is True
+        assert membership.heartbeat() is False
+
+        key = 'rediskn:members:service.method'
+        assert client.pipeline.return_value.execute_command.call_args_list[:4] == [
+            call('ZADD', key, 100.0, 'member-1'),
+            call('ZREMRANGEBYSCORE', key, '-inf', 94.0),
+            call('ZRANGE', key, 0, -1),
+            call('PEXPIRE', key, 60000),
+        ]
+        assert membership.ring.members == {'member-1', 'member-2'}
+        owners = {membership.ring.owner(str(key)) for key in range(100)}
+        assert owners == {'member-1', 'member-2'}
+
+    def test_leave(self, client):
+        membership = Membership(client, 'service.method', member_id='member-1')
+
+        membership.leave()
+
+        assert client.execute_command.call_args_list == [
+            call('ZREM', 'rediskn:members:service.method', 'member-1')
+        ]
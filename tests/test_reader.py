@@ -0,0 +1,220 @@
+import socket
+from unittest.mock import Mock, call
+
+import eventlet
+import pytest
+from redis.connection import Encoder, PythonParser
+from redis.exceptions import ConnectionError, ResponseError
+
+from nameko_rediskn.reader import (
+    READ_SIZE,
+    ThreadedReader,
+    can_read_directly,
+    drain,
+    pubsub_message,
+)
+from tests import TIMEOUT
+
+PMESSAGE = b'*4\r\n$8\r\npmessage\r\n$1\r\n*\r\n$3\r\nfoo\r\n$3\r\nset\r\n'
+
+
+def encoder(decode_responses=True):
+    return Encoder('utf-8', 'strict', decode_responses)
+
+
+@pytest.fixture
+def sockets():
+    client, server = socket.socketpair()
+    yield client, server
+    client.close()
+    server.close()
+
+
+@pytest.fixture
+def server(sockets):
+    return sockets[1]
+
+
+@pytest.fixture
+def connection(sockets):
+    return Mock(_sock=sockets[0], encoder=encoder(), socket_timeout=None)
+
+
+@pytest.fixture
+def create_reader(connection):
+    readers = []
+
+    def create(**kwargs):
+        reader = ThreadedReader(connection, poll_interval=0.01, **kwargs)
+        reader.start()
+        readers.append(reader)
+        return reader
+
+    yield create
+    for reader in readers:
+        reader.stop()
+
+
+class TestThreadedReader:
+    def test_reads_batches(self, create_reader, server):
+        reader = create_reader()
+        server.sendall(PMESSAGE * 3)
+
+        with eventlet.Timeout(TIMEOUT):
+            messages = reader.get()
+            while len(messages) < 3:
+                messages.extend(reader.get())
+
+        assert (
+            messages
+            == [{'type': 'pmessage', 'pattern': '*', 'channel': 'foo', 'data': 'set'}]
+            * 3
+        )
+        assert reader.wakeups <= 3
+
+    def test_partial_messages(self, create_reader, server):
+        reader = create_reader()
+        server.sendall(PMESSAGE[:10])
+        eventlet.sleep(0.05)
+        server.sendall(PMESSAGE[10:])
+
+        with eventlet.Timeout(TIMEOUT):
+            assert len(reader.get()) == 1
+
+    def test_limits_pending_messages(self, create_reader, server):
+        reader = create_reader(max_pending=1)
+        server.sendall(PMESSAGE)
+        eventlet.sleep(0.05)
+        server.sendall(PMESSAGE)
+        eventlet.sleep(0.05)
+
+        with eventlet.Timeout(TIMEOUT):
+            assert len(reader.get()) == 1
+            assert len(reader.get()) == 1
+
+    def test_connection_closed(self, create_reader, server):
+        reader = create_reader()
+        server.close()
+
+        with eventlet.Timeout(TIMEOUT), pytest.raises(ConnectionError):
+            reader.get()
+
+    def test_error_reply(self, create_reader, server):
+        reader = create_reader()
+        server.sendall(b'-ERR nope\r\n')
+
+        with eventlet.Timeout(TIMEOUT), pytest.raises(ResponseError):
+            reader.get()
+
+    def test_stop(self, connection, server):
+        reader = ThreadedReader(connection)
+        reader.start()
+        reader.stop()
+
+        assert not reader._thread.is_alive()
+        assert server.recv(1) == b''
+
+
+class TestDrain:
+    @pytest.fixture
+    def parser(self, connection):
+        parser = PythonParser(READ_SIZE)
+        parser.on_connect(connection)
+        connection._parser = parser
+        return parser
+
+    def test_parses_every_message_read(self, parser):
+        sock = Mock()
+        sock.recv.side_effect = [PMESSAGE * 3, PMESSAGE[:10], PMESSAGE[10:], b'']
+        pubsub = Mock(connection=Mock(_sock=sock, encoder=encoder(), _parser=parser))
+
+        messages = drain(pubsub)
+
+        for _ in range(3):
+            assert next(messages)['channel'] == 'foo'
+        assert sock.recv.call_args_list == [call(READ_SIZE)]
+        assert next(messages)['data'] == 'set'
+        assert sock.recv.call_count == 3
+        with pytest.raises(ConnectionError):
+            next(messages)
+
+    def test_without_encoder(self):
+        # Connections of redis-py 2.10
+        pubsub = Mock(connection=Mock(spec=['_sock']))
+        pubsub.listen.return_value = iter(['message'])
+
+        assert list(drain(pubsub)) == ['message']
+
+    def test_disconnected(self, connection):
+        connection._sock = None
+        pubsub = Mock(connection=connection)
+        pubsub.listen.return_value = iter(['message'])
+
+        assert list(drain(pubsub)) == ['message']
+
+    def test_replies_already_read(self, connection, parser, server):
+        server.sendall(PMESSAGE * 2)
+        assert parser.can_read(TIMEOUT)
+        pubsub = Mock(connection=connection)
+        pubsub.listen.return_value = iter(['message'])
+
+        assert list(drain(pubsub)) == ['message']
+
+    def test_hiredis_reply_already_read(self, connection):
+        connection._parser = Mock(_next_response=['pmessage'])
+        pubsub = Mock(connection=connection)
+        pubsub.listen.return_value = iter(['message'])
+
+        assert list(drain(pubsub)) == ['message']
+
+
+class TestCanReadDirectly:
+    def test_connected(self, connection):
+        connection._parser = Mock(_next_response=False, _reader=None, _buffer=None)
+
+        assert can_read_directly(connection)
+
+    def test_hiredis_partial_reply(self, connection):
+        connection._parser = Mock(_next_response=False)
+        connection._parser._reader.has_data.return_value = True
+
+        assert not can_read_directly(connection)
+
+
+class TestPubSubMessage:
+    @pytest.mark.parametrize(
+        'reply, message',
+        [
+            (
+                [b'pmessage', b'*', b'foo', b'set'],
+                {'type': 'pmessage', 'pattern': '*', 'channel': 'foo', 'data': 'set'},
+            ),
+            (
+                [b'psubscribe', b'*', 1],
+                {'type': 'psubscribe', 'pattern': None, 'channel': '*', 'data': 1},
+            ),
+            (
+                [b'message', b'__redis__:invalidate', [b'foo', b'bar']],
+                {
+                    'type': 'message',
+                    'pattern': None,
+                    'channel': '__redis__:invalidate',
+                    'data': ['foo', 'bar'],
+                },
+            ),
+            (
+                [b'pong', b''],
+                {'type': 'pong', 'pattern': None, 'channel': None, 'data': ''},
+            ),
+        ],
+    )
+    def test_message(self, reply, message):
+        assert pubsub_message(reply, encoder()) == message
+
+    def test_raw(self):
+        assert pubsub_message([b'pmessage', b'*', b'\xff', b'set'], encoder(False)) == {
+            'type': 'pmessage',
+            'pattern': b'*',
+            'channel': b'\xff',
+            'data': b'set',
+        }
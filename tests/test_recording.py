@@ -0,0 +1,197 @@
+from unittest.mock import Mock, call
+
+import pytest
+
+from nameko_rediskn.recording import (
+    LOG_MAGIC,
+    MAX_SPEED,
+    RECORD,
+    REPLAY_YIELD_INTERVAL,
+    LogFormatError,
+    NotificationLog,
+    NotificationRecorder,
+    replay,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def pmessage(key, event='set'):
+    return {
+        'type': 'pmessage',
+        'pattern': '__keyspace@0__:*',
+        'channel': '__keyspace@0__:' + key,
+        'data': event,
+    }
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('notifications.log'))
+
+
+@pytest.fixture
+def record(path, clock):
+    def record(*timed_messages):
+        recorder = NotificationRecorder(path, clock=clock)
+        for recorded_at, message in timed_messages:
+            clock.now = recorded_at
+            recorder.record(message)
+        recorder.close()
+        return recorder
+
+    return record
+
+
+class TestRecorder:
+    def test_records_notifications(self, path, record):
+        recorder = record(
+            (1.0, {'type': 'psubscribe', 'pattern': None, 'channel': '*', 'data': 1}),
+            (1.5, pmessage('foo')),
+            (
+                2.0,
+                {
+                    'type': 'pmessage',
+                    'pattern': b'__keyspace@0__:*',
+                    'channel': b'__keyspace@0__:\xff',
+                    'data': b'del',
+                },
+            ),
+        )
+
+        assert recorder.recorded == 2
+        with NotificationLog(path) as log:
+            assert list(log) == [
+                (1.5, b'__keyspace@0__:*', b'__keyspace@0__:foo', b'set'),
+                (2.0, b'__keyspace@0__:*', b'__keyspace@0__:\xff', b'del'),
+            ]
+
+    def test_compact(self, path, record):
+        record((1.0, pmessage('foo')))
+
+        with open(path, 'rb') as log:
+            data = log.read()
+
+        assert data.startswith(LOG_MAGIC)
+        assert len(data) == len(LOG_MAGIC) + RECORD.size + 16 + 18 + 3
+
+    def test_appends(self, path, record):
+        record((1.0, pmessage('foo')))
+        record((2.0, pmessage('bar')))
+
+        with NotificationLog(path) as log:
+            assert [channel for _, _, channel, _ in log] == [
+                b'__keyspace@0__:foo',
+                b'__keyspace@0__:bar',
+            ]
+
+    def test_not_a_log(self, path):
+        with open(path, 'wb') as log:
+            log.write(b'foo')
+
+        with pytest.raises(LogFormatError):
+            NotificationRecorder(path)
+
+        with pytest.raises(LogFormatError):
+            NotificationLog(path)
+
+    def test_reads_complete_records(self, path, record):
+        record((1.0, pmessage('foo')), (2.0, pmessage('bar')))
+        with open(path, 'rb+') as log:
+            log.truncate(len(log.read()) - 1)
+
+        with NotificationLog(path) as log:
+            assert len(list(log)) == 1
+
+    def test_flush(self, path):
+        recorder = NotificationRecorder(path)
+        recorder.record(pmessage('foo'))
+        recorder.flush()
+
+        with NotificationLog(path) as log:
+            assert len(list(log)) == 1
+
+        recorder.close()
+
+
+class TestReplay:
+    @pytest.fixture
+    def recorded(self, record, clock):
+        record(
+            (10.0, pmessage('foo')), (10.5, pmessage('bar')), (12.0, pmessage('baz'))
+        )
+        clock.now = 1000.0
+
+    @pytest.mark.usefixtures('recorded')
+    def test_recorded_pace(self, path, clock):
+        handled = []
+
+        def handle_message(message):
+            handled.append((clock.now, message))
+
+        assert replay(path, handle_message, clock=clock, sleep=clock.sleep) == 3
+        assert handled == [
+            (1000.0, pmessage('foo')),
+            (1000.5, pmessage('bar')),
+            (1002.0, pmessage('baz')),
+        ]
+
+    @pytest.mark.usefixtures('recorded')
+    def test_faster(self, path, clock):
+        handled = []
+
+        replay(
+            path,
+            lambda message: handled.append(clock.now),
+            speed=2,
+            clock=clock,
+            sleep=clock.sleep,
+        )
+
+        assert handled == [1000.0, 1000.25, 1001.0]
+
+    @pytest.mark.usefixtures('recorded')
+    @pytest.mark.parametrize('speed', [0, -1])
+    def test_wrong_speed(self, path, speed):
+        handle_message = Mock()
+
+        with pytest.raises(ValueError):
+            replay(path, handle_message, speed=speed)
+
+        assert handle_message.call_args_list == []
+
+    def test_max_speed(self, path, record):
+        record(*((1.0, pmessage(str(index))) for index in range(REPLAY_YIELD_INTERVAL)))
+        sleep = Mock()
+        handle_message = Mock()
+
+        replay(
+            path, handle_message, speed=MAX_SPEED, decode_responses=False, sleep=sleep
+        )
+
+        assert handle_message.call_count == REPLAY_YIELD_INTERVAL
+        assert handle_message.call_args == call(
+            {
+                'type': 'pmessage',
+                'pattern': b'__keyspace@0__:*',
+                'channel': '__keyspace@0__:{}'.format(
+                    REPLAY_YIELD_INTERVAL - 1
+                ).encode(),
+                'data': b'set',
+            }
+        )
+        assert sleep.call_args_list == [call(0)]
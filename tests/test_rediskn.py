@@ -1,12 +1,18 @@
 import logging
-from unittest.mock import MagicMock, call, patch
+from unittest.mock import MagicMock, Mock, call, patch
 
 import eventlet
 import pytest
 from eventlet import sleep
 from nameko.exceptions import ConfigurationError
-
-from nameko_rediskn import REDIS_PMESSAGE_TYPE
+from redis import ConnectionPool
+
+from nameko_rediskn import REDIS_PMESSAGE_TYPE, rediskn
+from nameko_rediskn.events import KeyspaceEvent
+from nameko_rediskn.expiry import expired_message
+from nameko_rediskn.metrics import REGISTRY, prometheus_text
+from nameko_rediskn.recording import MAX_SPEED, replay
+from nameko_rediskn.snapshot import snapshot_message
 from tests import TIME_SLEEP, TIMEOUT, URI_CONFIG_KEY, assert_items_equal
 
 
@@ -167,7 +173,7 @@ class TestErrorHandling:
         mock_pubsub_1 = MagicMock()
         mock_pubsub_2 = MagicMock()
         mock_redis_client.pubsub.side_effect = [mock_pubsub_1, mock_pubsub_2]
-        mock_pubsub_1.psubscribe.side_effect = [None, ConnectionError('Boom!')]
+        mock_pubsub_1.psubscribe.side_effect = ConnectionError('Boom!')
         event = eventlet.Event()
         mock_pubsub_2.psubscribe.return_value = None
         mock_pubsub_2.listen.side_effect = event.wait
@@ -180,13 +186,11 @@ class TestErrorHandling:
 
         assert mock_redis_client.pubsub.call_args_list == [call(), call()]
         assert mock_pubsub_1.psubscribe.call_args_list == [
-            call('__keyevent@0__:*'),
-            call('__keyspace@0__:*'),
+            call('__keyevent@0__:*', '__keyspace@0__:*')
         ]
         assert not mock_pubsub_1.listen.called
         assert mock_pubsub_2.psubscribe.call_args_list == [
-            call('__keyevent@0__:*'),
-            call('__keyspace@0__:*'),
+            call('__keyevent@0__:*', '__keyspace@0__:*')
         ]
         assert mock_pubsub_2.listen.call_args_list == [call()]
 
@@ -344,7 +348,6 @@ class TestErrorHandling:
             Exception('Error2'),
             ConnectionError('Error3'),
             TimeoutError('Error4'),
-            None,
             None,  # Subscribes successfully
         ]
         mock_pubsub.listen.side_effect = event.wait
@@ -1037,3 +1040,2319 @@ class TestListenDB:
         sleep(TIME_SLEEP)
 
         assert tracker.call_args_list == []
+
+
+class TestBatchMode:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, events='*', dbs=[0], **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    @pytest.fixture
+    def messages(self):
+        return [
+            {
+                'type': 'pmessage',
+                'pattern': '__keyevent@0__:*',
+                'channel': '__keyevent@0__:expired',
+                'data': 'foo-{}'.format(index),
+            }
+            for index in range(5)
+        ]
+
+    @pytest.mark.parametrize('batch_size', [0, -1])
+    def test_raises_if_invalid_batch_size(
+        self, create_entrypoint, log_mock, batch_size
+    ):
+        entrypoint = create_entrypoint(batch_size=batch_size)
+
+        with pytest.raises(ConfigurationError):
+            entrypoint.setup()
+
+        assert log_mock.error.call_args_list == [
+            call('`batch_size` must be a positive integer')
+        ]
+
+    def test_dispatches_batches(
+        self, create_entrypoint, mock_container, mock_pubsub, messages
+    ):
+        event = eventlet.Event()
+        mock_pubsub.listen.return_value = redis_listen(*messages, event.wait)
+        entrypoint = create_entrypoint(batch_size=2, max_batch_latency=TIME_SLEEP)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP / 2)
+
+            assert mock_container.spawn_worker.call_args_list == [
+                call(entrypoint, [messages[0:2]], {}),
+                call(entrypoint, [messages[2:4]], {}),
+            ]
+
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [messages[0:2]], {}),
+            call(entrypoint, [messages[2:4]], {}),
+            call(entrypoint, [messages[4:]], {}),
+        ]
+
+    def test_stop_dispatches_pending_messages(
+        self, create_entrypoint, mock_container, mock_pubsub, messages
+    ):
+        event = eventlet.Event()
+        mock_pubsub.listen.return_value = redis_listen(messages[0], event.wait)
+        entrypoint = create_entrypoint(batch_size=2, max_batch_latency=TIMEOUT * 2)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [[messages[0]]], {})
+        ]
+
+    def test_kill_discards_pending_messages(
+        self, create_entrypoint, mock_container, mock_pubsub, messages
+    ):
+        event = eventlet.Event()
+        mock_pubsub.listen.return_value = redis_listen(messages[0], event.wait)
+        entrypoint = create_entrypoint(batch_size=2, max_batch_latency=TIME_SLEEP)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP / 2)
+            entrypoint.kill()
+            sleep(TIME_SLEEP)
+
+        assert mock_container.spawn_worker.call_args_list == []
+
+
+class TestHandoffQueue:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, events='*', dbs=[0], **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    @pytest.fixture
+    def messages(self):
+        return [
+            {
+                'type': 'pmessage',
+                'pattern': '__keyevent@0__:*',
+                'channel': '__keyevent@0__:expired',
+                'data': 'foo-{}'.format(index),
+            }
+            for index in range(5)
+        ]
+
+    @pytest.mark.parametrize(
+        'kwargs, error_message',
+        [
+            ({'max_queue_size': 0}, '`max_queue_size` must be a positive integer'),
+            (
+                {'max_queue_size': 1, 'overflow': 'unknown'},
+                'Unknown `overflow` policy: unknown',
+            ),
+        ],
+    )
+    def test_raises_if_invalid_config(
+        self, create_entrypoint, log_mock, kwargs, error_message
+    ):
+        entrypoint = create_entrypoint(**kwargs)
+
+        with pytest.raises(ConfigurationError):
+            entrypoint.setup()
+
+        assert log_mock.error.call_args_list == [call(error_message)]
+
+    def test_keeps_reading_while_workers_are_busy(
+        self, create_entrypoint, mock_container, mock_pubsub, messages
+    ):
+        workers_free = eventlet.Event()
+        mock_container.spawn_worker.side_effect = lambda *args: workers_free.wait()
+        mock_pubsub.listen.return_value = redis_listen(*messages, eventlet.Event().wait)
+        entrypoint = create_entrypoint(max_queue_size=2, overflow='drop_oldest')
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+
+            # All the messages were read, only the last two fitted in the
+            # queue and one of them is being dispatched
+            assert entrypoint.handoff.dropped == 3
+            assert len(entrypoint.handoff) == 1
+
+            workers_free.send()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [messages[3]], {}),
+            call(entrypoint, [messages[4]], {}),
+        ]
+
+    def test_stop_hands_queued_messages_over(
+        self, create_entrypoint, mock_container, mock_pubsub, messages
+    ):
+        mock_pubsub.listen.return_value = redis_listen(*messages, eventlet.Event().wait)
+        entrypoint = create_entrypoint(max_queue_size=10, batch_size=10)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP / 2)
+            entrypoint.stop()
+
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [messages], {})
+        ]
+
+    def test_kill_before_start(self, create_entrypoint):
+        entrypoint = create_entrypoint(max_queue_size=2)
+        entrypoint.setup()
+
+        entrypoint.kill()
+
+        assert entrypoint._handoff_thread is None
+
+    def test_kill_discards_queued_messages(
+        self, create_entrypoint, mock_container, mock_pubsub, messages
+    ):
+        mock_container.spawn_worker.side_effect = lambda *args: eventlet.Event().wait()
+        mock_pubsub.listen.return_value = redis_listen(*messages, eventlet.Event().wait)
+        entrypoint = create_entrypoint(max_queue_size=10)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.kill()
+
+        assert len(entrypoint.handoff) == 0
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [messages[0]], {})
+        ]
+
+
+class TestDebounce:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, keys='*', dbs=[0], **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    @pytest.fixture
+    def messages(self):
+        return [
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@0__:*',
+                'channel': '__keyspace@0__:{}'.format(key),
+                'data': 'hset',
+            }
+            for key in ('foo', 'foo', 'bar', 'foo')
+        ]
+
+    @pytest.mark.parametrize('debounce', [0, -1])
+    def test_raises_if_invalid_debounce(self, create_entrypoint, log_mock, debounce):
+        entrypoint = create_entrypoint(debounce=debounce)
+
+        with pytest.raises(ConfigurationError):
+            entrypoint.setup()
+
+        assert log_mock.error.call_args_list == [
+            call('`debounce` must be a positive number')
+        ]
+
+    @pytest.mark.parametrize('max_wait', [0, -1])
+    def test_raises_if_invalid_max_wait(self, create_entrypoint, log_mock, max_wait):
+        entrypoint = create_entrypoint(debounce=1, max_wait=max_wait)
+
+        with pytest.raises(ConfigurationError):
+            entrypoint.setup()
+
+        assert log_mock.error.call_args_list == [
+            call('`max_wait` must be a positive number')
+        ]
+
+    def test_debounces_messages(
+        self, create_entrypoint, mock_container, mock_pubsub, messages
+    ):
+        confirmation = {
+            'type': 'psubscribe',
+            'pattern': None,
+            'channel': '__keyspace@0__:*',
+            'data': 1,
+        }
+        mock_pubsub.listen.return_value = redis_listen(
+            confirmation, *messages, eventlet.Event().wait
+        )
+        entrypoint = create_entrypoint(debounce=TIME_SLEEP / 2)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [confirmation], {}),
+            call(entrypoint, [dict(messages[3], merged=3)], {}),
+            call(entrypoint, [dict(messages[2], merged=1)], {}),
+        ]
+
+    def test_debounces_parsed_messages_into_batches(
+        self, create_entrypoint, mock_container, mock_pubsub, messages
+    ):
+        mock_pubsub.listen.return_value = redis_listen(*messages, eventlet.Event().wait)
+        entrypoint = create_entrypoint(debounce=10, parse_messages=True, batch_size=10)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            assert mock_container.spawn_worker.call_args_list == []
+            entrypoint.stop()
+
+        ((args, _),) = mock_container.spawn_worker.call_args_list
+        (batch,) = args[1]
+        assert [(event.key, event.merged) for event in batch] == [
+            ('foo', 3),
+            ('bar', 1),
+        ]
+
+
+class TestConnections:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, events='*', **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    @pytest.mark.parametrize(
+        'kwargs, error_message',
+        [
+            ({'connections': 0}, '`connections` must be a positive integer'),
+            ({'shard_by': 'unknown'}, 'Unknown `shard_by` strategy: unknown'),
+        ],
+    )
+    def test_raises_if_invalid_config(
+        self, create_entrypoint, log_mock, kwargs, error_message
+    ):
+        entrypoint = create_entrypoint(dbs=[0], **kwargs)
+
+        with pytest.raises(ConfigurationError):
+            entrypoint.setup()
+
+        assert log_mock.error.call_args_list == [call(error_message)]
+
+    def test_splits_patterns_across_connections(
+        self, create_entrypoint, mock_container, mock_redis_client
+    ):
+        pubsubs = []
+
+        def create_pubsub():
+            pubsub = MagicMock()
+            pubsub.listen.return_value = redis_listen(eventlet.Event().wait)
+            if len(pubsubs) == 1:
+                pubsub.listen.return_value = redis_listen(
+                    {
+                        'type': 'pmessage',
+                        'pattern': '__keyevent@1__:*',
+                        'channel': '__keyevent@1__:expired',
+                        'data': 'foo',
+                    },
+                    eventlet.Event().wait,
+                )
+            elif not pubsubs:
+                # The shard of db 0 fails, the other one keeps working
+                pubsub.psubscribe.side_effect = ConnectionError('Boom!')
+            pubsubs.append(pubsub)
+            return pubsub
+
+        mock_redis_client.pubsub.side_effect = create_pubsub
+        config = mock_container.config
+        config['REDIS']['pubsub_backoff_factor'] = TIME_SLEEP
+        entrypoint = create_entrypoint(dbs=[0, 1], connections=2, shard_by='db')
+        entrypoint.setup()
+
+        with patch('nameko_rediskn.rediskn.log'):
+            with eventlet.Timeout(TIMEOUT):
+                entrypoint.start()
+                sleep(TIME_SLEEP * 2)
+                entrypoint.stop()
+
+        assert pubsubs[0].psubscribe.call_args_list[0] == call('__keyevent@0__:*')
+        assert pubsubs[1].psubscribe.call_args_list == [call('__keyevent@1__:*')]
+        # The failing shard reconnected on its own
+        assert pubsubs[2].psubscribe.call_args_list == [call('__keyevent@0__:*')]
+        assert mock_container.spawn_worker.call_args_list == [
+            call(
+                entrypoint,
+                [
+                    {
+                        'type': 'pmessage',
+                        'pattern': '__keyevent@1__:*',
+                        'channel': '__keyevent@1__:expired',
+                        'data': 'foo',
+                    }
+                ],
+                {},
+            )
+        ]
+
+
+class TestPartitioned:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, keys='*', dbs=[0], **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    @pytest.fixture
+    def messages(self):
+        return [
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@0__:*',
+                'channel': '__keyspace@0__:user:{}'.format(index),
+                'data': 'set',
+            }
+            for index in range(20)
+        ]
+
+    @pytest.fixture
+    def mock_pipeline(self, mock_redis_client):
+        pipeline = mock_redis_client.pipeline.return_value
+        pipeline.execute.return_value = [1, 0, ['other-member'], 1]
+        return pipeline
+
+    def test_only_dispatches_owned_keys(
+        self,
+        create_entrypoint,
+        mock_container,
+        mock_redis_client,
+        mock_pubsub,
+        mock_pipeline,
+        messages,
+    ):
+        confirmation = {
+            'type': 'psubscribe',
+            'pattern': None,
+            'channel': '__keyspace@0__:*',
+            'data': 1,
+        }
+        mock_pubsub.listen.return_value = redis_listen(
+            confirmation, *messages, eventlet.Event().wait
+        )
+        entrypoint = create_entrypoint(partitioned=True)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        membership = entrypoint.membership
+        assert membership.group == 'MockService.test_method'
+        assert membership.ring.members == {membership.member_id, 'other-member'}
+        owned = [
+            message
+            for message in messages
+            if membership.ring.owner(message['channel'].split(':', 1)[1])
+            == membership.member_id
+        ]
+        assert 0 < len(owned) < len(messages)
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [confirmation], {})
+        ] + [call(entrypoint, [message], {}) for message in owned]
+        assert mock_redis_client.execute_command.call_args_list == [
+            call(
+                'ZREM', 'rediskn:members:MockService.test_method', membership.member_id
+            )
+        ]
+
+    def test_heartbeats(self, create_entrypoint, mock_pubsub, mock_pipeline):
+        mock_pubsub.listen.return_value = redis_listen(eventlet.Event().wait)
+        entrypoint = create_entrypoint(
+            partitioned=True, heartbeat_interval=TIME_SLEEP / 4
+        )
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            mock_pipeline.execute.return_value = [1, 0, [], 1]
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_pipeline.execute.call_count >= 4
+        assert entrypoint.membership.ring.members == {entrypoint.membership.member_id}
+
+    def test_joins_even_if_redis_is_down(
+        self, create_entrypoint, mock_container, mock_pubsub, mock_pipeline, messages
+    ):
+        mock_pipeline.execute.side_effect = ConnectionError('Boom!')
+        mock_pubsub.listen.return_value = redis_listen(*messages, eventlet.Event().wait)
+        entrypoint = create_entrypoint(partitioned=True)
+        entrypoint.setup()
+
+        with patch('nameko_rediskn.rediskn.log') as log_mock:
+            with eventlet.Timeout(TIMEOUT):
+                entrypoint.start()
+                sleep(TIME_SLEEP)
+                entrypoint.stop()
+
+        assert log_mock.exception.call_args_list == [
+            call('Error joining %s', 'MockService.test_method')
+        ]
+        # It owns every key until it knows about the rest of the members
+        assert len(mock_container.spawn_worker.call_args_list) == len(messages)
+
+
+class TestCluster:
+    @pytest.fixture
+    def config(self, config):
+        config['REDIS']['cluster'] = True
+        return config
+
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, events='expired', **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    def test_raises_if_shared_pubsub(self, create_entrypoint, config, log_mock):
+        config['REDIS']['shared_pubsub'] = True
+        entrypoint = create_entrypoint()
+
+        with pytest.raises(ConfigurationError):
+            entrypoint.setup()
+
+        assert log_mock.error.call_args_list == [
+            call('`cluster` and `shared_pubsub` can not be used together')
+        ]
+
+    def test_listens_to_every_master(
+        self, create_entrypoint, mock_container, mock_redis_client
+    ):
+        mock_redis_client.connection_pool = ConnectionPool(host='seed', port=7000, db=0)
+        mock_redis_client.execute_command.return_value = [
+            [0, 8191, ['node-1', 7000, 'id']],
+            [8192, 16383, ['node-2', 7001, 'id']],
+        ]
+        node_clients = {}
+
+        def create_node_client(connection_pool):
+            host = connection_pool.connection_kwargs['host']
+            node_client = node_clients[host] = MagicMock()
+            node_client.pubsub.return_value.listen.return_value = redis_listen(
+                {
+                    'type': 'pmessage',
+                    'pattern': '__keyevent@0__:expired',
+                    'channel': '__keyevent@0__:expired',
+                    'data': 'key-{}'.format(host),
+                },
+                eventlet.Event().wait,
+            )
+            return node_client
+
+        entrypoint = create_entrypoint()
+        entrypoint.setup()
+
+        with patch('nameko_rediskn.cluster.StrictRedis') as mock_node_redis:
+            mock_node_redis.side_effect = create_node_client
+            with eventlet.Timeout(TIMEOUT):
+                entrypoint.start()
+                sleep(TIME_SLEEP)
+                entrypoint.stop()
+
+        assert sorted(node_clients) == ['node-1', 'node-2']
+        for node_client in node_clients.values():
+            assert node_client.config_set.call_args_list == [
+                call('notify-keyspace-events', 'KEA')
+            ]
+        payloads = [
+            args[1][0]['data'] for args, _ in mock_container.spawn_worker.call_args_list
+        ]
+        assert sorted(payloads) == ['key-node-1', 'key-node-2']
+
+
+class TestStreamSubscribe:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            return rediskn.RedisKNStreamEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, stream='notifications', **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    @pytest.fixture
+    def commands(self, mock_redis_client):
+        replies = {
+            'XGROUP': [True],
+            'XPENDING': [[]],
+            'XREADGROUP': [[]],
+            'XCLAIM': [[]],
+            'XACK': [1],
+            'XINFO': [[]],
+        }
+
+        def execute_command(command, *args, **kwargs):
+            reply = replies[command]
+            if len(reply) > 1:
+                return reply.pop(0)
+            if command == 'XREADGROUP':
+                # Block like XREADGROUP does when there are no entries
+                sleep(TIME_SLEEP / 4)
+            return reply[0]
+
+        mock_redis_client.execute_command.side_effect = execute_command
+        return replies
+
+    @pytest.fixture
+    def entry(self):
+        return (
+            '1-0',
+            {
+                'pattern': '__keyevent@0__:*',
+                'channel': '__keyevent@0__:expired',
+                'data': 'foo',
+            },
+        )
+
+    def test_consumes_entries(
+        self, create_entrypoint, mock_container, mock_redis_client, commands, entry
+    ):
+        commands['XREADGROUP'].insert(0, [['notifications', [entry]]])
+        entrypoint = create_entrypoint(bridge=False)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        message = dict(entry[1], type='pmessage', id='1-0')
+        ((args, kwargs),) = mock_container.spawn_worker.call_args_list
+        assert args == (entrypoint, [message], {})
+
+        result = kwargs['handle_result'](Mock(), 'result', None)
+
+        assert result == ('result', None)
+        calls = mock_redis_client.execute_command.call_args_list
+        assert calls[0] == call(
+            'XGROUP',
+            'CREATE',
+            'notifications',
+            'MockService.test_method',
+            '$',
+            'MKSTREAM',
+        )
+        assert calls[1] == call(
+            'XPENDING',
+            'notifications',
+            'MockService.test_method',
+            '-',
+            '+',
+            100,
+            parse_detail=True,
+        )
+        assert calls[2] == call(
+            'XINFO', 'CONSUMERS', 'notifications', 'MockService.test_method'
+        )
+        assert calls[3] == call(
+            'XREADGROUP',
+            'GROUP',
+            'MockService.test_method',
+            entrypoint.consumer,
+            'COUNT',
+            100,
+            'BLOCK',
+            1000,
+            'STREAMS',
+            'notifications',
+            '>',
+        )
+        assert calls[-1] == call(
+            'XACK', 'notifications', 'MockService.test_method', '1-0'
+        )
+
+    def test_does_not_ack_failed_entries(
+        self, create_entrypoint, mock_container, mock_redis_client, commands, entry
+    ):
+        commands['XREADGROUP'].insert(0, [['notifications', [entry]]])
+        entrypoint = create_entrypoint(bridge=False)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        ((_, kwargs),) = mock_container.spawn_worker.call_args_list
+        exc_info = (ValueError, ValueError('Boom!'), None)
+        kwargs['handle_result'](Mock(), None, exc_info)
+
+        commands = [
+            args[0] for args, _ in mock_redis_client.execute_command.call_args_list
+        ]
+        assert 'XACK' not in commands
+
+    def test_reclaims_idle_entries(
+        self, create_entrypoint, mock_container, mock_redis_client, commands, entry
+    ):
+        commands['XPENDING'].insert(
+            0,
+            [
+                {
+                    'message_id': '1-0',
+                    'time_since_delivered': 200,
+                    'times_delivered': 1,
+                },
+                {
+                    'message_id': '2-0',
+                    'time_since_delivered': 10,
+                    'times_delivered': 1,
+                },
+            ],
+        )
+        commands['XCLAIM'].insert(0, [entry])
+        entrypoint = create_entrypoint(bridge=False, claim_idle=100)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP / 2)
+            entrypoint.stop()
+
+        assert (
+            call(
+                'XCLAIM',
+                'notifications',
+                'MockService.test_method',
+                entrypoint.consumer,
+                100,
+                '1-0',
+            )
+            in mock_redis_client.execute_command.call_args_list
+        )
+        ((args, _),) = mock_container.spawn_worker.call_args_list
+        assert args[1] == [dict(entry[1], type='pmessage', id='1-0')]
+
+    def test_bridges_notifications(
+        self, create_entrypoint, mock_redis_client, mock_pubsub, commands
+    ):
+        mock_redis_client.set.return_value = True
+        messages = [
+            {
+                'type': 'pmessage',
+                'pattern': '__keyevent@0__:*',
+                'channel': '__keyevent@0__:expired',
+                'data': 'foo-{}'.format(index),
+            }
+            for index in range(2)
+        ]
+        mock_pubsub.listen.return_value = redis_listen(*messages, eventlet.Event().wait)
+        entrypoint = create_entrypoint(events='*', dbs=[0], maxlen=10)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_redis_client.set.call_args_list[0] == call(
+            'rediskn:bridge:notifications',
+            entrypoint.election.member_id,
+            nx=True,
+            px=5000,
+        )
+        pipeline = mock_redis_client.pipeline.return_value
+        assert pipeline.execute_command.call_args_list == [
+            call(
+                'XADD',
+                'notifications',
+                'MAXLEN',
+                '~',
+                10,
+                '*',
+                'pattern',
+                '__keyevent@0__:*',
+                'channel',
+                '__keyevent@0__:expired',
+                'data',
+                'foo-{}'.format(index),
+            )
+            for index in range(2)
+        ]
+        assert pipeline.execute.call_count == 1
+        # The leadership is released on stop
+        assert mock_redis_client.eval.call_count == 1
+
+    @pytest.mark.parametrize(
+        'kwargs',
+        [
+            {'batch_size': 10},
+            {'parse_messages': True},
+            {'max_queue_size': 10},
+            {'debounce': 1},
+            {'partitioned': True},
+            {'track_expiry': True, 'keys': 'foo'},
+            {'tracking': True, 'keys': 'foo', 'events': []},
+            {'fetch': 'value'},
+            {'lag_probe': 1},
+            {'record': 'notifications.log'},
+        ],
+    )
+    def test_unsupported_settings(self, create_entrypoint, kwargs):
+        entrypoint = create_entrypoint(**dict({'events': '*', 'dbs': [0]}, **kwargs))
+
+        with pytest.raises(ConfigurationError) as exc:
+            entrypoint.setup()
+
+        (name,) = set(kwargs) - {'keys', 'events'}
+        assert str(exc.value) == '`{}` can not be used with `stream_subscribe`'.format(
+            name
+        )
+
+    @pytest.mark.parametrize('max_deliveries', [0, -1])
+    def test_raises_if_invalid_max_deliveries(self, create_entrypoint, max_deliveries):
+        entrypoint = create_entrypoint(bridge=False, max_deliveries=max_deliveries)
+
+        with pytest.raises(ConfigurationError) as exc:
+            entrypoint.setup()
+
+        assert str(exc.value) == '`max_deliveries` must be a positive integer'
+
+    def test_gives_up_on_entries(
+        self, create_entrypoint, mock_container, mock_redis_client, commands, entry
+    ):
+        exhausted = ('2-0', dict(entry[1], data='bar'))
+        commands['XPENDING'].insert(
+            0,
+            [
+                {
+                    'message_id': '1-0',
+                    'time_since_delivered': 200,
+                    'times_delivered': 2,
+                },
+                {
+                    'message_id': '2-0',
+                    'time_since_delivered': 200,
+                    'times_delivered': 3,
+                },
+            ],
+        )
+        commands['XCLAIM'].insert(0, [entry, exhausted])
+        entrypoint = create_entrypoint(
+            bridge=False, claim_idle=100, max_deliveries=3, dead_letter_stream='dead'
+        )
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP / 2)
+            entrypoint.stop()
+
+        ((args, _),) = mock_container.spawn_worker.call_args_list
+        assert args[1] == [dict(entry[1], type='pmessage', id='1-0')]
+        pipeline = mock_redis_client.pipeline.return_value
+        assert pipeline.execute_command.call_args_list == [
+            call(
+                'XADD',
+                'dead',
+                'MAXLEN',
+                '~',
+                entrypoint.maxlen,
+                '*',
+                'id',
+                '2-0',
+                'pattern',
+                '__keyevent@0__:*',
+                'channel',
+                '__keyevent@0__:expired',
+                'data',
+                'bar',
+            ),
+            call('XACK', 'notifications', 'MockService.test_method', '2-0'),
+        ]
+        assert pipeline.execute.call_count == 1
+
+    def test_removes_consumer_on_stop(
+        self, create_entrypoint, mock_redis_client, commands
+    ):
+        entrypoint = create_entrypoint(bridge=False)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP / 2)
+            entrypoint.stop()
+
+        calls = mock_redis_client.execute_command.call_args_list
+        assert calls[-2:] == [
+            call(
+                'XPENDING',
+                'notifications',
+                'MockService.test_method',
+                '-',
+                '+',
+                1,
+                entrypoint.consumer,
+            ),
+            call(
+                'XGROUP',
+                'DELCONSUMER',
+                'notifications',
+                'MockService.test_method',
+                entrypoint.consumer,
+            ),
+        ]
+        # The connections of the killed consumer are not reused
+        assert mock_redis_client.connection_pool.disconnect.called
+
+    def test_keeps_consumer_with_pending_entries(
+        self, create_entrypoint, mock_redis_client, commands
+    ):
+        commands['XPENDING'][:0] = [[], [['1-0', 'consumer', 10, 1]]]
+        entrypoint = create_entrypoint(bridge=False)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP / 2)
+            entrypoint.stop()
+
+        calls = mock_redis_client.execute_command.call_args_list
+        assert calls[-1][0][0] == 'XPENDING'
+        assert ('XGROUP', 'DELCONSUMER') not in {args[:2] for args, _ in calls}
+
+    def test_removes_idle_consumers(
+        self, create_entrypoint, mock_redis_client, commands
+    ):
+        entrypoint = create_entrypoint(bridge=False, claim_idle=100)
+        commands['XINFO'].insert(
+            0,
+            [
+                {'name': 'dead', 'pending': 0, 'idle': 200},
+                {'name': 'busy', 'pending': 1, 'idle': 200},
+                {'name': entrypoint.consumer, 'pending': 0, 'idle': 200},
+            ],
+        )
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP / 2)
+            entrypoint.kill()
+
+        deleted = [
+            args[4]
+            for args, _ in mock_redis_client.execute_command.call_args_list
+            if args[:2] == ('XGROUP', 'DELCONSUMER')
+        ]
+        assert deleted == ['dead']
+
+    def test_does_not_bridge_if_not_elected(
+        self, create_entrypoint, mock_redis_client, mock_pubsub, commands
+    ):
+        mock_redis_client.set.return_value = None
+        entrypoint = create_entrypoint(events='*', dbs=[0])
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_redis_client.pubsub.call_args_list == []
+        assert mock_redis_client.eval.call_args_list == []
+
+
+class TestSnapshot:
+    def test_raises_if_shared_pubsub(self, mock_container, config, log_mock):
+        config['REDIS']['shared_pubsub'] = True
+        entrypoint = rediskn.RedisKNEntrypoint(
+            uri_config_key=URI_CONFIG_KEY, keys='user:*', dbs=[0], snapshot=True
+        ).bind(mock_container, 'test_method')
+
+        with pytest.raises(ConfigurationError):
+            entrypoint.setup()
+
+        assert log_mock.error.call_args_list == [
+            call('`snapshot` and `shared_pubsub` can not be used together')
+        ]
+
+    def test_emits_snapshot_before_live_notifications(
+        self, mock_container, mock_redis_client, mock_pubsub
+    ):
+        mock_redis_client.connection_pool = ConnectionPool(db=0)
+        mock_redis_client.scan.return_value = (0, ['user:1'])
+        mock_redis_client.pipeline.return_value.execute.return_value = ['hash', -1]
+        live_message = {
+            'type': 'pmessage',
+            'pattern': '__keyspace@0__:user:*',
+            'channel': '__keyspace@0__:user:2',
+            'data': 'set',
+        }
+        mock_pubsub.listen.return_value = redis_listen(
+            {
+                'type': 'psubscribe',
+                'pattern': None,
+                'channel': '__keyspace@0__:user:*',
+                'data': 1,
+            },
+            live_message,
+            eventlet.Event().wait,
+        )
+        entrypoint = rediskn.RedisKNEntrypoint(
+            uri_config_key=URI_CONFIG_KEY,
+            keys='user:*',
+            dbs=[0],
+            snapshot=True,
+            scan_count=10,
+            parse_messages=True,
+        ).bind(mock_container, 'test_method')
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_redis_client.scan.call_args_list == [
+            call(0, match='user:*', count=10)
+        ]
+        events = [args[1][0] for args, _ in mock_container.spawn_worker.call_args_list]
+        assert [(event.key, event.event, event.synthetic) for event in events] == [
+            ('user:1', 'snapshot', True),
+            ('user:2', 'set', False),
+        ]
+        assert (events[0].key_type, events[0].pttl) == ('hash', -1)
+
+    def test_keeps_reading_while_scanning(
+        self, mock_container, mock_redis_client, mock_pubsub
+    ):
+        mock_redis_client.connection_pool = ConnectionPool(db=0)
+        scanned = eventlet.Event()
+
+        def scan(*args, **kwargs):
+            scanned.wait()
+            return (0, ['user:1'])
+
+        mock_redis_client.scan.side_effect = scan
+        mock_redis_client.pipeline.return_value.execute.return_value = ['hash', -1]
+        read = eventlet.Event()
+        mock_pubsub.listen.return_value = redis_listen(
+            {
+                'type': 'psubscribe',
+                'pattern': None,
+                'channel': '__keyspace@0__:user:*',
+                'data': 1,
+            },
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@0__:user:*',
+                'channel': '__keyspace@0__:user:2',
+                'data': 'set',
+            },
+            read.send,
+            eventlet.Event().wait,
+        )
+        entrypoint = rediskn.RedisKNEntrypoint(
+            uri_config_key=URI_CONFIG_KEY,
+            keys='user:*',
+            dbs=[0],
+            snapshot=True,
+            parse_messages=True,
+        ).bind(mock_container, 'test_method')
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            read.wait()
+            sleep(TIME_SLEEP)
+            assert mock_container.spawn_worker.call_args_list == []
+
+            scanned.send()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        events = [args[1][0] for args, _ in mock_container.spawn_worker.call_args_list]
+        assert [(event.key, event.event) for event in events] == [
+            ('user:1', 'snapshot'),
+            ('user:2', 'set'),
+        ]
+
+
+class TestExpiryTracking:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            kwargs.setdefault('keys', 'user:*')
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, dbs=[0], track_expiry=True, **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    @staticmethod
+    def message(key, event):
+        return {
+            'type': 'pmessage',
+            'pattern': '__keyspace@0__:user:*',
+            'channel': '__keyspace@0__:{}'.format(key),
+            'data': event,
+        }
+
+    @pytest.mark.parametrize(
+        'kwargs, error_message',
+        [
+            ({'keys': [], 'events': '*'}, '`track_expiry` requires `keys` to watch'),
+            ({'expiry_action': 'unknown'}, 'Unknown `expiry_action`: unknown'),
+        ],
+    )
+    def test_wrong_settings(self, create_entrypoint, kwargs, error_message):
+        entrypoint = create_entrypoint(**kwargs)
+
+        with pytest.raises(ConfigurationError) as exc:
+            entrypoint.setup()
+
+        assert str(exc.value) == error_message
+
+    def test_dispatches_expired_at_deadline(
+        self, create_entrypoint, mock_container, mock_redis_client, mock_pubsub
+    ):
+        mock_redis_client.connection_pool = ConnectionPool(db=0)
+        mock_redis_client.pipeline.return_value.execute.return_value = [
+            TIME_SLEEP * 1000
+        ]
+        mock_pubsub.listen.return_value = redis_listen(
+            self.message('user:1', 'expire'), eventlet.Event().wait
+        )
+        entrypoint = create_entrypoint(expiry_action='dispatch', parse_messages=True)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP * 2)
+            # Redis gets to expire the key later on
+            entrypoint.handle_message(self.message('user:1', 'expired'))
+            entrypoint.stop()
+
+        events = [args[1][0] for args, _ in mock_container.spawn_worker.call_args_list]
+        assert [(event.key, event.event, event.synthetic) for event in events] == [
+            ('user:1', 'expire', False),
+            ('user:1', 'expired', True),
+        ]
+
+    def test_touches_keys_at_deadline(
+        self, create_entrypoint, mock_container, mock_redis_client, mock_pubsub
+    ):
+        mock_redis_client.connection_pool = ConnectionPool(db=0)
+        pipeline = mock_redis_client.pipeline.return_value
+        pipeline.execute.side_effect = [[TIME_SLEEP * 1000], [0]]
+        mock_pubsub.listen.return_value = redis_listen(
+            self.message('user:1', 'expire'), eventlet.Event().wait
+        )
+        entrypoint = create_entrypoint()
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP * 2)
+            entrypoint.stop()
+
+        assert pipeline.pttl.call_args_list == [call('user:1')]
+        assert pipeline.exists.call_args_list == [call('user:1')]
+        # Only the notifications published by Redis are dispatched
+        assert mock_container.spawn_worker.call_count == 1
+
+
+class TestTracking:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            kwargs.setdefault('keys', 'user:*')
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, dbs=[0], tracking=True, **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    @pytest.mark.parametrize(
+        'kwargs, error_message',
+        [
+            ({'events': '*'}, '`tracking` only works with `keys`'),
+            (
+                {'track_expiry': True},
+                '`tracking` can not be used with `cluster` or `track_expiry`',
+            ),
+        ],
+    )
+    def test_wrong_settings(self, create_entrypoint, kwargs, error_message):
+        entrypoint = create_entrypoint(**kwargs)
+
+        with pytest.raises(ConfigurationError) as exc:
+            entrypoint.setup()
+
+        assert str(exc.value) == error_message
+
+    def test_dispatches_invalidations(
+        self, create_entrypoint, mock_container, mock_redis_client, mock_pubsub
+    ):
+        connection = mock_redis_client.connection_pool.get_connection.return_value
+        connection.read_response.side_effect = [42, 'OK']
+        mock_pubsub.listen.return_value = redis_listen(
+            {
+                'type': 'subscribe',
+                'pattern': None,
+                'channel': '__redis__:invalidate',
+                'data': 1,
+            },
+            {
+                'type': 'message',
+                'pattern': None,
+                'channel': '__redis__:invalidate',
+                'data': ['user:1', 'session:1'],
+            },
+            eventlet.Event().wait,
+        )
+        entrypoint = create_entrypoint(keys=['user:*', 'user:1:*'])
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_pubsub.connection is connection
+        assert connection.send_command.call_args_list == [
+            call('CLIENT', 'ID'),
+            call(
+                'CLIENT', 'TRACKING', 'ON', 'REDIRECT', 42, 'BCAST', 'PREFIX', 'user:'
+            ),
+        ]
+        assert mock_pubsub.subscribe.call_args_list == [call('__redis__:invalidate')]
+        assert mock_pubsub.psubscribe.call_args_list == []
+        messages = [
+            args[1][0] for args, _ in mock_container.spawn_worker.call_args_list
+        ]
+        assert messages == [
+            {
+                'type': 'psubscribe',
+                'pattern': None,
+                'channel': '__redis__:invalidate',
+                'data': 1,
+            },
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@*__:user:*',
+                'channel': '__keyspace@*__:user:1',
+                'data': 'invalidate',
+            },
+        ]
+
+    def test_does_not_share_pubsub(self, create_entrypoint, config):
+        config['REDIS'] = {'shared_pubsub': True}
+        entrypoint = create_entrypoint()
+        entrypoint.setup()
+
+        assert not entrypoint._shared_pubsub
+
+
+class TestFetch:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, keys='user:*', dbs=[0], **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    @pytest.mark.parametrize(
+        'kwargs, error_message',
+        [
+            ({'fetch': 'unknown'}, 'Unknown `fetch`: unknown'),
+            (
+                {'fetch': 'value', 'fetch_size': 0},
+                '`fetch_size` must be a positive integer',
+            ),
+            (
+                {'fetch': 'value', 'tracking': True},
+                '`fetch` can not be used with `tracking`',
+            ),
+        ],
+    )
+    def test_wrong_settings(self, create_entrypoint, kwargs, error_message):
+        entrypoint = create_entrypoint(**kwargs)
+
+        with pytest.raises(ConfigurationError) as exc:
+            entrypoint.setup()
+
+        assert str(exc.value) == error_message
+
+    def test_attaches_fetched_values(
+        self, create_entrypoint, mock_container, mock_redis_client, mock_pubsub
+    ):
+        mock_redis_client.connection_pool = ConnectionPool(db=0)
+        mock_redis_client.mget.return_value = ['foo', 'bar']
+        mock_pubsub.listen.return_value = redis_listen(
+            *(
+                {
+                    'type': 'pmessage',
+                    'pattern': '__keyspace@0__:user:*',
+                    'channel': '__keyspace@0__:user:{}'.format(index),
+                    'data': 'set',
+                }
+                for index in range(2)
+            ),
+            eventlet.Event().wait,
+        )
+        entrypoint = create_entrypoint(
+            fetch='value', parse_messages=True, batch_size=10
+        )
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_redis_client.mget.call_args_list == [call(['user:0', 'user:1'])]
+        ((args, _),) = mock_container.spawn_worker.call_args_list
+        assert [(event.key, event.value) for event in args[1][0]] == [
+            ('user:0', 'foo'),
+            ('user:1', 'bar'),
+        ]
+
+
+class TestMetrics:
+    @pytest.fixture(autouse=True)
+    def registry(self):
+        REGISTRY.clear()
+        yield REGISTRY
+        REGISTRY.clear()
+
+    @pytest.fixture
+    def mock_sleep(self):
+        with patch('nameko_rediskn.rediskn.sleep') as m:
+            yield m
+
+    @pytest.fixture
+    def workers(self, mock_container):
+        # Workers run as in nameko, `run` standing for the dependency
+        # injection and the service method
+        mock_container._worker_threads = {}
+        run = Mock(side_effect=lambda: eventlet.Event().wait())
+
+        def run_worker(worker_ctx, handle_result):
+            handle_result(worker_ctx, run(), None)
+
+        def spawn_worker(entrypoint, args, kwargs, handle_result):
+            worker_ctx = Mock()
+            thread = eventlet.spawn(run_worker, worker_ctx, handle_result)
+            mock_container._worker_threads[worker_ctx] = thread
+            return worker_ctx
+
+        mock_container.spawn_worker.side_effect = spawn_worker
+        mock_container.run = run
+        return mock_container._worker_threads
+
+    def test_disabled_by_default(self, entrypoint, mock_container):
+        entrypoint.setup()
+        entrypoint._dispatch('message')
+
+        assert entrypoint.metrics is None
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, ['message'], {})
+        ]
+
+    def test_records(
+        self, entrypoint, config, mock_container, mock_pubsub, mock_sleep, workers
+    ):
+        config['REDIS'] = {'metrics': True, 'pubsub_backoff_factor': 3}
+        mock_pubsub.listen.side_effect = [
+            ConnectionError('Boom!'),
+            redis_listen(
+                {
+                    'type': 'psubscribe',
+                    'pattern': None,
+                    'channel': '__keyspace@0__:*',
+                    'data': 2,
+                },
+                *(
+                    {
+                        'type': 'pmessage',
+                        'pattern': '__keyspace@0__:*',
+                        'channel': '__keyspace@0__:foo',
+                        'data': 'set',
+                    }
+                    for _ in range(2)
+                ),
+                eventlet.Event().wait,
+            ),
+        ]
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        metrics = entrypoint.metrics
+        labels = ('MockService.test_method',)
+        assert metrics.notifications.values == {
+            ('MockService.test_method', '0', 'set'): 2
+        }
+        # The subscription confirmation is dispatched too
+        assert metrics.dispatched.values == {labels: 3}
+        assert metrics.workers.values == {labels: 3}
+        assert metrics.reconnects.values == {labels: 1}
+        assert metrics.errors.values == {labels: 0}
+        assert metrics.patterns.values == {labels: 2}
+
+        next(iter(workers.values())).kill()
+        assert metrics.workers.values == {labels: 2}
+        assert 'rediskn_notifications_total{' in REGISTRY.export(prometheus_text)
+
+    def test_worker_fails_before_result(
+        self, entrypoint, config, mock_container, workers
+    ):
+        config['REDIS'] = {'metrics': True}
+        mock_container.run.side_effect = Exception('Boom!')
+        entrypoint.setup()
+
+        entrypoint._dispatch('message')
+        assert entrypoint.metrics.workers.values == {('MockService.test_method',): 1}
+
+        sleep(TIME_SLEEP)
+
+        assert entrypoint.metrics.workers.values == {('MockService.test_method',): 0}
+
+    def test_worker_handles_result(self, entrypoint, config, mock_container, workers):
+        config['REDIS'] = {'metrics': True}
+        mock_container.run.side_effect = None
+        entrypoint.setup()
+
+        entrypoint._dispatch('message')
+        sleep(TIME_SLEEP)
+
+        # Decremented once, by `handle_result`
+        assert entrypoint.metrics.workers.values == {('MockService.test_method',): 0}
+
+    def test_worker_already_finished(self, entrypoint, config, mock_container):
+        config['REDIS'] = {'metrics': True}
+        mock_container._worker_threads = {}
+
+        def spawn_worker(entrypoint, args, kwargs, handle_result):
+            worker_ctx = Mock()
+            handle_result(worker_ctx, 'result', None)
+            return worker_ctx
+
+        mock_container.spawn_worker.side_effect = spawn_worker
+        entrypoint.setup()
+
+        entrypoint._dispatch('message')
+
+        assert entrypoint.metrics.workers.values == {('MockService.test_method',): 0}
+
+
+class TestLagProbe:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, keys='*', dbs=[0], **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    @pytest.mark.parametrize(
+        'kwargs, error_message',
+        [
+            ({'lag_probe': 0}, '`lag_probe` must be a positive number'),
+            ({'lag_threshold': 1}, '`lag_threshold` requires `lag_probe`'),
+            (
+                {'lag_probe': 1, 'shed_load': True},
+                '`shed_load` requires `lag_threshold`',
+            ),
+            (
+                {'lag_probe': 1, 'tracking': True},
+                '`lag_probe` can not be used with `cluster` or `tracking`',
+            ),
+        ],
+    )
+    def test_wrong_settings(self, create_entrypoint, kwargs, error_message):
+        entrypoint = create_entrypoint(**kwargs)
+
+        with pytest.raises(ConfigurationError) as exc:
+            entrypoint.setup()
+
+        assert str(exc.value) == error_message
+
+    def canary(self, entrypoint, pattern=None):
+        channel = '__keyspace@0__:{}'.format(entrypoint.lag.key)
+        return {
+            'type': 'pmessage',
+            'pattern': channel if pattern is None else pattern,
+            'channel': channel,
+            'data': 'set',
+        }
+
+    def test_measures_lag(
+        self, create_entrypoint, mock_container, mock_redis_client, mock_pubsub
+    ):
+        message = {
+            'type': 'pmessage',
+            'pattern': '__keyspace@0__:*',
+            'channel': '__keyspace@0__:foo',
+            'data': 'set',
+        }
+        mock_pubsub.listen.return_value = redis_listen(
+            lambda: self.canary(entrypoint),
+            lambda: self.canary(entrypoint, pattern='__keyspace@0__:*'),
+            message,
+            eventlet.Event().wait,
+        )
+        entrypoint = create_entrypoint(lag_probe=10, max_queue_size=10)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        key = entrypoint.lag.key
+        assert key.startswith('__rediskn:canary:MockService.test_method:')
+        assert mock_pubsub.subscribe.call_args_list == [
+            call('__keyspace@0__:{}'.format(key))
+        ]
+        assert mock_redis_client.set.call_args_list == [
+            call(key, mock_redis_client.set.call_args[0][1], ex=60)
+        ]
+        assert len(entrypoint.lag.samples) == 1
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [message], {})
+        ]
+        mock_redis_client.delete.assert_called_once_with(key)
+
+    def test_sheds_load(self, create_entrypoint, mock_container, mock_pubsub):
+        def lagging():
+            entrypoint.lag.lagging = True
+            return message
+
+        message = {
+            'type': 'pmessage',
+            'pattern': '__keyspace@0__:*',
+            'channel': '__keyspace@0__:foo',
+            'data': 'set',
+        }
+        mock_pubsub.listen.return_value = redis_listen(
+            message, lagging, message, eventlet.Event().wait
+        )
+        entrypoint = create_entrypoint(lag_probe=10, lag_threshold=1, shed_load=True)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [message], {})
+        ]
+        assert entrypoint.lag.shed == 2
+
+
+class TestRecording:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            return rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, keys='*', dbs=[0], **kwargs
+            ).bind(mock_container, 'test_method')
+
+        return create
+
+    def test_record_and_replay(
+        self, create_entrypoint, mock_container, mock_pubsub, tmpdir
+    ):
+        path = str(tmpdir.join('notifications.log'))
+        messages = [
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@0__:*',
+                'channel': '__keyspace@0__:{}'.format(key),
+                'data': 'set',
+            }
+            for key in ('foo', 'bar')
+        ]
+        mock_pubsub.listen.return_value = redis_listen(
+            {
+                'type': 'psubscribe',
+                'pattern': None,
+                'channel': '__keyspace@0__:*',
+                'data': 1,
+            },
+            messages[0],
+            lambda: dict(
+                messages[0], channel='__keyspace@0__:{}'.format(entrypoint.lag.key)
+            ),
+            messages[1],
+            eventlet.Event().wait,
+        )
+        entrypoint = create_entrypoint(record=path, lag_probe=10)
+        entrypoint.setup()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert entrypoint.recorder.recorded == 2
+        mock_container.spawn_worker.reset_mock()
+
+        replayer = create_entrypoint(parse_messages=True)
+        replayer.setup()
+
+        assert replay(path, replayer.handle_message, speed=MAX_SPEED) == 2
+        assert [
+            (event.key, event.event)
+            for (_, (event,), _), _ in mock_container.spawn_worker.call_args_list
+        ] == [('foo', 'set'), ('bar', 'set')]
+
+    def test_does_not_record_synthetic_notifications(
+        self, create_entrypoint, mock_pubsub, tmpdir
+    ):
+        entrypoint = create_entrypoint(record=str(tmpdir.join('notifications.log')))
+        entrypoint.setup()
+        entrypoint.start()
+
+        entrypoint.handle_message(expired_message(0, 'foo'))
+        entrypoint.handle_message(
+            snapshot_message('__keyspace@0__:*', 0, 'bar', 'string', -1)
+        )
+        entrypoint.stop()
+
+        assert entrypoint.recorder.recorded == 0
+
+    def test_tracking(self, create_entrypoint):
+        entrypoint = create_entrypoint(record='notifications.log', tracking=True)
+
+        with pytest.raises(ConfigurationError) as exc:
+            entrypoint.setup()
+
+        assert str(exc.value) == '`record` can not be used with `tracking`'
+
+
+class TestSharedPubSub:
+    @pytest.fixture(autouse=True)
+    def shared_pubsubs(self):
+        yield rediskn._shared_pubsubs
+        leftovers = dict(rediskn._shared_pubsubs)
+        for shared_pubsub in leftovers.values():
+            shared_pubsub.close()
+        rediskn._shared_pubsubs.clear()
+        assert leftovers == {}
+
+    @pytest.fixture
+    def config(self, config):
+        config['REDIS']['shared_pubsub'] = True
+        return config
+
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(container=mock_container, **kwargs):
+            entrypoint = rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, **kwargs
+            ).bind(container, 'test_method')
+            entrypoint.setup()
+            return entrypoint
+
+        return create
+
+    def test_shares_connection(
+        self, create_entrypoint, mock_strict_redis, mock_pubsub, shared_pubsubs
+    ):
+        mock_pubsub.listen.side_effect = eventlet.Event().wait
+        entrypoint_1 = create_entrypoint(events='expired', dbs=[0])
+        entrypoint_2 = create_entrypoint(keys='foo', dbs=[0])
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint_1.start()
+            sleep(TIME_SLEEP)
+            entrypoint_2.start()
+            sleep(TIME_SLEEP)
+
+            assert len(shared_pubsubs) == 1
+            assert mock_strict_redis.from_url.call_count == 1
+            assert mock_pubsub.subscribe.call_args_list == [
+                call('__keyevent@0__:expired'),
+                call('__keyspace@0__:foo'),
+            ]
+
+            entrypoint_1.stop()
+            assert mock_pubsub.unsubscribe.call_args_list == [
+                call('__keyevent@0__:expired')
+            ]
+
+            entrypoint_2.stop()
+
+        assert mock_pubsub.listen.call_args_list == [call()]
+        assert mock_pubsub.close.call_args_list == [call()]
+
+    def test_notifies_disconnections(self, create_entrypoint, mock_pubsub):
+        mock_pubsub.listen.side_effect = [
+            redis_listen(ConnectionError('Boom!')),
+            redis_listen(eventlet.Event().wait),
+        ]
+        entrypoint_1 = create_entrypoint(events='expired', dbs=[0])
+        entrypoint_2 = create_entrypoint(keys='foo', dbs=[0])
+        entrypoint_1._on_disconnected = Mock()
+        entrypoint_2._on_disconnected = Mock()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint_1.start()
+            entrypoint_2.start()
+            sleep(TIME_SLEEP)
+            entrypoint_1.stop()
+            entrypoint_2.stop()
+
+        assert entrypoint_1._on_disconnected.call_args_list == [call()]
+        assert entrypoint_2._on_disconnected.call_args_list == [call()]
+
+    def test_notifies_subscriptions(self, create_entrypoint, mock_pubsub):
+        registered = eventlet.Event()
+        mock_pubsub.listen.return_value = redis_listen(
+            {
+                'type': 'subscribe',
+                'pattern': None,
+                'channel': '__keyevent@0__:expired',
+                'data': 1,
+            },
+            lambda: registered.wait()
+            or {
+                'type': 'subscribe',
+                'pattern': None,
+                'channel': '__keyspace@0__:foo',
+                'data': 2,
+            },
+            eventlet.Event().wait,
+        )
+        entrypoint_1 = create_entrypoint(events='expired', dbs=[0])
+        entrypoint_2 = create_entrypoint(keys='foo', dbs=[0])
+        entrypoint_3 = create_entrypoint(events='expired', dbs=[0])
+        for entrypoint in (entrypoint_1, entrypoint_2, entrypoint_3):
+            entrypoint._on_subscribed = Mock()
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint_1.start()
+            sleep(TIME_SLEEP)
+            entrypoint_2.start()
+            # Already subscribed to
+            entrypoint_3.start()
+            assert entrypoint_2._on_subscribed.call_args_list == []
+            registered.send()
+            sleep(TIME_SLEEP)
+            for entrypoint in (entrypoint_1, entrypoint_2, entrypoint_3):
+                entrypoint.stop()
+
+        assert entrypoint_1._on_subscribed.call_count == 1
+        assert entrypoint_2._on_subscribed.call_count == 1
+        assert entrypoint_2._on_subscribed.call_args[0][0] == 1
+        assert entrypoint_3._on_subscribed.call_args_list == [call(0, 0.0)]
+
+    def test_hub_per_container_and_uri_config_key(self, create_entrypoint):
+        entrypoint_1 = create_entrypoint(events='expired', dbs=[0])
+        entrypoint_2 = create_entrypoint(keys='foo', dbs=[0])
+
+        assert entrypoint_1.hub is entrypoint_2.hub
+
+    def test_fans_messages_out(self, create_entrypoint, mock_container, mock_pubsub):
+        event = eventlet.Event()
+        message = {
+            'type': 'pmessage',
+            'pattern': '__keyevent@0__:*',
+            'channel': '__keyevent@0__:expired',
+            'data': 'foo',
+        }
+        other_message = {
+            'type': 'message',
+            'pattern': None,
+            'channel': '__keyspace@0__:bar',
+            'data': 'set',
+        }
+        mock_pubsub.listen.return_value = redis_listen(
+            message, other_message, event.wait
+        )
+        entrypoint_1 = create_entrypoint(events='*', dbs=[0])
+        entrypoint_2 = create_entrypoint(events='*', keys='foo', dbs=[0])
+        entrypoint_3 = create_entrypoint(keys='bar', dbs=[0])
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint_1.start()
+            entrypoint_2.start()
+            entrypoint_3.start()
+            sleep(TIME_SLEEP)
+            entrypoint_1.stop()
+            entrypoint_2.stop()
+            entrypoint_3.stop()
+
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint_1, [message], {}),
+            call(entrypoint_2, [message], {}),
+            call(
+                entrypoint_3,
+                [dict(other_message, type='pmessage', pattern='__keyspace@0__:bar')],
+                {},
+            ),
+        ]
+
+    def test_shares_connection_between_containers(
+        self, create_service, config, mock_strict_redis, mock_pubsub, tracker
+    ):
+        event = eventlet.Event()
+        message = {
+            'type': 'pmessage',
+            'pattern': '__keyevent@0__:*',
+            'channel': '__keyevent@0__:expired',
+            'data': 'foo',
+        }
+        started = eventlet.Event()
+
+        def wait_message():
+            started.wait()
+            return message
+
+        mock_pubsub.listen.return_value = redis_listen(wait_message, event.wait)
+
+        with eventlet.Timeout(TIMEOUT):
+            service_1 = create_service(
+                uri_config_key=URI_CONFIG_KEY, events='*', dbs=[0]
+            )
+            service_2 = create_service(
+                uri_config_key=URI_CONFIG_KEY, events='*', dbs=[0]
+            )
+            started.send()
+            sleep(TIME_SLEEP)
+            service_1.container.stop()
+            service_2.container.stop()
+
+        assert mock_strict_redis.from_url.call_count == 1
+        assert mock_pubsub.psubscribe.call_args_list == [call('__keyevent@0__:*')]
+        assert tracker.call_args_list == [call(message), call(message)]
+
+    def test_uses_connected_db(self, create_entrypoint, mock_redis_client):
+        mock_redis_client.connection_pool.connection_kwargs = {'db': 3}
+        entrypoint = create_entrypoint(events='*')
+
+        entrypoint.start()
+        entrypoint.stop()
+
+        assert entrypoint.dbs == [3]
+
+    def test_error_handing_over_message(
+        self, create_entrypoint, mock_container, mock_pubsub, caplog
+    ):
+        event = eventlet.Event()
+        message = {
+            'type': 'pmessage',
+            'pattern': '__keyevent@0__:*',
+            'channel': '__keyevent@0__:expired',
+            'data': 'foo',
+        }
+        mock_pubsub.listen.return_value = redis_listen(message, event.wait)
+        mock_container.spawn_worker.side_effect = [Exception('Boom!'), None]
+        entrypoint_1 = create_entrypoint(events='*', dbs=[0])
+        entrypoint_2 = create_entrypoint(events='*', dbs=[0])
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint_1.start()
+            entrypoint_2.start()
+            sleep(TIME_SLEEP)
+            entrypoint_1.stop()
+            entrypoint_2.stop()
+
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint_1, [message], {}),
+            call(entrypoint_2, [message], {}),
+        ]
+        assert mock_pubsub.listen.call_args_list == [call()]
+        assert any(
+            record.getMessage().startswith('Error handing a message over to')
+            for record in caplog.records
+        )
+
+    def test_subscribes_to_covering_patterns(
+        self, create_entrypoint, mock_container, mock_pubsub
+    ):
+        event = eventlet.Event()
+        message = {
+            'type': 'pmessage',
+            'pattern': '__keyspace@0__:*',
+            'channel': '__keyspace@0__:foo-1',
+            'data': 'set',
+        }
+        started = eventlet.Event()
+
+        def wait_message():
+            started.wait()
+            return message
+
+        mock_pubsub.listen.return_value = redis_listen(wait_message, event.wait)
+        entrypoint_1 = create_entrypoint(keys='foo-*', dbs=[0])
+        entrypoint_2 = create_entrypoint(keys=['*', 'bar'], dbs=[0])
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint_1.start()
+            sleep(TIME_SLEEP)
+            entrypoint_2.start()
+            sleep(TIME_SLEEP)
+
+            assert mock_pubsub.psubscribe.call_args_list == [
+                call('__keyspace@0__:foo-*'),
+                call('__keyspace@0__:*'),
+            ]
+            assert mock_pubsub.punsubscribe.call_args_list == [
+                call('__keyspace@0__:foo-*')
+            ]
+
+            started.send()
+            sleep(TIME_SLEEP)
+            entrypoint_2.stop()
+
+            assert mock_pubsub.psubscribe.call_args_list[-1] == call(
+                '__keyspace@0__:foo-*'
+            )
+            assert mock_pubsub.punsubscribe.call_args_list[-1] == call(
+                '__keyspace@0__:*'
+            )
+
+            entrypoint_1.stop()
+
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint_2, [message], {}),
+            call(entrypoint_1, [dict(message, pattern='__keyspace@0__:foo-*')], {}),
+        ]
+
+    def test_switches_patterns_once_confirmed(
+        self, create_entrypoint, mock_container, mock_pubsub
+    ):
+        def confirmation(pattern):
+            return {'type': 'psubscribe', 'pattern': None, 'channel': pattern}
+
+        def message(pattern):
+            return {
+                'type': 'pmessage',
+                'pattern': pattern,
+                'channel': '__keyspace@0__:foo-1',
+                'data': 'set',
+            }
+
+        covered, covering = eventlet.Event(), eventlet.Event()
+        mock_pubsub.listen.return_value = redis_listen(
+            confirmation('__keyspace@0__:foo-*'),
+            lambda: covered.wait() or message('__keyspace@0__:foo-*'),
+            lambda: covering.wait() or confirmation('__keyspace@0__:*'),
+            message('__keyspace@0__:foo-*'),
+            message('__keyspace@0__:*'),
+            eventlet.Event().wait,
+        )
+        entrypoint_1 = create_entrypoint(keys='foo-*', dbs=[0])
+        entrypoint_2 = create_entrypoint(keys='*', dbs=[0])
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint_1.start()
+            sleep(TIME_SLEEP)
+            entrypoint_2.start()
+            covered.send()
+            sleep(TIME_SLEEP)
+
+            # Still routed from the pattern already subscribed to
+            assert mock_pubsub.punsubscribe.call_args_list == []
+
+            covering.send()
+            sleep(TIME_SLEEP)
+
+            assert mock_pubsub.punsubscribe.call_args_list == [
+                call('__keyspace@0__:foo-*')
+            ]
+            entrypoint_1.stop()
+            entrypoint_2.stop()
+
+        notifications = [
+            (args[0], args[1][0]['pattern'])
+            for args, _ in mock_container.spawn_worker.call_args_list
+            if args[1][0]['type'] == 'pmessage'
+        ]
+        assert notifications == [
+            (entrypoint_1, '__keyspace@0__:foo-*'),
+            (entrypoint_2, '__keyspace@0__:*'),
+            (entrypoint_1, '__keyspace@0__:foo-*'),
+        ]
+
+    def test_subscribes_patterns_registered_while_subscribing(
+        self, create_entrypoint, mock_pubsub
+    ):
+        mock_pubsub.listen.side_effect = eventlet.Event().wait
+        entrypoint_1 = create_entrypoint(events='expired', dbs=[0])
+        entrypoint_2 = create_entrypoint(keys='foo', dbs=[0])
+
+        def subscribe(*channels):
+            # Sending the command yields to the other greenthreads
+            if mock_pubsub.subscribe.call_count == 1:
+                entrypoint_2.start()
+
+        mock_pubsub.subscribe.side_effect = subscribe
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint_1.start()
+            sleep(TIME_SLEEP)
+            entrypoint_1.stop()
+            entrypoint_2.stop()
+
+        assert mock_pubsub.subscribe.call_args_list == [
+            call('__keyevent@0__:expired'),
+            call('__keyspace@0__:foo'),
+        ]
+        assert mock_pubsub.listen.call_args_list == [call()]
+
+    def test_raw_messages(
+        self, create_entrypoint, mock_container, mock_strict_redis, mock_pubsub
+    ):
+        message = {
+            'type': 'pmessage',
+            'pattern': b'__keyspace@0__:*',
+            'channel': b'__keyspace@0__:foo\xff',
+            'data': b'set',
+        }
+        started = eventlet.Event()
+
+        def wait_message():
+            started.wait()
+            return message
+
+        mock_pubsub.listen.return_value = redis_listen(
+            wait_message, eventlet.Event().wait
+        )
+        entrypoint_1 = create_entrypoint(keys='*', dbs=[0], decode_responses=False)
+        entrypoint_2 = create_entrypoint(keys='foo*', dbs=[0], decode_responses=False)
+        entrypoint_3 = create_entrypoint(keys='*', dbs=[0])
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint_1.start()
+            entrypoint_2.start()
+            entrypoint_3.start()
+            started.send()
+            sleep(TIME_SLEEP)
+            entrypoint_1.stop()
+            entrypoint_2.stop()
+            entrypoint_3.stop()
+
+        # Entrypoints decoding responses use a different connection
+        assert mock_strict_redis.from_url.call_args_list == [
+            call('redis://localhost:6379/0', encoding='utf-8', decode_responses=False),
+            call('redis://localhost:6379/0', encoding='utf-8', decode_responses=True),
+        ]
+        assert mock_container.spawn_worker.call_args_list[:2] == [
+            call(entrypoint_1, [message], {}),
+            call(entrypoint_2, [dict(message, pattern=b'__keyspace@0__:foo*')], {}),
+        ]
+
+
+class TestSubscribe:
+    @pytest.fixture
+    def create_entrypoint(self, mock_container):
+        def create(**kwargs):
+            entrypoint = rediskn.RedisKNEntrypoint(
+                uri_config_key=URI_CONFIG_KEY, **kwargs
+            ).bind(mock_container, 'test_method')
+            entrypoint.setup()
+            return entrypoint
+
+        return create
+
+    def test_subscribes_in_a_single_command(self, create_entrypoint, mock_pubsub):
+        mock_pubsub.listen.side_effect = eventlet.Event().wait
+        entrypoint = create_entrypoint(
+            events=['set', 'expired'], keys=['foo*', 'foo*'], dbs=[0, 1]
+        )
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_pubsub.subscribe.call_args_list == [
+            call(
+                '__keyevent@0__:set',
+                '__keyevent@0__:expired',
+                '__keyevent@1__:set',
+                '__keyevent@1__:expired',
+            )
+        ]
+        assert mock_pubsub.psubscribe.call_args_list == [
+            call('__keyspace@0__:foo*', '__keyspace@1__:foo*')
+        ]
+
+    def test_subscribes_in_chunks(self, create_entrypoint, mock_pubsub):
+        mock_pubsub.listen.side_effect = eventlet.Event().wait
+        keys = ['key-{}'.format(index) for index in range(5)]
+        entrypoint = create_entrypoint(keys=keys, dbs=[0])
+
+        with patch('nameko_rediskn.rediskn.SUBSCRIBE_CHUNK_SIZE', 2):
+            with eventlet.Timeout(TIMEOUT):
+                entrypoint.start()
+                sleep(TIME_SLEEP)
+                entrypoint.stop()
+
+        patterns = ['__keyspace@0__:{}'.format(key) for key in keys]
+        assert mock_pubsub.subscribe.call_args_list == [
+            call(*patterns[0:2]),
+            call(*patterns[2:4]),
+            call(*patterns[4:]),
+        ]
+
+    def test_reports_subscribe_duration(
+        self, create_entrypoint, mock_container, mock_pubsub, log_mock
+    ):
+        event = eventlet.Event()
+        confirmations = [
+            {'type': 'psubscribe', 'pattern': None, 'channel': channel, 'data': data}
+            for data, channel in enumerate(
+                ['__keyevent@0__:*', '__keyspace@0__:*'], start=1
+            )
+        ]
+        mock_pubsub.listen.return_value = redis_listen(
+            confirmations[0],
+            lambda: event.wait() or confirmations[1],
+            eventlet.Event().wait,
+        )
+        entrypoint = create_entrypoint(events='*', keys='*', dbs=[0])
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            assert entrypoint.subscribe_duration is None
+
+            event.send()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert entrypoint.subscribe_duration >= TIME_SLEEP / 2
+        assert (
+            call(
+                '%s subscribed to %d patterns in %.3fs',
+                entrypoint,
+                2,
+                entrypoint.subscribe_duration,
+            )
+            in log_mock.debug.call_args_list
+        )
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [confirmation], {}) for confirmation in confirmations
+        ]
+
+    def test_literal_channels(self, create_entrypoint, mock_container, mock_pubsub):
+        messages = [
+            {
+                'type': 'subscribe',
+                'pattern': None,
+                'channel': '__keyspace@0__:foo*',
+                'data': 1,
+            },
+            {
+                'type': 'psubscribe',
+                'pattern': None,
+                'channel': '__keyevent@0__:*',
+                'data': 2,
+            },
+            {
+                'type': 'message',
+                'pattern': None,
+                'channel': '__keyspace@0__:foo*',
+                'data': 'set',
+            },
+            {
+                'type': 'pmessage',
+                'pattern': '__keyevent@0__:*',
+                'channel': '__keyevent@0__:set',
+                'data': 'foo*',
+            },
+        ]
+        mock_pubsub.listen.return_value = redis_listen(*messages, eventlet.Event().wait)
+        entrypoint = create_entrypoint(events='*', keys='foo\\*', dbs=[0])
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_pubsub.subscribe.call_args_list == [call('__keyspace@0__:foo*')]
+        assert mock_pubsub.psubscribe.call_args_list == [call('__keyevent@0__:*')]
+        assert mock_container.spawn_worker.call_args_list == [
+            call(
+                entrypoint,
+                [
+                    {
+                        'type': 'psubscribe',
+                        'pattern': None,
+                        'channel': '__keyspace@0__:foo\\*',
+                        'data': 1,
+                    }
+                ],
+                {},
+            ),
+            call(entrypoint, [messages[1]], {}),
+            call(
+                entrypoint,
+                [
+                    {
+                        'type': 'pmessage',
+                        'pattern': '__keyspace@0__:foo\\*',
+                        'channel': '__keyspace@0__:foo*',
+                        'data': 'set',
+                    }
+                ],
+                {},
+            ),
+            call(entrypoint, [messages[3]], {}),
+        ]
+
+    def test_parse_messages(self, create_entrypoint, mock_container, mock_pubsub):
+        messages = [
+            {
+                'type': 'psubscribe',
+                'pattern': None,
+                'channel': '__keyspace@0__:*',
+                'data': 1,
+            },
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@0__:*',
+                'channel': '__keyspace@0__:foo:bar',
+                'data': 'expired',
+            },
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@0__:*',
+                'channel': '__keyspace@0__:baz',
+                'data': 'set',
+            },
+        ]
+        mock_pubsub.listen.return_value = redis_listen(*messages, eventlet.Event().wait)
+        entrypoint = create_entrypoint(keys='*', dbs=[0], parse_messages=True)
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [KeyspaceEvent.from_message(messages[1])], {}),
+            call(entrypoint, [KeyspaceEvent.from_message(messages[2])], {}),
+        ]
+        events = [args[1][0] for args, _ in mock_container.spawn_worker.call_args_list]
+        assert [(event.db, event.key, event.event) for event in events] == [
+            (0, 'foo:bar', 'expired'),
+            (0, 'baz', 'set'),
+        ]
+        assert [event.sequence for event in events] == [1, 2]
+
+    def test_raw_messages(
+        self, create_entrypoint, mock_container, mock_strict_redis, mock_pubsub
+    ):
+        messages = [
+            {
+                'type': 'subscribe',
+                'pattern': None,
+                'channel': b'__keyspace@0__:foo',
+                'data': 1,
+            },
+            {
+                'type': 'message',
+                'pattern': None,
+                'channel': b'__keyspace@0__:foo',
+                'data': b'set',
+            },
+            {
+                'type': 'pmessage',
+                'pattern': b'__keyevent@0__:*',
+                'channel': b'__keyevent@0__:set',
+                'data': b'\xff',
+            },
+        ]
+        mock_pubsub.listen.return_value = redis_listen(*messages, eventlet.Event().wait)
+        entrypoint = create_entrypoint(
+            events='*', keys='foo', dbs=[0], decode_responses=False
+        )
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        assert mock_strict_redis.from_url.call_args_list == [
+            call('redis://localhost:6379/0', encoding='utf-8', decode_responses=False)
+        ]
+        assert mock_container.spawn_worker.call_args_list == [
+            call(entrypoint, [dict(messages[0], type='psubscribe')], {}),
+            call(
+                entrypoint,
+                [dict(messages[1], type='pmessage', pattern=b'__keyspace@0__:foo')],
+                {},
+            ),
+            call(entrypoint, [messages[2]], {}),
+        ]
+
+    def test_raw_parsed_messages(self, create_entrypoint, mock_container, mock_pubsub):
+        message = {
+            'type': 'pmessage',
+            'pattern': b'__keyspace@0__:*',
+            'channel': b'__keyspace@0__:\xff:1',
+            'data': b'expired',
+        }
+        mock_pubsub.listen.return_value = redis_listen(message, eventlet.Event().wait)
+        entrypoint = create_entrypoint(
+            keys='*', dbs=[0], decode_responses=False, parse_messages=True
+        )
+
+        with eventlet.Timeout(TIMEOUT):
+            entrypoint.start()
+            sleep(TIME_SLEEP)
+            entrypoint.stop()
+
+        ((args, _),) = mock_container.spawn_worker.call_args_list
+        (event,) = args[1]
+        assert (event.db, event.key, event.event) == (0, b'\xff:1', 'expired')
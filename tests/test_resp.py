@@ -0,0 +1,86 @@
+from unittest.mock import patch
+
+import pytest
+from redis.exceptions import InvalidResponse, ResponseError
+
+from nameko_rediskn.resp import COMPACT_SIZE, RespReader, create_reader
+
+
+@pytest.fixture
+def reader():
+    return RespReader()
+
+
+def replies(reader):
+    parsed = []
+    reply = reader.gets()
+    while reply is not False:
+        parsed.append(reply)
+        reply = reader.gets()
+    return parsed
+
+
+class TestRespReader:
+    def test_replies(self, reader):
+        reader.feed(
+            b'+OK\r\n:12\r\n$3\r\nfoo\r\n$-1\r\n*-1\r\n'
+            b'*3\r\n$8\r\npmessage\r\n*1\r\n:1\r\n$0\r\n\r\n'
+        )
+
+        assert replies(reader) == [
+            b'OK',
+            12,
+            b'foo',
+            None,
+            None,
+            [b'pmessage', [1], b''],
+        ]
+
+    def test_error(self, reader):
+        reader.feed(b'-ERR nope\r\n')
+
+        reply = reader.gets()
+
+        assert isinstance(reply, ResponseError)
+        assert str(reply) == 'ERR nope'
+
+    def test_protocol_error(self, reader):
+        reader.feed(b'?foo\r\n')
+
+        with pytest.raises(InvalidResponse):
+            reader.gets()
+
+    def test_partial_replies(self, reader):
+        data = b'*2\r\n$3\r\nfoo\r\n$6\r\nfoobar\r\n:1\r\n'
+        parsed = []
+        for byte in data:
+            reader.feed(bytes([byte]))
+            parsed.extend(replies(reader))
+
+        assert parsed == [[b'foo', b'foobar'], 1]
+        assert reader.gets() is False
+
+    def test_compacts_buffer(self, reader):
+        value = b'x' * COMPACT_SIZE
+        reader.feed(b'$%d\r\n%s\r\n$1\r\n' % (len(value), value))
+
+        assert reader.gets() == value
+
+        reader.feed(b'y\r\n')
+
+        assert reader.gets() == b'y'
+
+
+class TestCreateReader:
+    def test_without_hiredis(self):
+        with patch('nameko_rediskn.resp.hiredis', None):
+            assert isinstance(create_reader(), RespReader)
+
+    def test_hiredis(self):
+        hiredis = pytest.importorskip('hiredis')
+
+        reader = create_reader()
+        reader.feed(b'-ERR nope\r\n')
+
+        assert isinstance(reader, hiredis.Reader)
+        assert isinstance(reader.gets(), ResponseError)
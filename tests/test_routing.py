@@ -0,0 +1,215 @@
+import pytest
+
+from nameko_rediskn.routing import (
+    RoutingTable,
+    compile_glob,
+    covering_patterns,
+    covers,
+    is_literal,
+    prefix,
+    shard_patterns,
+)
+
+
+class TestPatternShapes:
+    @pytest.mark.parametrize(
+        'pattern, expected',
+        [
+            ('__keyevent@0__:expired', True),
+            ('__keyspace@0__:foo\\*', True),
+            ('__keyspace@0__:foo*', False),
+            ('__keyspace@?__:foo', False),
+            ('__keyspace@[01]__:foo', False),
+        ],
+    )
+    def test_is_literal(self, pattern, expected):
+        assert is_literal(pattern) is expected
+
+    @pytest.mark.parametrize(
+        'pattern, expected',
+        [
+            ('__keyspace@0__:foo*', '__keyspace@0__:foo'),
+            ('__keyspace@0__:foo**', '__keyspace@0__:foo'),
+            ('*', ''),
+            ('__keyspace@0__:foo', None),
+            ('__keyspace@0__:foo\\*', None),
+            ('__keyspace@*__:foo*', None),
+            ('__keyspace@0__:fo?*', None),
+        ],
+    )
+    def test_prefix(self, pattern, expected):
+        assert prefix(pattern) == expected
+
+
+class TestCompileGlob:
+    @pytest.mark.parametrize(
+        'pattern, channel, expected',
+        [
+            ('*', '', True),
+            ('*', '__keyspace@0__:foo', True),
+            ('__keyspace@*__:foo', '__keyspace@12__:foo', True),
+            ('__keyspace@*__:foo', '__keyspace@12__:bar', False),
+            ('h?llo', 'hello', True),
+            ('h?llo', 'hllo', False),
+            ('h[ae]llo', 'hallo', True),
+            ('h[ae]llo', 'hillo', False),
+            ('h[^e]llo', 'hallo', True),
+            ('h[^e]llo', 'hello', False),
+            ('h[a-b]llo', 'hbllo', True),
+            ('h[b-a]llo', 'hbllo', True),
+            ('h[a-b]llo', 'hcllo', False),
+            ('h\\*llo', 'h*llo', True),
+            ('h\\*llo', 'hello', False),
+            ('h[\\]]llo', 'h]llo', True),
+            ('h[]llo', 'hllo', False),
+            ('h[abc', 'hb', True),
+            ('a.b', 'axb', False),
+            ('a*', 'a\nb', True),
+        ],
+    )
+    def test_match(self, pattern, channel, expected):
+        assert (compile_glob(pattern).fullmatch(channel) is not None) is expected
+
+
+class TestCovers:
+    @pytest.mark.parametrize(
+        'pattern, other, expected',
+        [
+            ('__keyspace@0__:*', '__keyspace@0__:foo', True),
+            ('__keyspace@0__:*', '__keyspace@0__:foo*', True),
+            ('__keyspace@0__:*', '__keyspace@0__:f?o', True),
+            ('__keyspace@*__:*', '__keyspace@0__:foo', True),
+            ('__keyspace@0__:foo*', '__keyspace@0__:*', False),
+            ('__keyspace@0__:*', '__keyspace@1__:foo', False),
+            ('__keyspace@0__:*', '__keyevent@0__:set', False),
+            ('__keyspace@0__:f?o', '__keyspace@0__:f*o', False),
+            ('__keyspace@0__:f?o', '__keyspace@0__:f?o', True),
+            ('__keyspace@0__:*b*', '__keyspace@0__:[ab]', False),
+            ('__keyspace@0__:*b*', '__keyspace@0__:\\b', False),
+            ('__keyspace@0__:*', '__keyspace@0__:[ab]', False),
+        ],
+    )
+    def test_covers(self, pattern, other, expected):
+        assert covers(pattern, other) is expected
+
+    def test_covering_patterns(self):
+        patterns = [
+            '__keyspace@0__:foo',
+            '__keyspace@0__:foo*',
+            '__keyspace@0__:*',
+            '__keyspace@1__:foo',
+            '__keyevent@0__:set',
+            '__keyevent@*__:set',
+        ]
+
+        assert covering_patterns(patterns) == {
+            '__keyspace@0__:foo': '__keyspace@0__:*',
+            '__keyspace@0__:foo*': '__keyspace@0__:*',
+            '__keyspace@0__:*': '__keyspace@0__:*',
+            '__keyspace@1__:foo': '__keyspace@1__:foo',
+            '__keyevent@0__:set': '__keyevent@*__:set',
+            '__keyevent@*__:set': '__keyevent@*__:set',
+        }
+
+    def test_keeps_classes(self):
+        patterns = ['__keyspace@0__:*b*', '__keyspace@0__:[ab]']
+
+        assert covering_patterns(patterns) == {
+            '__keyspace@0__:*b*': '__keyspace@0__:*b*',
+            '__keyspace@0__:[ab]': '__keyspace@0__:[ab]',
+        }
+
+
+class TestRoutingTable:
+    @pytest.fixture
+    def table(self):
+        table = RoutingTable()
+        table.add('__keyevent@0__:expired', 'literal')
+        table.add('__keyspace@0__:user:*', 'prefix')
+        table.add('__keyspace@0__:*', 'all')
+        table.add('__keyspace@*__:user:?', 'glob')
+        table.add('__keyevent@0__:expired', 'other-literal')
+        return table
+
+    @pytest.mark.parametrize(
+        'channel, expected',
+        [
+            (
+                '__keyevent@0__:expired',
+                [
+                    ('__keyevent@0__:expired', 'literal'),
+                    ('__keyevent@0__:expired', 'other-literal'),
+                ],
+            ),
+            ('__keyevent@1__:expired', []),
+            ('__keyspace@0__:foo', [('__keyspace@0__:*', 'all')]),
+            (
+                '__keyspace@0__:user:12',
+                [('__keyspace@0__:*', 'all'), ('__keyspace@0__:user:*', 'prefix')],
+            ),
+            (
+                '__keyspace@0__:user:1',
+                [
+                    ('__keyspace@0__:*', 'all'),
+                    ('__keyspace@0__:user:*', 'prefix'),
+                    ('__keyspace@*__:user:?', 'glob'),
+                ],
+            ),
+            ('__keyspace@3__:user:1', [('__keyspace@*__:user:?', 'glob')]),
+        ],
+    )
+    def test_match(self, table, channel, expected):
+        assert table.match(channel) == expected
+
+    def test_remove(self, table):
+        table.remove('__keyevent@0__:expired', 'literal')
+        table.remove('__keyspace@0__:user:*', 'prefix')
+        table.remove('__keyspace@*__:user:?', 'glob')
+        table.remove('__keyspace@*__:user:?', 'unknown')
+
+        assert table.match('__keyevent@0__:expired') == [
+            ('__keyevent@0__:expired', 'other-literal')
+        ]
+        assert table.match('__keyspace@0__:user:1') == [('__keyspace@0__:*', 'all')]
+        assert len(table) == 2
+        assert sorted(table.patterns()) == [
+            '__keyevent@0__:expired',
+            '__keyspace@0__:*',
+        ]
+
+
+class TestShardPatterns:
+    @pytest.fixture
+    def patterns(self):
+        return [
+            '__keyevent@0__:expired',
+            '__keyevent@1__:expired',
+            '__keyspace@0__:foo*',
+            '__keyspace@1__:foo*',
+            '__keyspace@2__:foo*',
+        ]
+
+    def test_by_db(self, patterns):
+        assert shard_patterns(patterns, 2, 'db') == [
+            ['__keyevent@0__:expired', '__keyspace@0__:foo*', '__keyspace@2__:foo*'],
+            ['__keyevent@1__:expired', '__keyspace@1__:foo*'],
+        ]
+
+    def test_by_pattern(self, patterns):
+        assert shard_patterns(patterns, 2, 'pattern') == [
+            patterns[0::2],
+            patterns[1::2],
+        ]
+
+    def test_by_hash(self, patterns):
+        shards = shard_patterns(patterns, 3, 'hash')
+
+        assert sorted(pattern for shard in shards for pattern in shard) == patterns
+        # Stable across calls (and processes)
+        assert shard_patterns(patterns, 3, 'hash') == shards
+
+    def test_leaves_empty_shards_out(self, patterns):
+        assert shard_patterns(patterns[:2], 10, 'pattern') == [
+            patterns[:1],
+            patterns[1:2],
+        ]
@@ -0,0 +1,109 @@
+from unittest.mock import Mock, call, patch
+
+import pytest
+from redis import ConnectionPool
+
+from nameko_rediskn.snapshot import scan_keys, snapshot, snapshot_message
+from tests import TIME_SLEEP
+
+
+@pytest.fixture
+def client():
+    client = Mock()
+    client.connection_pool = ConnectionPool(host='localhost', port=6379, db=0)
+    client.scan.side_effect = [(12, ['user:1', 'user:2']), (0, ['user:3'])]
+    client.pipeline.return_value.execute.side_effect = [
+        ['string', -1, 'hash', 1500],
+        ['none', -2],
+    ]
+    return client
+
+
+def test_scan_keys(client):
+    batches = list(scan_keys(client, 'user:*', count=2))
+
+    assert batches == [['user:1', 'user:2'], ['user:3']]
+    assert client.scan.call_args_list == [
+        call(0, match='user:*', count=2),
+        call(12, match='user:*', count=2),
+    ]
+
+
+def test_scan_keys_rate(client):
+    with patch('nameko_rediskn.snapshot.sleep') as sleep:
+        list(scan_keys(client, 'user:*', rate=10))
+
+    pauses = [args[0] for args, _ in sleep.call_args_list]
+    assert TIME_SLEEP * 1.5 < pauses[0] <= 0.2
+    assert TIME_SLEEP / 2 < pauses[1] <= 0.1
+
+
+def test_snapshot(client):
+    handle_message = Mock()
+
+    emitted = snapshot(
+        client,
+        ['__keyevent@0__:expired', '__keyspace@*__:user:*', '__keyspace@0__:user:*'],
+        handle_message,
+    )
+
+    assert emitted == 2
+    assert handle_message.call_args_list == [
+        call(snapshot_message('__keyspace@0__:user:*', 0, 'user:1', 'string', -1)),
+        call(snapshot_message('__keyspace@0__:user:*', 0, 'user:2', 'hash', 1500)),
+    ]
+    pipeline = client.pipeline.return_value
+    assert pipeline.type.call_args_list == [
+        call('user:1'),
+        call('user:2'),
+        call('user:3'),
+    ]
+    assert pipeline.pttl.call_args_list == pipeline.type.call_args_list
+
+
+def test_snapshot_other_db(client):
+    with patch('nameko_rediskn.cluster.StrictRedis') as mock_strict_redis:
+        db_client = mock_strict_redis.return_value
+        db_client.scan.return_value = (0, [])
+
+        snapshot(client, ['__keyspace@3__:*'], Mock())
+
+    ((_, kwargs),) = mock_strict_redis.call_args_list
+    assert kwargs['connection_pool'].connection_kwargs['db'] == 3
+    assert db_client.connection_pool.disconnect.call_args_list == [call()]
+    assert client.scan.call_args_list == []
+
+
+@pytest.mark.parametrize(
+    'key, expected',
+    [
+        (
+            'foo',
+            {
+                'type': 'pmessage',
+                'pattern': '__keyspace@1__:*',
+                'channel': '__keyspace@1__:foo',
+                'data': 'snapshot',
+                'synthetic': True,
+                'key_type': 'string',
+                'pttl': -1,
+            },
+        ),
+        (
+            b'\xff',
+            {
+                'type': 'pmessage',
+                'pattern': b'__keyspace@1__:*',
+                'channel': b'__keyspace@1__:\xff',
+                'data': b'snapshot',
+                'synthetic': True,
+                'key_type': 'string',
+                'pttl': -1,
+            },
+        ),
+    ],
+)
+def test_snapshot_message(key, expected):
+    key_type = b'string' if isinstance(key, bytes) else 'string'
+
+    assert snapshot_message('__keyspace@1__:*', 1, key, key_type, -1) == expected
@@ -0,0 +1,140 @@
+from unittest.mock import Mock, call
+
+import pytest
+
+from nameko_rediskn.streams import (
+    LeaderElection,
+    entry_fields,
+    entry_message,
+    idle_consumers,
+    pending_entries,
+    stream_entries,
+)
+
+
+@pytest.fixture
+def client():
+    return Mock()
+
+
+def test_entry_fields():
+    message = {
+        'type': 'pmessage',
+        'pattern': '__keyevent@0__:*',
+        'channel': '__keyevent@0__:expired',
+        'data': 'foo',
+    }
+
+    assert entry_fields(message) == [
+        'pattern',
+        '__keyevent@0__:*',
+        'channel',
+        '__keyevent@0__:expired',
+        'data',
+        'foo',
+    ]
+
+
+@pytest.mark.parametrize(
+    'fields',
+    [
+        {'pattern': 'p', 'channel': 'c', 'data': 'd'},
+        [b'pattern', 'p', b'channel', 'c', b'data', 'd'],
+    ],
+)
+def test_entry_message(fields):
+    assert entry_message('1-0', fields) == {
+        'type': 'pmessage',
+        'id': '1-0',
+        'pattern': 'p',
+        'channel': 'c',
+        'data': 'd',
+    }
+
+
+@pytest.mark.parametrize(
+    'reply, expected',
+    [
+        (None, []),
+        ([], []),
+        # XREADGROUP, parsed by redis-py 3
+        (
+            [['stream', [('1-0', {'data': 'a'}), ('2-0', None)]]],
+            [('1-0', {'data': 'a'})],
+        ),
+        # XREADGROUP, not parsed
+        ([[b'stream', [[b'1-0', [b'data', b'a']]]]], [(b'1-0', [b'data', b'a'])]),
+        # XCLAIM, parsed by redis-py 3
+        ([('1-0', {'data': 'a'})], [('1-0', {'data': 'a'})]),
+        # XCLAIM, not parsed
+        ([[b'1-0', [b'data', b'a']]], [(b'1-0', [b'data', b'a'])]),
+    ],
+)
+def test_stream_entries(reply, expected):
+    assert stream_entries(reply) == expected
+
+
+def test_pending_entries():
+    reply = [
+        {'message_id': '1-0', 'time_since_delivered': 100, 'times_delivered': 2},
+        {'message_id': '2-0', 'time_since_delivered': 10, 'times_delivered': 1},
+        [b'3-0', b'consumer', 500, 1],
+    ]
+
+    assert pending_entries(reply, 100) == [('1-0', 2), (b'3-0', 1)]
+    assert pending_entries(None, 100) == []
+
+
+def test_idle_consumers():
+    reply = [
+        {'name': 'a', 'pending': 0, 'idle': 100},
+        {'name': 'b', 'pending': 1, 'idle': 500},
+        {'name': 'c', 'pending': 0, 'idle': 10},
+        [b'name', b'd', b'pending', 0, b'idle', 500],
+    ]
+
+    assert idle_consumers(reply, 100) == ['a', 'd']
+    assert idle_consumers(None, 100) == []
+
+
+class TestLeaderElection:
+    def test_acquire(self, client):
+        client.set.return_value = True
+        election = LeaderElection(client, 'lock', ttl=3, member_id='me')
+
+        assert election.refresh() is True
+        assert client.set.call_args_list == [call('lock', 'me', nx=True, px=3000)]
+
+    def test_acquire_fails_if_held(self, client):
+        client.set.return_value = None
+        election = LeaderElection(client, 'lock', member_id='me')
+
+        assert election.refresh() is False
+        assert election.is_leader is False
+
+    def test_renew(self, client):
+        client.set.return_value = True
+        client.eval.side_effect = [1, 0]
+        election = LeaderElection(client, 'lock', ttl=3, member_id='me')
+        election.refresh()
+
+        assert election.refresh() is True
+        # Someone else took over
+        assert election.refresh() is False
+        assert [args[1:] for args, _ in client.eval.call_args_list] == [
+            (1, 'lock', 'me', 3000),
+            (1, 'lock', 'me', 3000),
+        ]
+
+    def test_release(self, client):
+        client.set.return_value = True
+        election = LeaderElection(client, 'lock', member_id='me')
+        election.release()
+        assert client.eval.call_args_list == []
+
+        election.refresh()
+        election.release()
+
+        assert election.is_leader is False
+        ((args, _),) = client.eval.call_args_list
+        assert args[1:] == (1, 'lock', 'me')
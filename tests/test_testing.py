@@ -0,0 +1,417 @@
+import socket
+from unittest.mock import call, patch
+
+import pytest
+from eventlet import sleep
+from redis import ResponseError, StrictRedis
+from redis.client import PubSub
+
+from nameko_rediskn import REDIS_PMESSAGE_TYPE
+from nameko_rediskn.testing import (
+    CommandError,
+    FakeRedisServer,
+    VirtualClock,
+    encode,
+    parse_commands,
+)
+from tests import REDIS_OPTIONS, TIME_SLEEP, URI_CONFIG_KEY, assert_items_equal
+
+
+@pytest.fixture
+def server():
+    with FakeRedisServer(notify_keyspace_events='KEA') as server:
+        yield server
+
+
+@pytest.fixture
+def client(server):
+    return StrictRedis.from_url(server.uri(), **REDIS_OPTIONS)
+
+
+@pytest.fixture
+def pubsub(client):
+    pubsub = client.pubsub()
+    yield pubsub
+    pubsub.close()
+
+
+def messages(pubsub):
+    received = []
+    while True:
+        message = pubsub.get_message(timeout=TIME_SLEEP)
+        if message is None:
+            return received
+        received.append(message)
+
+
+def pmessage(pattern, channel, data):
+    return {'type': 'pmessage', 'pattern': pattern, 'channel': channel, 'data': data}
+
+
+class TestProtocol:
+    def test_encode(self):
+        assert encode(None) == b'$-1\r\n'
+        assert encode(3) == b':3\r\n'
+        assert encode('foo') == b'$3\r\nfoo\r\n'
+        assert encode(CommandError('ERR nope')) == b'-ERR nope\r\n'
+        assert encode([b'a', [1, None]]) == b'*2\r\n$1\r\na\r\n*2\r\n:1\r\n$-1\r\n'
+
+    def test_parse_commands(self):
+        buffer = b'*2\r\n$3\r\nGET\r\n$3\r\nfoo\r\nPING\r\n*2\r\n$3\r\nGET\r\n$3\r\nba'
+
+        commands, rest = parse_commands(buffer)
+
+        assert commands == [[b'GET', b'foo'], [b'PING']]
+        assert rest == b'*2\r\n$3\r\nGET\r\n$3\r\nba'
+
+
+class TestCommands:
+    def test_strings(self, client):
+        assert client.ping() is True
+        assert client.set('foo', 'bar') is True
+        assert client.set('foo', 'baz', nx=True) is None
+        assert client.get('foo') == 'bar'
+        assert client.mget('foo', 'missing') == ['bar', None]
+        assert client.exists('foo', 'missing') == 1
+        assert client.type('foo') == 'string'
+        assert client.delete('foo', 'missing') == 1
+        assert client.get('foo') is None
+
+    def test_hashes(self, client):
+        assert client.hset('foo', 'bar', 'baz') == 1
+        assert client.hgetall('foo') == {'bar': 'baz'}
+        assert client.type('foo') == 'hash'
+
+        with pytest.raises(ResponseError):
+            client.get('foo')
+
+    def test_keys(self, client):
+        for key in ('foo:1', 'foo:2', 'bar'):
+            client.set(key, 1)
+
+        assert client.keys('foo:*') == ['foo:1', 'foo:2']
+        assert sorted(client.scan_iter(match='foo:*', count=1)) == ['foo:1', 'foo:2']
+        assert client.dbsize() == 3
+        assert client.flushdb() is True
+        assert client.dbsize() == 0
+
+    def test_dbs(self, server):
+        db_1 = StrictRedis.from_url(server.uri(db=1), **REDIS_OPTIONS)
+        db_1.set('foo', 'bar')
+
+        assert db_1.get('foo') == 'bar'
+        assert server.data == {1: {b'foo': b'bar'}}
+
+    def test_config(self, client, server):
+        assert client.config_get('notify-keyspace-events') == {
+            'notify-keyspace-events': 'KEA'
+        }
+        assert client.config_set('notify-keyspace-events', 'Kx') is True
+        assert server.notify_keyspace_events == 'Kx'
+
+    def test_options(self, client):
+        assert client.set('foo', 'bar', xx=True) is None
+        assert client.set('foo', 'bar', px=1500) is True
+        assert client.pttl('foo') == 1500
+        assert client.set('foo', 'baz', xx=True) is True
+        assert client.ttl('foo') == -1
+
+    def test_connection(self, client, server):
+        assert client.echo('foo') == 'foo'
+        assert client.client_id() == 1
+        assert client.flushall() is True
+        assert client.execute_command('QUIT') == 'OK'
+        assert server.connections == set()
+
+    @pytest.mark.parametrize(
+        'command, error',
+        [
+            (('GET',), "wrong arguments for 'get' command"),
+            (('EXPIRE', 'foo', 'bar'), "wrong arguments for 'expire' command"),
+            (('HSET', 'foo', 'bar'), "wrong number of arguments for 'hset' command"),
+            (('CONFIG', 'SET', 'maxmemory', '1'), 'unsupported CONFIG parameter'),
+            (('CLIENT', 'LIST'), 'unsupported CLIENT subcommand'),
+            (('CLIENT', 'KILL', 'TYPE', 'normal'), 'only pubsub clients can be killed'),
+        ],
+    )
+    def test_errors(self, client, command, error):
+        with pytest.raises(ResponseError) as exc:
+            client.execute_command(*command)
+
+        assert str(exc.value) == error
+
+    def test_wrong_type(self, client):
+        client.set('foo', 'bar')
+        client.hset('baz', 'bar', 'foo')
+
+        assert client.mget('foo', 'baz') == ['bar', None]
+
+        with pytest.raises(ResponseError):
+            client.hset('foo', 'bar', 'baz')
+
+        with pytest.raises(ResponseError):
+            client.hgetall('foo')
+
+    def test_unknown_command(self, client):
+        with pytest.raises(ResponseError) as exc:
+            client.execute_command('SHUTDOWN')
+
+        assert str(exc.value) == "unknown command 'shutdown'"
+
+    def test_client(self, client, pubsub):
+        client.client_setname('foo')
+
+        assert client.client_getname() == 'foo'
+
+        pubsub.psubscribe('*')
+        messages(pubsub)
+
+        assert client.execute_command('CLIENT', 'KILL', 'TYPE', 'pubsub') == 1
+
+
+class TestExpiry:
+    def test_expires_in_virtual_time(self, client, server):
+        client.set('foo', 'bar', ex=10)
+
+        assert client.ttl('foo') == 10
+
+        server.advance(5)
+
+        assert client.pttl('foo') == 5000
+
+        server.advance(5)
+
+        assert client.get('foo') is None
+        assert client.ttl('foo') == -2
+
+    def test_persist(self, client, server):
+        client.set('foo', 'bar')
+        client.expire('foo', 1)
+
+        assert client.persist('foo') is True
+
+        server.advance(1)
+
+        assert client.get('foo') == 'bar'
+        assert client.ttl('foo') == -1
+
+    def test_shared_clock(self):
+        clock = VirtualClock(100)
+
+        server = FakeRedisServer(clock=clock)
+        server.set('foo', 'bar', px=500)
+        clock.now += 1
+
+        assert server.data[0] == {b'foo': b'bar'}
+
+        server.advance(0)
+
+        assert server.data[0] == {}
+
+
+class TestPubSub:
+    def test_keyspace_notifications(self, client, server, pubsub):
+        pubsub.psubscribe('__keyspace@0__:foo*', '__keyevent@*__:expired')
+        messages(pubsub)
+        client.set('foo', 'bar', px=100)
+        client.set('baz', 'bar')
+        server.advance(1)
+
+        assert messages(pubsub) == [
+            pmessage('__keyspace@0__:foo*', '__keyspace@0__:foo', 'set'),
+            pmessage('__keyspace@0__:foo*', '__keyspace@0__:foo', 'expire'),
+            pmessage('__keyspace@0__:foo*', '__keyspace@0__:foo', 'expired'),
+            pmessage('__keyevent@*__:expired', '__keyevent@0__:expired', 'foo'),
+        ]
+
+    @pytest.mark.parametrize(
+        'flags, channels',
+        [
+            ('', []),
+            ('K$', ['__keyspace@0__:foo']),
+            ('Eg', ['__keyevent@0__:del']),
+            ('KA', ['__keyspace@0__:foo', '__keyspace@0__:foo']),
+        ],
+    )
+    def test_notification_flags(self, client, server, pubsub, flags, channels):
+        server.notify_keyspace_events = flags
+        pubsub.psubscribe('__key*')
+        messages(pubsub)
+        client.set('foo', 'bar')
+        client.delete('foo')
+
+        assert [message['channel'] for message in messages(pubsub)] == channels
+
+    def test_channels(self, client, pubsub):
+        pubsub.subscribe('foo')
+        messages(pubsub)
+
+        assert client.publish('foo', 'bar') == 1
+        assert client.publish('foo:bar', 'bar') == 0
+        assert messages(pubsub) == [
+            {'type': 'message', 'pattern': None, 'channel': 'foo', 'data': 'bar'}
+        ]
+
+    def test_unsubscribe(self, client, server, pubsub):
+        pubsub.psubscribe('foo*')
+        pubsub.punsubscribe('foo*')
+        messages(pubsub)
+
+        assert client.publish('foo', 'bar') == 0
+        assert server.patterns == {}
+
+    def test_only_pubsub_commands_when_subscribed(self, server):
+        sock = socket.create_connection((server.host, server.port))
+        sock.sendall(b'PSUBSCRIBE foo\r\nGET foo\r\n')
+        sleep(TIME_SLEEP)
+
+        assert sock.recv(1024).endswith(
+            b'-ERR only (P)SUBSCRIBE / (P)UNSUBSCRIBE / PING / QUIT allowed in '
+            b'this context\r\n'
+        )
+        sock.close()
+
+    def test_ping(self, pubsub):
+        pubsub.subscribe('foo')
+        pubsub.ping()
+
+        assert messages(pubsub)[1] == {
+            'type': 'pong',
+            'pattern': None,
+            'channel': None,
+            'data': '',
+        }
+
+    def test_unsubscribe_all(self, client, server, pubsub):
+        pubsub.subscribe('foo', 'bar')
+        pubsub.psubscribe('baz*')
+        pubsub.unsubscribe()
+        pubsub.punsubscribe()
+        pubsub.punsubscribe()
+
+        assert [message['data'] for message in messages(pubsub)] == [
+            1,
+            2,
+            3,
+            2,
+            1,
+            0,
+            0,
+        ]
+        assert server.channels == server.patterns == {}
+
+    def test_disconnect_pubsub(self, server, pubsub):
+        pubsub.psubscribe('foo*')
+        messages(pubsub)
+
+        assert server.disconnect_pubsub() == 1
+        assert server.patterns == {}
+
+
+class TestDrive:
+    def test_drive(self, server, pubsub):
+        pubsub.psubscribe('__keyspace@0__:*')
+        messages(pubsub)
+
+        assert server.drive(rate=1000, duration=0.5, keys=10, px=100) == 500
+        assert server.clock.now == 0.5
+
+        received = messages(pubsub)
+        events = [message['data'] for message in received]
+
+        assert events[:4] == ['set', 'expire', 'set', 'expire']
+        assert events.count('set') == 500
+        # The last write of every key expires 100ms later, after the drive
+        assert events.count('expired') == 0
+
+        server.advance(0.1)
+
+        assert [message['data'] for message in messages(pubsub)] == ['expired'] * 10
+
+
+class TestEntrypoint:
+    @pytest.fixture
+    def config(self, server):
+        return {
+            'REDIS': {'notification_events': 'KEA'},
+            'REDIS_URIS': {URI_CONFIG_KEY: server.uri()},
+        }
+
+    def test_notifications(self, create_service, config, tracker, server):
+        create_service(
+            config=config, uri_config_key=URI_CONFIG_KEY, keys='foo*', dbs=[0]
+        )
+        server.set('foo', 'bar')
+        server.set('bar', 'foo')
+        sleep(TIME_SLEEP)
+
+        assert_items_equal(
+            tracker.call_args_list,
+            [
+                call(
+                    {
+                        'type': 'psubscribe',
+                        'pattern': None,
+                        'channel': '__keyspace@0__:foo*',
+                        'data': 1,
+                    }
+                ),
+                call(pmessage('__keyspace@0__:foo*', '__keyspace@0__:foo', 'set')),
+            ],
+        )
+
+    def test_load(self, create_service, config, tracker, server):
+        create_service(
+            config=config,
+            uri_config_key=URI_CONFIG_KEY,
+            events='set',
+            dbs=[0],
+            batch_size=1000,
+            max_batch_latency=TIME_SLEEP,
+        )
+
+        server.drive(rate=100000, duration=0.1, keys=100)
+        sleep(TIME_SLEEP * 5)
+
+        notifications = [
+            message
+            for (batch,), _ in tracker.call_args_list
+            for message in (batch if isinstance(batch, list) else [batch])
+            if message['type'] == REDIS_PMESSAGE_TYPE
+        ]
+        assert len(notifications) == 10000
+        assert notifications[-1]['data'] == 'key:99'
+
+    @pytest.mark.parametrize('shared_pubsub', [False, True])
+    def test_drains_connection(
+        self, create_service, config, tracker, server, shared_pubsub
+    ):
+        config['REDIS'].update(shared_pubsub=shared_pubsub)
+        # Replies are read from the socket, not through redis-py
+        with patch.object(PubSub, 'listen', side_effect=AssertionError):
+            create_service(
+                config=config, uri_config_key=URI_CONFIG_KEY, keys='foo*', dbs=[0]
+            )
+            sleep(TIME_SLEEP)
+            server.set('foo', 'bar')
+            sleep(TIME_SLEEP)
+
+        assert tracker.call_args_list[-1] == call(
+            pmessage('__keyspace@0__:foo*', '__keyspace@0__:foo', 'set')
+        )
+
+    @pytest.mark.parametrize('shared_pubsub', [False, True])
+    def test_threaded_reader(
+        self, create_service, config, tracker, server, shared_pubsub
+    ):
+        config['REDIS'].update(threaded_reader=True, shared_pubsub=shared_pubsub)
+        create_service(
+            config=config, uri_config_key=URI_CONFIG_KEY, keys='foo*', dbs=[0]
+        )
+        sleep(TIME_SLEEP)
+        server.set('foo', 'bar')
+        sleep(TIME_SLEEP)
+
+        assert tracker.call_args_list[-1] == call(
+            pmessage('__keyspace@0__:foo*', '__keyspace@0__:foo', 'set')
+        )
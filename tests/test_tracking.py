@@ -0,0 +1,117 @@
+from unittest.mock import Mock, call
+
+import pytest
+
+from nameko_rediskn.tracking import (
+    enable_tracking,
+    invalidation_messages,
+    key_prefixes,
+    tracking_command,
+)
+
+
+@pytest.mark.parametrize(
+    'keys, expected',
+    [
+        (['user:*'], ['user:']),
+        (['user:*', 'user:1:*', 'session'], ['session', 'user:']),
+        (['user:?:name', r'order\*:*'], ['order*:', 'user:']),
+        (['user:*', '*'], ['']),
+    ],
+)
+def test_key_prefixes(keys, expected):
+    assert key_prefixes(keys) == expected
+
+
+def test_tracking_command():
+    assert tracking_command(7, ['session', 'user:']) == [
+        'CLIENT',
+        'TRACKING',
+        'ON',
+        'REDIRECT',
+        7,
+        'BCAST',
+        'PREFIX',
+        'session',
+        'PREFIX',
+        'user:',
+    ]
+    assert tracking_command(7, ['']) == [
+        'CLIENT',
+        'TRACKING',
+        'ON',
+        'REDIRECT',
+        7,
+        'BCAST',
+    ]
+
+
+def test_enable_tracking():
+    connection = Mock()
+    connection.read_response.side_effect = [b'42', b'OK']
+
+    assert enable_tracking(connection, ['user:']) == 42
+    assert connection.send_command.call_args_list == [
+        call('CLIENT', 'ID'),
+        call('CLIENT', 'TRACKING', 'ON', 'REDIRECT', 42, 'BCAST', 'PREFIX', 'user:'),
+    ]
+
+
+def test_invalidation_messages():
+    message = {
+        'type': 'message',
+        'pattern': None,
+        'channel': '__redis__:invalidate',
+        'data': ['user:1', 'username', 'order:1'],
+    }
+
+    assert invalidation_messages(message, ['user:*', 'order:?']) == [
+        {
+            'type': 'pmessage',
+            'pattern': '__keyspace@*__:user:*',
+            'channel': '__keyspace@*__:user:1',
+            'data': 'invalidate',
+        },
+        {
+            'type': 'pmessage',
+            'pattern': '__keyspace@*__:order:?',
+            'channel': '__keyspace@*__:order:1',
+            'data': 'invalidate',
+        },
+    ]
+
+
+def test_invalidation_messages_raw():
+    message = {
+        'type': 'message',
+        'pattern': None,
+        'channel': b'__redis__:invalidate',
+        'data': [b'user:\xff'],
+    }
+
+    assert invalidation_messages(message, ['user:*']) == [
+        {
+            'type': 'pmessage',
+            'pattern': b'__keyspace@*__:user:*',
+            'channel': b'__keyspace@*__:user:\xff',
+            'data': b'invalidate',
+        }
+    ]
+
+
+def test_invalidation_messages_all_keys():
+    message = {
+        'type': 'message',
+        'pattern': None,
+        'channel': '__redis__:invalidate',
+        'data': None,
+    }
+
+    assert invalidation_messages(message, ['user:*']) == [
+        {
+            'type': 'pmessage',
+            'pattern': '__keyspace@*__:*',
+            'channel': '__keyspace@*__:*',
+            'data': 'invalidate',
+        }
+    ]